@@ -7,29 +7,47 @@
 #
 # Pipeline:
 #   1. Extract .apks bundle
-#   2. Patch manifest (apktool -s decode → Python XML patch → recompile to binary)
-#   3. Patch DEX (baksmali → targeted method stubs → smali)
-#   4. Assemble APK (copy original, replace patched DEX + manifest, strip META-INF)
+#   2. Patch manifest (binary AXML patch in Python; apktool decode/recompile fallback)
+#   3. Patch DEX (targeted method stubs in place; baksmali → smali fallback)
+#      (optional: repack all DEX files into the fewest possible, REPACK_DEX=1)
+#   4. Assemble APK (one streaming pass: strip META-INF/libs/assets, swap in patched DEX + manifest, align)
 #   5. Sign all APKs (zipalign + apksigner v1/v2/v3)
 #
+# The manifest patch, each DEX round-trip and each split's re-signing are
+# independent, so they run concurrently as a stage graph (scripts/run-stages.py)
+#
 # Usage:
 #   ./build.sh <edge-canary.apks>
 #   ./build.sh  # uses default path from AppManager exports
+#   ./build.sh --resume [<edge-canary.apks>]  # re-run only the steps that are stale
+#   scripts/build-batch.py <a.apks> <b.apks>...  # several bundles side by side
 #
-# Requirements: apktool, zipalign, apksigner, keytool, python3, java
+# Requirements: zipalign, apksigner, keytool, python3, java (apktool optional)
 
 set -euo pipefail
 
 SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
-WORK_DIR="$SCRIPT_DIR/work"
-OUTPUT_DIR="$SCRIPT_DIR/output"
+# BUILD_WORK_DIR / BUILD_OUTPUT_DIR / BUILD_CACHE_DIR relocate the work
+# tree, the outputs and the cache (scripts/build-batch.py gives each bundle
+# its own work and output dirs and one shared cache)
+WORK_DIR="${BUILD_WORK_DIR:-$SCRIPT_DIR/work}"
+OUTPUT_DIR="${BUILD_OUTPUT_DIR:-$SCRIPT_DIR/output}"
 CONFIG_DIR="$SCRIPT_DIR/config"
 TOOLS_DIR="$SCRIPT_DIR/tools"
+CACHE_DIR="${BUILD_CACHE_DIR:-$WORK_DIR/cache}"  # content-addressed outputs (scripts/build-cache.py)
+CHECKPOINT_DIR="$WORK_DIR/checkpoints"  # per-step input/output hashes (--resume)
 
 # Standalone baksmali/smali v3.0.9 (avoids apktool's round-trip bugs)
 BAKSMALI_JAR="$TOOLS_DIR/baksmali-3.0.9-fat.jar"
 SMALI_JAR="$TOOLS_DIR/smali-3.0.9-fat.jar"
 
+# --resume: skip every step whose checkpoint is still current
+RESUME=0
+if [ "${1:-}" = "--resume" ]; then
+    RESUME=1
+    shift
+fi
+
 # Default .apks path (auto-detected from AppManager exports)
 if [ -n "${1:-}" ]; then
     INPUT_APKS="$1"
@@ -64,7 +82,7 @@ echo ""
 
 # Check prerequisites
 echo "=== Checking prerequisites ==="
-for cmd in apktool zipalign keytool python3 java; do
+for cmd in zipalign keytool python3 java; do
     if ! command -v "$cmd" &>/dev/null; then
         echo "ERROR: Required tool not found: $cmd"
         exit 1
@@ -102,6 +120,79 @@ echo "  baksmali:  $BAKSMALI_JAR"
 echo "  smali:     $SMALI_JAR"
 echo ""
 
+# Build report: every step, stage-graph stage and script appends timing /
+# memory / I/O events here (scripts/buildreport.py); they are folded into
+# $WORK_DIR/build-report.json at the end. BUILD_PROFILE=1 also writes a
+# cProfile dump per Python script to $WORK_DIR/profile/
+mkdir -p "$WORK_DIR"
+export EDGE_FIX_EVENTS="$WORK_DIR/build-events.jsonl"
+: > "$EDGE_FIX_EVENTS"
+rm -rf "$WORK_DIR/profile"
+if [ -n "${BUILD_PROFILE:-}" ]; then
+    export EDGE_FIX_PROFILE="$WORK_DIR/profile"
+fi
+
+# Bracket a sequential step: snapshots build.sh's CPU/I/O counters and tags
+# the events of scripts run inside it. Reporting never fails the build
+step_begin() {
+    export EDGE_FIX_STAGE="$1"
+    python3 "$SCRIPT_DIR/scripts/build-report.py" begin "$1" || true
+}
+step_end() {
+    python3 "$SCRIPT_DIR/scripts/build-report.py" end "$EDGE_FIX_STAGE" || true
+    export EDGE_FIX_STAGE=""
+}
+python3 "$SCRIPT_DIR/scripts/build-report.py" begin build || true
+
+# Checkpoints: each step records the hashes of its inputs (pipeline code
+# included) and outputs when it completes (scripts/build-checkpoint.py).
+# With --resume a step is skipped while both still match, so a build that
+# failed late, or a config edit that affects one stage, re-runs only the
+# stale steps. A normal build starts from scratch
+if [ "$RESUME" -eq 0 ]; then
+    python3 "$SCRIPT_DIR/scripts/build-checkpoint.py" clear "$CHECKPOINT_DIR"
+fi
+
+# Inputs and outputs of each checkpointed step → CHECKPOINT_ARGS
+checkpoint_paths() {
+    local step="$1"
+    CHECKPOINT_ARGS=("$step")
+    case "$step" in
+        extract)
+            CHECKPOINT_ARGS+=(--in "$INPUT_APKS" --out "$EXTRACTED_DIR") ;;
+        manifest)
+            CHECKPOINT_ARGS+=(--in "$BASE_APK" "$CONFIG_DIR"/strip-{permissions,components,queries,metadata}.list
+                              --out "$PATCHED_MANIFEST") ;;
+        dex:*)
+            local dex_name="${step#dex:}"
+            CHECKPOINT_ARGS+=(--in "$BASE_APK"
+                              "$CONFIG_DIR"/{targeted-stubs,neutralize-libs,strip-classes,replace-urls}.list
+                              --out "$DEX_WORK/${dex_name%.dex}-patched.dex") ;;
+        split:*)
+            local split_name="${step#split:}"
+            CHECKPOINT_ARGS+=(--in "$EXTRACTED_DIR/$split_name" "$KEYSTORE"
+                              --out "$SIGNED_DIR/$split_name") ;;
+        repack)
+            CHECKPOINT_ARGS+=(--in "$BASE_APK" "$DEX_WORK"/*-patched.dex "$CONFIG_DIR/main-dex.list"
+                              --out "$REPACK_DIR") ;;
+        base-apk)
+            CHECKPOINT_ARGS+=(--in "$BASE_APK" "$PATCHED_MANIFEST" "$DEX_WORK"/*-patched.dex "$REPACK_DIR"
+                              "$CONFIG_DIR/strip-libs.list" "$KEYSTORE"
+                              --out "$OUTPUT_APK" "$SIGNED_DIR/base.apk") ;;
+    esac
+}
+# True (with --resume only) if a step can be skipped
+checkpoint_current() {
+    [ "$RESUME" -eq 1 ] || return 1
+    checkpoint_paths "$1"
+    python3 "$SCRIPT_DIR/scripts/build-checkpoint.py" check "$CHECKPOINT_DIR" "${CHECKPOINT_ARGS[@]}"
+}
+# Record a completed step. Checkpointing never fails the build
+checkpoint_save() {
+    checkpoint_paths "$1"
+    python3 "$SCRIPT_DIR/scripts/build-checkpoint.py" save "$CHECKPOINT_DIR" "${CHECKPOINT_ARGS[@]}" || true
+}
+
 # Check disk space (need ~1GB free for working files)
 FREE_KB=$(df -k "$HOME" | tail -1 | awk '{print $4}')
 if [ "$FREE_KB" -lt 1048576 ]; then
@@ -111,14 +202,21 @@ fi
 
 # ─── 1. Extract .apks bundle ───
 echo "=== Step 1/5: Extracting .apks bundle ==="
+step_begin extract
 EXTRACTED_DIR="$WORK_DIR/apks-extracted"
-rm -rf "$EXTRACTED_DIR"
-mkdir -p "$EXTRACTED_DIR"
-unzip -o "$INPUT_APKS" -d "$EXTRACTED_DIR" > /dev/null
+if checkpoint_current extract; then
+    echo "  [=] Already extracted (--resume)"
+else
+    rm -rf "$EXTRACTED_DIR"
+    mkdir -p "$EXTRACTED_DIR"
+    unzip -o "$INPUT_APKS" -d "$EXTRACTED_DIR" > /dev/null
+    checkpoint_save extract
+fi
 echo "  Extracted: $(ls "$EXTRACTED_DIR"/*.apk 2>/dev/null | wc -l) APK files"
 for apk in "$EXTRACTED_DIR"/*.apk; do
     echo "    $(basename "$apk") ($(ls -lh "$apk" | awk '{print $5}'))"
 done
+step_end
 echo ""
 
 # Extract version from info.json (if present in .apks bundle)
@@ -139,59 +237,87 @@ if [ ! -f "$BASE_APK" ]; then
 fi
 
 # ─── 2. Patch manifest ───
-# Strategy: decode manifest with apktool (no smali), patch the XML, recompile
-# to binary format, then extract the compiled AndroidManifest.xml
-echo "=== Step 2/5: Patching AndroidManifest.xml ==="
-
-MANIFEST_WORK="$WORK_DIR/manifest-only"
-rm -rf "$MANIFEST_WORK"
-
-# Decode manifest + resources only (skip smali to save time/space)
-echo "  Decoding manifest..."
-apktool d -s -f -o "$MANIFEST_WORK" "$BASE_APK" 2>&1 | grep -E "^I:" | head -5
-
-# Patch the decoded XML manifest
-echo "  Patching..."
-python3 "$SCRIPT_DIR/scripts/patch-manifest.py" "$MANIFEST_WORK/AndroidManifest.xml" "$CONFIG_DIR"
-
-# Recompile to get binary AndroidManifest.xml
-echo "  Recompiling to binary format..."
-AAPT2_PATH="$(which aapt2 2>/dev/null || echo "")"
-AAPT_ARGS=""
-if [ -n "$AAPT2_PATH" ]; then
-    AAPT_ARGS="-a $AAPT2_PATH"
-fi
-apktool b -f $AAPT_ARGS "$MANIFEST_WORK" -o "$WORK_DIR/manifest-rebuilt.apk" 2>&1 | tail -5
-
-# Extract the compiled binary manifest from the rebuilt APK
+# Strategy: remove the strip-*.list elements straight from the compiled
+# AndroidManifest.xml in base.apk (patch-manifest-axml.py). If the binary
+# patcher cannot handle the manifest, fall back to decoding it with apktool
+# (no smali), patching the XML and recompiling to binary format
 PATCHED_MANIFEST="$WORK_DIR/patched-manifest/AndroidManifest.xml"
+[ "$RESUME" -eq 1 ] || rm -rf "$WORK_DIR/patched-manifest"
 mkdir -p "$WORK_DIR/patched-manifest"
-unzip -o "$WORK_DIR/manifest-rebuilt.apk" AndroidManifest.xml -d "$WORK_DIR/patched-manifest" > /dev/null
-echo "  Binary manifest: $(ls -lh "$PATCHED_MANIFEST" | awk '{print $5}')"
-echo ""
+
+# Runs as the "manifest" stage of the stage graph below
+patch_manifest_stage() {
+    # Reuse the compiled manifest when base.apk's manifest/resources and the
+    # strip-*.list files are unchanged since a previous build
+    if python3 "$SCRIPT_DIR/scripts/build-cache.py" restore-manifest \
+            "$CACHE_DIR" "$BASE_APK" "$CONFIG_DIR" "$PATCHED_MANIFEST"; then
+        echo "  [=] Using cached binary manifest"
+    elif python3 "$SCRIPT_DIR/scripts/patch-manifest-axml.py" \
+            "$BASE_APK" "$CONFIG_DIR" "$PATCHED_MANIFEST"; then
+        python3 "$SCRIPT_DIR/scripts/build-cache.py" store-manifest \
+            "$CACHE_DIR" "$BASE_APK" "$CONFIG_DIR" "$PATCHED_MANIFEST"
+    else
+        echo "  [!] Binary manifest patch failed, falling back to apktool"
+        if ! command -v apktool &>/dev/null; then
+            echo "ERROR: Required tool not found: apktool"
+            exit 1
+        fi
+        MANIFEST_WORK="$WORK_DIR/manifest-only"
+        rm -rf "$MANIFEST_WORK"
+
+        # Decode manifest + resources only (skip smali to save time/space)
+        echo "  Decoding manifest..."
+        apktool d -s -f -o "$MANIFEST_WORK" "$BASE_APK" 2>&1 | grep -E "^I:" | head -5
+
+        # Patch the decoded XML manifest
+        echo "  Patching..."
+        python3 "$SCRIPT_DIR/scripts/patch-manifest.py" "$MANIFEST_WORK/AndroidManifest.xml" "$CONFIG_DIR"
+
+        # Recompile to get binary AndroidManifest.xml
+        echo "  Recompiling to binary format..."
+        AAPT2_PATH="$(which aapt2 2>/dev/null || echo "")"
+        AAPT_ARGS=""
+        if [ -n "$AAPT2_PATH" ]; then
+            AAPT_ARGS="-a $AAPT2_PATH"
+        fi
+        apktool b -f $AAPT_ARGS "$MANIFEST_WORK" -o "$WORK_DIR/manifest-rebuilt.apk" 2>&1 | tail -5
+
+        # Extract the compiled binary manifest from the rebuilt APK
+        unzip -o "$WORK_DIR/manifest-rebuilt.apk" AndroidManifest.xml -d "$WORK_DIR/patched-manifest" > /dev/null
+        python3 "$SCRIPT_DIR/scripts/build-cache.py" store-manifest \
+            "$CACHE_DIR" "$BASE_APK" "$CONFIG_DIR" "$PATCHED_MANIFEST"
+    fi
+    echo "  Binary manifest: $(ls -lh "$PATCHED_MANIFEST" | awk '{print $5}')"
+    checkpoint_save manifest
+}
 
 # ─── 3. Patch DEX ───
-# Strategy: use standalone baksmali/smali to decompile only the DEX files
-# that need changes, apply all patches, then recompile.
-# This avoids apktool's baksmali/smali round-trip bugs entirely.
+# Strategy: stub methods and nop loadLibrary calls directly in the DEX
+# bytecode (scripts/patch-dex.py, no JVM). A DEX the binary patcher cannot
+# handle (tracker packages to strip, shared code_items) falls back to
+# standalone baksmali/smali: decompile, apply all patches, recompile.
+# Either way apktool's baksmali/smali round-trip bugs are avoided.
 #
-# Three patch types are applied:
+# Four patch types are applied:
 #   a) Targeted method stubs (config/targeted-stubs.list)
 #   b) System.loadLibrary neutralization (config/neutralize-libs.list)
 #   c) Telemetry URL replacement (config/replace-urls.list)
+#   d) Tracker package removal (config/strip-classes.list)
 #
 # Note: Some DEX files (e.g. classes4.dex) contain interfaces with static
 # methods that cause IncompatibleClassChangeError after baksmali/smali
-# round-trip. These are patched via binary string replacement in Step 3b.
+# round-trip. These are patched via binary string replacement in Step 3d.
 echo "=== Step 3/5: Patching DEX ==="
 
+step_begin prepare-dex
 DEX_WORK="$WORK_DIR/dex-patch"
-rm -rf "$DEX_WORK"
+[ "$RESUME" -eq 1 ] || rm -rf "$DEX_WORK"
 mkdir -p "$DEX_WORK"
 
 TARGETED_STUBS="$CONFIG_DIR/targeted-stubs.list"
 NEUTRALIZE_LIBS="$CONFIG_DIR/neutralize-libs.list"
 REPLACE_URLS="$CONFIG_DIR/replace-urls.list"
+STRIP_CLASSES="$CONFIG_DIR/strip-classes.list"
 
 # Helper: read config file, skip comments and blanks
 read_config() {
@@ -227,13 +353,64 @@ if [ -f "$NEUTRALIZE_LIBS" ]; then
     done < <(read_config "$NEUTRALIZE_LIBS")
 fi
 
-# URL replacement is handled in two places:
-#   - During smali round-trip (Step 3a) for DEX files already being decompiled
-#   - Via binary DEX patching (Step 3b) for all remaining DEX files
-# No need to add DEX files to the round-trip set just for URL replacement.
+# Validate the smali_classesN prefixes in the config lists against the
+# class_defs of each DEX (catches classes moved between DEX files by a new
+# Edge release; affected entries are reported as "Not found" below)
+python3 "$SCRIPT_DIR/scripts/locate-class.py" "$BASE_APK" --check "$CONFIG_DIR" || \
+    echo "  [!] Update the config entries above to the suggested smali paths"
+
+# Telemetry endpoints in the original DEX files that replace-urls.list
+# misses (informational: new collectors show up as "unpatched")
+python3 "$SCRIPT_DIR/scripts/scan-endpoints.py" --summary ${BUILD_JOBS:+--jobs "$BUILD_JOBS"} \
+    "$CONFIG_DIR" "$EXTRACTED_DIR" || true
+
+# A resumed build keeps the results of the DEX stages that are still current
+# (original DEX, smali dir, *-patched.dex) and drops everything else, so
+# Steps 3c/3d start from the same state as in a fresh build
+declare -A DEX_DONE=()
+if [ "$RESUME" -eq 1 ]; then
+    KEEP_NAMES=" "
+    for dex_name in "${!DEX_NEEDS_PATCH[@]}"; do
+        if checkpoint_current "dex:$dex_name"; then
+            DEX_DONE["$dex_name"]=1
+            case "$dex_name" in
+                classes.dex) smali_dir_name="smali" ;;
+                *) smali_dir_name="smali_${dex_name%.dex}" ;;
+            esac
+            KEEP_NAMES+="$dex_name ${dex_name%.dex}-patched.dex $smali_dir_name "
+        fi
+    done
+    for entry in "$DEX_WORK"/*; do
+        [ -e "$entry" ] || continue
+        case "$KEEP_NAMES" in
+            *" $(basename "$entry") "*) ;;
+            *) rm -rf "$entry" ;;
+        esac
+    done
+    [ "${#DEX_DONE[@]}" -eq 0 ] || echo "  [=] ${#DEX_DONE[@]} DEX stage(s) up to date (--resume)"
+fi
 
-# Process each DEX file that needs patching
-for dex_name in "${!DEX_NEEDS_PATCH[@]}"; do
+# Restore cached results: a DEX whose bytes and relevant config entries are
+# unchanged since a previous build gets its *-patched.dex back (or is known
+# to need no changes) and is skipped by every step below
+declare -A DEX_CACHED
+CMDLINE_PATCHED=0
+python3 "$SCRIPT_DIR/scripts/build-cache.py" restore-dex \
+    "$CACHE_DIR" "$BASE_APK" "$CONFIG_DIR" "$DEX_WORK"
+while read -r cached_dex cached_flags; do
+    DEX_CACHED["$cached_dex"]=1
+    [ "$cached_flags" = "cmdline" ] && CMDLINE_PATCHED=1
+done < "$DEX_WORK/cache-hits"
+step_end
+
+# URL replacement and package stripping are handled in two places:
+#   - Within each "dex:<name>" stage (patch_dex / roundtrip_dex below)
+#   - Via binary DEX patching (Step 3d) for all remaining DEX files
+# No need to add DEX files to the round-trip set just for either.
+
+# Round-trip one DEX: baksmali → patch → smali. Fallback of patch_dex
+roundtrip_dex() {
+    local dex_name="$1" smali_dir_name
     echo "  Processing $dex_name..."
 
     # Extract DEX from original APK
@@ -245,51 +422,19 @@ for dex_name in "${!DEX_NEEDS_PATCH[@]}"; do
         classes*.dex) smali_dir_name="smali_${dex_name%.dex}" ;;
     esac
 
-    SMALI_OUT="$DEX_WORK/$smali_dir_name"
+    local SMALI_OUT="$DEX_WORK/$smali_dir_name"
+    rm -rf "$SMALI_OUT"
 
     # Decompile with baksmali v3.0.9
     echo "    baksmali: decompiling..."
     java -jar "$BAKSMALI_JAR" d "$DEX_WORK/$dex_name" -o "$SMALI_OUT" 2>&1
 
-    # (a) Apply targeted method stubs
-    if [ -f "$TARGETED_STUBS" ]; then
-        while IFS='|' read -r smali_path method_name; do
-            [ "$(smali_to_dex "$smali_path")" != "$dex_name" ] && continue
-            full_path="$DEX_WORK/$smali_path"
-            if [ ! -f "$full_path" ]; then
-                echo "    [!] Not found: $smali_path"
-                continue
-            fi
-            python3 "$SCRIPT_DIR/scripts/stub-method.py" "$full_path" "$method_name"
-        done < <(read_config "$TARGETED_STUBS")
-    fi
-
-    # (b) Neutralize System.loadLibrary calls
-    if [ -f "$NEUTRALIZE_LIBS" ]; then
-        while IFS= read -r smali_path; do
-            [ "$(smali_to_dex "$smali_path")" != "$dex_name" ] && continue
-            full_path="$DEX_WORK/$smali_path"
-            if [ ! -f "$full_path" ]; then
-                echo "    [!] Not found: $smali_path"
-                continue
-            fi
-            python3 "$SCRIPT_DIR/scripts/neutralize-loadlibrary.py" "$full_path"
-        done < <(read_config "$NEUTRALIZE_LIBS")
-    fi
-
-    # (c) Replace telemetry endpoint URLs across all smali files in this DEX
-    if [ -f "$REPLACE_URLS" ]; then
-        while IFS= read -r url; do
-            # Search for the URL in all smali files of this DEX
-            matching_files=$(grep -rl "$url" "$SMALI_OUT" 2>/dev/null || true)
-            for match_file in $matching_files; do
-                python3 "$SCRIPT_DIR/scripts/replace-strings.py" "$match_file" "$url" "http://127.0.0.1:18971"
-            done
-        done < <(read_config "$REPLACE_URLS")
-    fi
+    # (a-c) Targeted stubs, loadLibrary nops and URL replacement.
+    # One interpreter loads every config list, groups the operations by smali
+    # file and rewrites each file at most once (worker pool across files).
+    python3 "$SCRIPT_DIR/scripts/patch-smali.py" "$DEX_WORK" "$dex_name" "$CONFIG_DIR"
 
     # (d) Strip tracker class packages (entire directory trees)
-    STRIP_CLASSES="$CONFIG_DIR/strip-classes.list"
     if [ -f "$STRIP_CLASSES" ]; then
         while IFS= read -r pkg_prefix; do
             pkg_prefix="${pkg_prefix%%#*}"
@@ -307,54 +452,228 @@ for dex_name in "${!DEX_NEEDS_PATCH[@]}"; do
     echo "    smali: recompiling..."
     java -jar "$SMALI_JAR" a "$SMALI_OUT" -o "$DEX_WORK/${dex_name%.dex}-patched.dex" 2>&1
 
+    local ORIG_SIZE NEW_SIZE
     ORIG_SIZE=$(wc -c < "$DEX_WORK/$dex_name")
     NEW_SIZE=$(wc -c < "$DEX_WORK/${dex_name%.dex}-patched.dex")
     echo "    $dex_name: $ORIG_SIZE → $NEW_SIZE bytes"
+}
+
+# Patch one DEX in place (stubs + loadLibrary nops, then URLs), falling back
+# to the round-trip when patch-dex.py or patch-dex-strings.py exits 2 (the
+# round-trip starts over from the original DEX). Runs as a "dex:<name>" stage
+# of the stage graph below, one per DEX in DEX_NEEDS_PATCH
+patch_dex() {
+    local dex_name="$1" status=0
+    local patched="$DEX_WORK/${dex_name%.dex}-patched.dex"
+    echo "  Processing $dex_name..."
+
+    unzip -o "$BASE_APK" "$dex_name" -d "$DEX_WORK" > /dev/null
+    python3 "$SCRIPT_DIR/scripts/patch-dex.py" "$DEX_WORK/$dex_name" "$dex_name" \
+        "$CONFIG_DIR" "$patched" || status=$?
+    if [ "$status" -eq 0 ]; then
+        # (d) Tracker packages, dropped from the DEX itself
+        if [ -f "$STRIP_CLASSES" ]; then
+            python3 "$SCRIPT_DIR/scripts/strip-classes.py" --jobs 1 "$CONFIG_DIR" "$patched"
+        fi
+        # (c) Telemetry URLs, as patch-smali.py does during the round-trip
+        if [ -f "$REPLACE_URLS" ]; then
+            python3 "$SCRIPT_DIR/scripts/patch-dex-strings.py" --batch --remap --jobs 1 \
+                "$REPLACE_URLS" "http://127.0.0.1:18971" "$patched" || status=$?
+        fi
+    fi
+    if [ "$status" -eq 2 ]; then
+        echo "    Falling back to the baksmali/smali round-trip"
+        roundtrip_dex "$dex_name"
+    elif [ "$status" -ne 0 ]; then
+        return "$status"
+    fi
+    checkpoint_save "dex:$dex_name"
+}
+
+# ─── Stage graph: manifest, DEX round-trips and split re-signing ───
+# These do not depend on each other, so they run as one dependency graph
+# (scripts/run-stages.py): concurrently, bounded by CPU cores and by the
+# free memory each stage is estimated to need (JVM baksmali/smali runs are
+# the big ones). Output is streamed with a [stage] prefix and kept per stage
+# in $WORK_DIR/logs. Wall-clock time approaches the slowest single DEX.
+echo "=== Steps 2, 3 and 5 (splits): running independent stages ==="
+
+KEYSTORE="$SCRIPT_DIR/edge-fix.keystore"
+KEY_ALIAS="edge-fix"
+KEY_PASS="edge-fix-key"
+SIGNED_DIR="$OUTPUT_DIR/signed"
+[ "$RESUME" -eq 1 ] || rm -rf "$SIGNED_DIR"
+mkdir -p "$SIGNED_DIR"
+
+# Generate signing key if needed. It is written aside and hard-linked into
+# place, so concurrent batch builds all sign with the first key linked
+if [ ! -f "$KEYSTORE" ]; then
+    echo "  Generating signing keystore..."
+    keytool -genkey -v -keystore "$KEYSTORE.$$" -alias "$KEY_ALIAS" \
+        -keyalg RSA -keysize 2048 -validity 10000 \
+        -storepass "$KEY_PASS" -keypass "$KEY_PASS" \
+        -dname "CN=EdgeFix, OU=Privacy, O=EdgeFix, L=NA, S=NA, C=US" 2>/dev/null
+    ln "$KEYSTORE.$$" "$KEYSTORE" 2>/dev/null || true
+    rm -f "$KEYSTORE.$$"
+fi
+
+# Sign a single APK. Inputs written by assemble-apk.py are already
+# zipalign -p 4 aligned (page-aligned native libs), so they go straight to
+# apksigner; anything else is zipaligned first
+sign_apk() {
+    local input_apk="$1"
+    local output_name="$2"
+    local prealigned="${3:-}"
+    local aligned="${WORK_DIR}/${output_name}.aligned"
+    local signed="${SIGNED_DIR}/${output_name}"
+
+    # Replace, never rewrite in place: the delta base hard-links these files
+    rm -f "$signed"
+    if [ "$prealigned" = "aligned" ]; then
+        aligned="$input_apk"
+    else
+        zipalign -f -p 4 "$input_apk" "$aligned"
+    fi
+    "$APKSIGNER" sign \
+        --ks "$KEYSTORE" --ks-key-alias "$KEY_ALIAS" \
+        --ks-pass "pass:${KEY_PASS}" --key-pass "pass:${KEY_PASS}" \
+        --out "$signed" "$aligned" 2>&1
+    if [ "$aligned" != "$input_apk" ]; then
+        rm -f "$aligned"
+    fi
+    echo "  [x] $output_name ($(ls -lh "$signed" | awk '{print $5}'))"
+}
+
+# Re-sign one split APK with our key (signatures must match across all
+# splits). Runs as a "split:<name>" stage for splits missing from the cache
+resign_split() {
+    local split_name="$1"
+    # Strip existing signature (aligning in the same pass), then sign with our key
+    local unsigned="${WORK_DIR}/${split_name}.unsigned"
+    python3 "$SCRIPT_DIR/scripts/assemble-apk.py" "$EXTRACTED_DIR/$split_name" "$unsigned" \
+        --strip "META-INF/*" > /dev/null
+    sign_apk "$unsigned" "$split_name" aligned
+    rm -f "$unsigned"
+    python3 "$SCRIPT_DIR/scripts/build-cache.py" store-split \
+        "$CACHE_DIR" "$WORK_DIR" "$SIGNED_DIR/$split_name" || true
+    checkpoint_save "split:$split_name"
+}
+
+# Peak memory estimates per stage (MB) for the scheduler's memory budget
+STAGE_MEM_DEX=1536
+STAGE_MEM_MANIFEST=256
+STAGE_MEM_SPLIT=384
+
+export SCRIPT_DIR WORK_DIR CONFIG_DIR CACHE_DIR BASE_APK EXTRACTED_DIR PATCHED_MANIFEST \
+    DEX_WORK REPLACE_URLS STRIP_CLASSES BAKSMALI_JAR SMALI_JAR APKSIGNER KEYSTORE KEY_ALIAS KEY_PASS SIGNED_DIR \
+    CHECKPOINT_DIR
+export -f read_config sign_apk resign_split patch_manifest_stage roundtrip_dex patch_dex \
+    checkpoint_paths checkpoint_save
+
+# One stage per line: name, deps, mem_mb, command (tab-separated).
+# DEX round-trips are listed first so the longest stages start first.
+STAGES_FILE="$WORK_DIR/stages.tsv"
+: > "$STAGES_FILE"
+rm -rf "$WORK_DIR/logs"
+for dex_name in "${!DEX_NEEDS_PATCH[@]}"; do
+    [ -n "${DEX_CACHED[$dex_name]:-}" ] && continue
+    [ -n "${DEX_DONE[$dex_name]:-}" ] && continue
+    printf 'dex:%s\t-\t%s\tpatch_dex %s\n' "$dex_name" "$STAGE_MEM_DEX" "$dex_name" >> "$STAGES_FILE"
 done
+if checkpoint_current manifest; then
+    echo "  [=] manifest: up to date (--resume)"
+else
+    printf 'manifest\t-\t%s\tpatch_manifest_stage\n' "$STAGE_MEM_MANIFEST" >> "$STAGES_FILE"
+fi
+# Splits are never patched: a split signed by an earlier build with the same
+# certificate is reused as is, so only cache misses become signing stages
+SPLITS_TO_SIGN=()
+for split_apk in "$EXTRACTED_DIR"/split_*.apk; do
+    [ -f "$split_apk" ] || continue
+    split_name=$(basename "$split_apk")
+    if checkpoint_current "split:$split_name"; then
+        echo "  [=] split:$split_name: up to date (--resume)"
+        continue
+    fi
+    SPLITS_TO_SIGN+=("$split_apk")
+done
+declare -A SPLIT_CACHED=()
+if [ "${#SPLITS_TO_SIGN[@]}" -gt 0 ]; then
+    SIGNER_ID=$(python3 "$SCRIPT_DIR/scripts/build-cache.py" signer-id \
+        "$KEYSTORE" "$KEY_ALIAS" "$KEY_PASS" "$APKSIGNER")
+    python3 "$SCRIPT_DIR/scripts/build-cache.py" restore-splits \
+        "$CACHE_DIR" "$SIGNER_ID" "$WORK_DIR" "$SIGNED_DIR" "${SPLITS_TO_SIGN[@]}"
+    while read -r split_name; do
+        SPLIT_CACHED["$split_name"]=1
+        checkpoint_save "split:$split_name"
+    done < "$WORK_DIR/split-cache-hits"
+fi
+for split_apk in "${SPLITS_TO_SIGN[@]}"; do
+    split_name=$(basename "$split_apk")
+    [ -n "${SPLIT_CACHED[$split_name]:-}" ] && continue
+    printf 'split:%s\t-\t%s\tresign_split %s\n' "$split_name" "$STAGE_MEM_SPLIT" "$split_name" >> "$STAGES_FILE"
+done
+# BUILD_JOBS overrides the concurrency limit (default: CPU cores) and
+# BUILD_MEM_BUDGET the memory budget in MB (default: MemAvailable)
+step_begin stages
+python3 "$SCRIPT_DIR/scripts/run-stages.py" "$STAGES_FILE" --log-dir "$WORK_DIR/logs" \
+    ${BUILD_JOBS:+--jobs "$BUILD_JOBS"} ${BUILD_MEM_BUDGET:+--mem-budget "$BUILD_MEM_BUDGET"}
+step_end
+echo ""
 
-# NOTE: Binary DEX patching (patch-dex-strings.py) is available but disabled.
-# Replacing strings in the DEX binary breaks the sorted string_id table, causing
+# NOTE: In-place binary DEX patching breaks the sorted string_id table, causing
 # the ART verifier to reject the entire DEX file. DEX files that can't survive
-# baksmali/smali round-trip (interfaces with static methods) are left unpatched.
-# URLs in those files (classes4.dex) are documented in replace-urls.list.
+# baksmali/smali round-trip (interfaces with static methods) are instead
+# patched in Step 3d with `patch-dex-strings.py --remap`, which rebuilds the
+# DEX with string_ids re-sorted and every string reference remapped.
 
 # ─── 3c. Patch Chromium CommandLine to read flags on release builds ───
 # BuildInfo.isDebugAndroid() gates command-line flag file reading. We patch it
 # to return true so flags in /data/local/tmp/<pkg>-command-line are read without
 # requiring android:debuggable=true (which would expose the app to JDWP attacks).
-# The class may be in any DEX — scan all decompiled dirs, or decompile additional
-# DEX files if needed.
+# The class may be in any DEX — scan all decompiled dirs, or decompile the one
+# DEX that defines it if needed.
 echo "  Patching Chromium BuildInfo.isDebugAndroid()..."
-CMDLINE_PATCHED=0
+step_begin cmdline
 
-# First check already-decompiled DEX directories
-if python3 "$SCRIPT_DIR/scripts/patch-commandline.py" "$DEX_WORK" 2>/dev/null; then
+# First check already-decompiled DEX directories (unless a cached DEX
+# already carries the patch)
+if [ "$CMDLINE_PATCHED" -eq 0 ] && \
+        python3 "$SCRIPT_DIR/scripts/patch-commandline.py" "$DEX_WORK" "$BASE_APK" 2>/dev/null; then
     CMDLINE_PATCHED=1
 fi
 
-# If not found in already-decompiled DEXes, extract and scan remaining ones.
+# If not found in already-decompiled DEXes, decompile the DEX that defines
+# BuildInfo (or CommandLine), located from class_defs without baksmali.
 # BuildInfo.smali is typically in classes4.dex. Note: classes4 has interface
 # static methods that break full round-trip, but BuildInfo itself is simple
 # enough to survive targeted decompile → patch → recompile.
 if [ "$CMDLINE_PATCHED" -eq 0 ]; then
-    # List all DEX files in base.apk
-    ALL_DEXES=$(unzip -l "$BASE_APK" "classes*.dex" 2>/dev/null | grep -oP 'classes\d*\.dex' || true)
-    for extra_name in $ALL_DEXES; do
-        # Skip already-processed DEXes
-        [ -f "$DEX_WORK/$extra_name" ] && continue
-
-        echo "    Scanning $extra_name for BuildInfo..."
-        unzip -o "$BASE_APK" "$extra_name" -d "$DEX_WORK" > /dev/null 2>&1 || continue
-
+    CMDLINE_DEXES=$(python3 "$SCRIPT_DIR/scripts/locate-class.py" "$BASE_APK" --dex-only \
+        "Lorg/chromium/base/BuildInfo;" "Lorg/chromium/base/CommandLine;" 2>/dev/null || true)
+    for extra_name in $CMDLINE_DEXES; do
         case "$extra_name" in
             classes.dex) extra_smali="smali" ;;
             classes*.dex) extra_smali="smali_${extra_name%.dex}" ;;
             *) continue ;;
         esac
 
-        java -jar "$BAKSMALI_JAR" d "$DEX_WORK/$extra_name" -o "$DEX_WORK/$extra_smali" 2>&1
+        # Skip already-decompiled and cached DEXes
+        [ -d "$DEX_WORK/$extra_smali" ] && continue
+        [ -n "${DEX_CACHED[$extra_name]:-}" ] && continue
+
+        # A DEX patched in place by patch_dex is decompiled from its
+        # *-patched.dex, so the recompile keeps its stubs and URLs
+        echo "    Decompiling $extra_name (defines BuildInfo/CommandLine)..."
+        extra_dex="$DEX_WORK/${extra_name%.dex}-patched.dex"
+        if [ ! -f "$extra_dex" ]; then
+            unzip -o "$BASE_APK" "$extra_name" -d "$DEX_WORK" > /dev/null 2>&1 || continue
+            extra_dex="$DEX_WORK/$extra_name"
+        fi
 
-        if python3 "$SCRIPT_DIR/scripts/patch-commandline.py" "$DEX_WORK"; then
+        java -jar "$BAKSMALI_JAR" d "$extra_dex" -o "$DEX_WORK/$extra_smali" 2>&1
+
+        if python3 "$SCRIPT_DIR/scripts/patch-commandline.py" "$DEX_WORK" "$BASE_APK"; then
             # Recompile only the patched DEX — not the entire class set.
             # If classes4.dex has interface static method issues, smali will
             # report errors but the patched BuildInfo class is unaffected.
@@ -388,122 +707,210 @@ if [ "$CMDLINE_PATCHED" -eq 0 ]; then
     echo "  Command-line flags in /data/local/tmp/ may not be read."
     echo "  Workaround: set android:debuggable=true in manifest (less secure)"
 fi
+step_end
+
+# ─── 3d. Binary class stripping and URL replacement in the other DEX files ───
+# Every DEX not patched by a stage goes through two batch calls: strip-classes.py
+# drops the strip-classes.list packages, then patch-dex-strings.py rebuilds
+# it with all URLs replaced. Files are processed in parallel and each is
+# only rewritten if it has something to change. DEX files already patched
+# by Step 3c are updated in place; originals are staged and only promoted
+# to *-patched.dex when something changed.
+step_begin dex-binary
+if [ -f "$REPLACE_URLS" ] || [ -f "$STRIP_CLASSES" ]; then
+    echo "  Binary class stripping and URL replacement in remaining DEX files..."
+    BINARY_STAGE="$DEX_WORK/binary-stage"
+    rm -rf "$BINARY_STAGE"
+    mkdir -p "$BINARY_STAGE"
+    BINARY_TARGETS=()
+    ALL_DEXES=$(unzip -l "$BASE_APK" "classes*.dex" 2>/dev/null | grep -oP 'classes\d*\.dex' || true)
+    for other_dex in $ALL_DEXES; do
+        [ -n "${DEX_NEEDS_PATCH[$other_dex]:-}" ] && continue
+        [ -n "${DEX_CACHED[$other_dex]:-}" ] && continue
+        if [ -f "$DEX_WORK/${other_dex%.dex}-patched.dex" ]; then
+            BINARY_TARGETS+=("$DEX_WORK/${other_dex%.dex}-patched.dex")
+        else
+            unzip -o "$BASE_APK" "$other_dex" -d "$BINARY_STAGE" > /dev/null
+            BINARY_TARGETS+=("$BINARY_STAGE/$other_dex")
+        fi
+    done
+    if [ "${#BINARY_TARGETS[@]}" -gt 0 ]; then
+        if [ -f "$STRIP_CLASSES" ]; then
+            python3 "$SCRIPT_DIR/scripts/strip-classes.py" "$CONFIG_DIR" "${BINARY_TARGETS[@]}"
+        fi
+        if [ -f "$REPLACE_URLS" ]; then
+            # These are not round-tripped, so a DEX that cannot be rebuilt
+            # fails the build instead of shipping its URLs unpatched
+            python3 "$SCRIPT_DIR/scripts/patch-dex-strings.py" --batch --remap \
+                "$REPLACE_URLS" "http://127.0.0.1:18971" "${BINARY_TARGETS[@]}" || {
+                echo "  ERROR: DEX files above could not be URL-patched"
+                exit 1
+            }
+        fi
+        for staged in "$BINARY_STAGE"/classes*.dex; do
+            [ -f "$staged" ] || continue
+            staged_name="$(basename "$staged")"
+            if ! unzip -p "$BASE_APK" "$staged_name" | cmp -s - "$staged"; then
+                mv "$staged" "$DEX_WORK/${staged_name%.dex}-patched.dex"
+            fi
+        done
+    fi
+    rm -rf "$BINARY_STAGE"
+fi
+
+# Cache the result of every DEX that was not served from the cache
+CACHE_ARGS=()
+[ "$CMDLINE_PATCHED" -eq 1 ] && CACHE_ARGS+=(--cmdline-patched)
+python3 "$SCRIPT_DIR/scripts/build-cache.py" store-dex "$CACHE_DIR" "$DEX_WORK" "${CACHE_ARGS[@]}"
+step_end
 echo ""
 
+# ─── 3e. Repack DEX files (optional, REPACK_DEX=1) ───
+# The patched DEX set keeps Edge's original split, dead weight included.
+# scripts/repack-dex.py rewrites all classes into the fewest DEX files the
+# 64K string/proto/method/field/type id limits allow, main-dex.list
+# packages staying in classes.dex (or keeps the set as is if it cannot be
+# repacked into fewer files);
+# the assembly then swaps the whole classes*.dex set
+REPACK_DIR="$WORK_DIR/dex-repack"
+if [ -n "${REPACK_DEX:-}" ]; then
+    echo "=== Step 3e: Repacking DEX files ==="
+    step_begin repack
+    if checkpoint_current repack; then
+        echo "  [=] Repacked DEX files up to date (--resume)"
+    else
+        REPACK_SRC="$REPACK_DIR.src"
+        rm -rf "$REPACK_SRC"
+        mkdir -p "$REPACK_SRC"
+        unzip -o "$BASE_APK" "classes*.dex" -d "$REPACK_SRC" > /dev/null
+        for patched_dex in "$DEX_WORK"/*-patched.dex; do
+            [ -f "$patched_dex" ] || continue
+            cp "$patched_dex" "$REPACK_SRC/$(basename "$patched_dex" | sed 's/-patched//')"
+        done
+        python3 "$SCRIPT_DIR/scripts/repack-dex.py" ${BUILD_JOBS:+--jobs "$BUILD_JOBS"} \
+            "$CONFIG_DIR" "$REPACK_DIR" "$REPACK_SRC"/classes*.dex
+        rm -rf "$REPACK_SRC"
+        checkpoint_save repack
+    fi
+    step_end
+    echo ""
+else
+    rm -rf "$REPACK_DIR"
+fi
+
 # ─── 4. Assemble output APK ───
 # Strategy: copy original base.apk, replace only the patched files (DEX +
 # manifest), strip META-INF (old signatures). This preserves all original
 # resources, native libs, and unmodified DEX files byte-for-byte.
 echo "=== Step 4/5: Assembling patched APK ==="
+step_begin assemble
 
 OUTPUT_APK="$OUTPUT_DIR/EdgeCanary-${VERSION}-privacy.apk"
 mkdir -p "$OUTPUT_DIR"
 
-# Start from original base.apk
-cp "$BASE_APK" "$OUTPUT_APK"
-
-# Strip old signatures
-zip -d "$OUTPUT_APK" "META-INF/*" > /dev/null 2>&1 || true
-
-# Strip unused native libraries (saves ~36MB)
+# One streaming pass over base.apk (scripts/assemble-apk.py): drop old
+# signatures, unused native libs (saves ~36MB) and unused assets (HMS certs +
+# GRS route configs, LaTeX math — PDF viewer kept), swap in the patched
+# manifest and DEX files, and write every stored entry zipalign-aligned
+ASSEMBLE_ARGS=(
+    --strip "META-INF/*"
+    --strip "assets/hmsrootcas.bks" --strip "assets/hmsincas.bks"
+    --strip "assets/grs_sdk_global_route_config_opendevicesdk.json"
+    --strip "assets/grs_sdk_global_route_config_opensdkService.json"
+    --strip "assets/grs_sdk_server_config.json"
+    --strip "assets/org/scilab/forge/jlatexmath/*"
+    --put "AndroidManifest.xml=$PATCHED_MANIFEST"
+)
 if [ -f "$CONFIG_DIR/strip-libs.list" ]; then
     echo "  Stripping unused native libraries..."
-    STRIP_COUNT=0
-    STRIP_BYTES=0
-    while IFS= read -r lib_path; do
-        lib_path="${lib_path%%#*}"      # strip inline comments
-        lib_path="${lib_path// /}"      # trim whitespace
-        [ -z "$lib_path" ] && continue
-        # Get size before removing (for stats)
-        lib_size=$(unzip -l "$OUTPUT_APK" "$lib_path" 2>/dev/null | tail -1 | awk '{print $1}' || echo 0)
-        if zip -d "$OUTPUT_APK" "$lib_path" > /dev/null 2>&1; then
-            echo "    [-] $lib_path"
-            STRIP_COUNT=$((STRIP_COUNT + 1))
-            STRIP_BYTES=$((STRIP_BYTES + lib_size))
-        fi
-    done < "$CONFIG_DIR/strip-libs.list"
-    echo "  Stripped $STRIP_COUNT libraries (~$((STRIP_BYTES / 1048576))MB)"
+    ASSEMBLE_ARGS+=(--strip-list "$CONFIG_DIR/strip-libs.list")
 fi
-
-# Strip unused assets (HMS certs + GRS route configs, LaTeX math — PDF viewer kept)
-echo "  Stripping unused assets..."
-zip -d "$OUTPUT_APK" "assets/hmsrootcas.bks" "assets/hmsincas.bks" > /dev/null 2>&1 || true
-zip -d "$OUTPUT_APK" "assets/grs_sdk_global_route_config_opendevicesdk.json" \
-    "assets/grs_sdk_global_route_config_opensdkService.json" \
-    "assets/grs_sdk_server_config.json" > /dev/null 2>&1 || true
-zip -d "$OUTPUT_APK" "assets/org/scilab/forge/jlatexmath/*" > /dev/null 2>&1 || true
-
-# Replace patched manifest
-zip -j "$OUTPUT_APK" "$PATCHED_MANIFEST" > /dev/null
-
-# Replace patched DEX files
-if [ -d "$DEX_WORK" ]; then
+if [ -d "$REPACK_DIR" ]; then
+    # Repacked set: replaces every original classes*.dex, extra ones dropped
+    ASSEMBLE_ARGS+=(--strip "classes*.dex")
+    for repacked_dex in "$REPACK_DIR"/classes*.dex; do
+        ASSEMBLE_ARGS+=(--put "$(basename "$repacked_dex")=$repacked_dex")
+    done
+elif [ -d "$DEX_WORK" ]; then
     for patched_dex in "$DEX_WORK"/*-patched.dex; do
         [ -f "$patched_dex" ] || continue
         # e.g., classes2-patched.dex → classes2.dex
         dex_basename="$(basename "$patched_dex" | sed 's/-patched//')"
-        # zip expects the entry name, so we rename temporarily
-        cp "$patched_dex" "$DEX_WORK/$dex_basename"
-        (cd "$DEX_WORK" && zip -j "$OUTPUT_APK" "$dex_basename") > /dev/null
-        echo "  Replaced: $dex_basename"
+        ASSEMBLE_ARGS+=(--put "$dex_basename=$patched_dex")
     done
 fi
+# Assembly and base signing share one checkpoint: signing rewrites $OUTPUT_APK
+BASE_APK_CURRENT=0
+if checkpoint_current base-apk; then
+    BASE_APK_CURRENT=1
+    echo "  [=] Signed base APK up to date (--resume)"
+else
+    python3 "$SCRIPT_DIR/scripts/assemble-apk.py" "$BASE_APK" "$OUTPUT_APK" "${ASSEMBLE_ARGS[@]}"
+fi
 
 echo "  Assembled: $(ls -lh "$OUTPUT_APK" | awk '{print $5}')"
+step_end
 echo ""
 
 # ─── 5. Sign all APKs ───
-echo "=== Step 5/5: Signing APKs ==="
+echo "=== Step 5/5: Signing base APK (splits were signed in the stage graph) ==="
 
-KEYSTORE="$SCRIPT_DIR/edge-fix.keystore"
-KEY_ALIAS="edge-fix"
-KEY_PASS="edge-fix-key"
-SIGNED_DIR="$OUTPUT_DIR/signed"
-rm -rf "$SIGNED_DIR"
-mkdir -p "$SIGNED_DIR"
+# Sign base APK
+step_begin sign-base
+if [ "$BASE_APK_CURRENT" -eq 0 ]; then
+    sign_apk "$OUTPUT_APK" "base.apk" aligned
 
-# Generate signing key if needed
-if [ ! -f "$KEYSTORE" ]; then
-    echo "  Generating signing keystore..."
-    keytool -genkey -v -keystore "$KEYSTORE" -alias "$KEY_ALIAS" \
-        -keyalg RSA -keysize 2048 -validity 10000 \
-        -storepass "$KEY_PASS" -keypass "$KEY_PASS" \
-        -dname "CN=EdgeFix, OU=Privacy, O=EdgeFix, L=NA, S=NA, C=US" 2>/dev/null
+    # Copy signed base to output path
+    cp "${SIGNED_DIR}/base.apk" "$OUTPUT_APK"
+    checkpoint_save base-apk
 fi
+step_end
+echo ""
 
-# Sign a single APK: zipalign (page-aligned for native libs) → apksigner
-sign_apk() {
-    local input_apk="$1"
-    local output_name="$2"
-    local aligned="${WORK_DIR}/${output_name}.aligned"
-    local signed="${SIGNED_DIR}/${output_name}"
-
-    zipalign -f -p 4 "$input_apk" "$aligned"
-    "$APKSIGNER" sign \
-        --ks "$KEYSTORE" --ks-key-alias "$KEY_ALIAS" \
-        --ks-pass "pass:${KEY_PASS}" --key-pass "pass:${KEY_PASS}" \
-        --out "$signed" "$aligned" 2>&1
-    rm -f "$aligned"
-    echo "  [x] $output_name ($(ls -lh "$signed" | awk '{print $5}'))"
-}
-
-# Sign base APK
-sign_apk "$OUTPUT_APK" "base.apk"
-
-# Re-sign split APKs with our key (signatures must match across all splits)
-for split_apk in "$EXTRACTED_DIR"/split_*.apk; do
-    [ -f "$split_apk" ] || continue
-    split_name=$(basename "$split_apk")
-    # Strip existing signature, then sign with our key
-    UNSIGNED="${WORK_DIR}/${split_name}.unsigned"
-    cp "$split_apk" "$UNSIGNED"
-    zip -d "$UNSIGNED" "META-INF/*" > /dev/null 2>&1 || true
-    sign_apk "$UNSIGNED" "$split_name"
-    rm -f "$UNSIGNED"
+# ─── Deltas against the previous build ───
+# Each signed APK that changed since the last completed build gets a delta
+# in output/delta/ (scripts/apk-delta.py): only changed zip entries and
+# blocks travel, and `apk-delta.py apply` rebuilds the exact signed APK on
+# the receiving side. This build's APKs then become the next delta base
+echo "=== Deltas against the previous build ==="
+step_begin delta
+DELTA_BASE="$WORK_DIR/delta-base"
+DELTA_DIR="$OUTPUT_DIR/delta"
+CHANGED_APKS=()
+for signed_apk in "$SIGNED_DIR"/*.apk; do
+    apk_name=$(basename "$signed_apk")
+    cmp -s "$DELTA_BASE/$apk_name" "$signed_apk" 2>/dev/null || CHANGED_APKS+=("$apk_name")
 done
+if [ ! -d "$DELTA_BASE" ]; then
+    echo "  [=] No previous build yet, deltas start with the next one"
+elif [ "${#CHANGED_APKS[@]}" -eq 0 ]; then
+    echo "  [=] No APK changed since the previous build (output/delta/ kept)"
+else
+    rm -rf "$DELTA_DIR"
+    mkdir -p "$DELTA_DIR"
+    for apk_name in "${CHANGED_APKS[@]}"; do
+        if [ ! -f "$DELTA_BASE/$apk_name" ]; then
+            echo "    [!] $apk_name: not in the previous build, transfer it in full"
+            continue
+        fi
+        python3 "$SCRIPT_DIR/scripts/apk-delta.py" make "$DELTA_BASE/$apk_name" \
+            "$SIGNED_DIR/$apk_name" "$DELTA_DIR/$apk_name.delta" || \
+            echo "    [!] $apk_name: no delta, transfer it in full"
+    done
+fi
+if [ "${#CHANGED_APKS[@]}" -gt 0 ]; then
+    rm -rf "$DELTA_BASE"
+    mkdir -p "$DELTA_BASE"
+    for signed_apk in "$SIGNED_DIR"/*.apk; do
+        ln -f "$signed_apk" "$DELTA_BASE/" 2>/dev/null || cp "$signed_apk" "$DELTA_BASE/"
+    done
+fi
+step_end
 
-# Copy signed base to output path
-cp "${SIGNED_DIR}/base.apk" "$OUTPUT_APK"
+echo ""
+echo "=== Build report ==="
+python3 "$SCRIPT_DIR/scripts/build-report.py" end build || true
+python3 "$SCRIPT_DIR/scripts/build-report.py" summarize "$WORK_DIR/build-report.json" || true
 
 echo ""
 echo "╔══════════════════════════════════════════════════════╗"
@@ -0,0 +1,67 @@
+#!/data/data/com.termux/files/usr/bin/python3
+"""
+apk-delta.py - Ship a rebuilt APK as a delta against the previous build.
+
+`make` writes a per-entry delta (apkdelta.py) that turns the previous
+signed APK into the new one: unchanged zip entries, and the unchanged
+blocks of changed ones, become references into the old file. `apply`
+runs on the receiving side (plain python3 with apkdelta.py, dexio.py
+and buildreport.py) and rebuilds the new APK byte for byte, signature
+included, after checking it holds the build the delta was made against.
+
+build.sh makes output/delta/<name>.delta for every signed APK that
+changed since the previous build.
+
+Usage: python3 apk-delta.py make <old.apk> <new.apk> <out.delta>
+       python3 apk-delta.py apply <old.apk> <in.delta> <out.apk>
+"""
+
+import argparse
+import os
+import sys
+
+import buildreport
+from apkdelta import DeltaError, apply_delta, file_sha256, make_delta
+
+
+def format_size(size: int) -> str:
+    if size >= 1 << 20:
+        return f"{size / (1 << 20):.1f} MB"
+    return f"{size / 1024:.1f} KB"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Make or apply a binary delta between two APK builds")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("make", help="write the delta from old.apk to new.apk")
+    p.add_argument("old", help="previous build")
+    p.add_argument("new", help="new build")
+    p.add_argument("delta", help="output delta file")
+    p = sub.add_parser("apply", help="rebuild new.apk from old.apk and a delta")
+    p.add_argument("old", help="previous build, as installed from")
+    p.add_argument("delta", help="delta made by `make`")
+    p.add_argument("out", help="rebuilt APK")
+    args = parser.parse_args()
+
+    name = os.path.basename(args.old if args.command == "apply" else args.new)
+    try:
+        if args.command == "make":
+            if file_sha256(args.old) == file_sha256(args.new):
+                print(f"    [=] {name}: unchanged, no delta needed")
+                return
+            stats = make_delta(args.old, args.new, args.delta)
+            reused = 100 * stats["copied"] / max(stats["new_size"], 1)
+            print(f"    [x] {name}: {format_size(stats['delta_size'])} delta for "
+                  f"{format_size(stats['new_size'])} ({reused:.1f}% reused from the previous build)")
+            buildreport.count(files=1)
+        else:
+            size = apply_delta(args.old, args.delta, args.out)
+            print(f"    [x] {args.out}: rebuilt {format_size(size)}, checksum verified")
+            buildreport.count(files=1)
+    except (OSError, ValueError, DeltaError) as e:
+        print(f"    [!] {name}: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    buildreport.run(main)
@@ -0,0 +1,258 @@
+"""
+apkdelta.py - Per-entry binary delta between two builds of a signed APK.
+
+A delta rebuilds the exact bytes of a new APK from the previous build of
+the same APK, so a nightly rebuild only has to ship what changed:
+
+  copy ops      byte ranges of the old APK: every zip entry whose local
+                header and data are unchanged, and the unchanged blocks of
+                a changed entry (a stored DEX patched in place differs in a
+                handful of BLOCK_SIZE blocks)
+  literal ops   everything else (new or recompressed entries, the APK
+                signing block, central directory), as one zlib stream
+
+Entries are matched by name, so entries that moved (an earlier entry grew
+or shrank) are still copied. Adjacent ops are coalesced.
+
+Format: HEADER (magic, version, old size + SHA-256, new size + SHA-256),
+then a zlib stream of ops:
+  b"C" <u64 old offset> <u64 length>
+  b"L" <u64 length> <length bytes>
+  b"E"
+apply_delta() checks the old APK against the recorded hash before writing
+and the result after, so a delta applied to the wrong base fails instead
+of leaving a broken APK. Only the standard library is needed to apply one.
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+import zipfile
+import zlib
+
+from dexio import temp_beside
+
+MAGIC = b"APKDELTA"
+VERSION = 1
+HEADER = struct.Struct("<8sHQ32sQ32s")
+COPY_OP = struct.Struct("<QQ")
+LITERAL_OP = struct.Struct("<Q")
+LOCAL_HEADER = struct.Struct("<4sHHHHHIIIHH")
+LOCAL_MAGIC = b"PK\x03\x04"
+
+BLOCK_SIZE = 4096
+COPY_CHUNK = 1 << 20
+
+
+class DeltaError(Exception):
+    pass
+
+
+def file_sha256(path: str) -> bytes:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(COPY_CHUNK), b""):
+            h.update(chunk)
+    return h.digest()
+
+
+def _entries(path: str, data) -> list[tuple[str, int, int, int]]:
+    """(name, local header offset, data offset, data end) of every entry,
+    in file order."""
+    entries = []
+    with zipfile.ZipFile(path) as zf:
+        for info in zf.infolist():
+            header = LOCAL_HEADER.unpack_from(data, info.header_offset)
+            if header[0] != LOCAL_MAGIC:
+                raise DeltaError(f"{path}: {info.filename}: bad local file header")
+            data_off = info.header_offset + LOCAL_HEADER.size + header[9] + header[10]
+            entries.append((info.filename, info.header_offset, data_off,
+                            data_off + info.compress_size))
+    entries.sort(key=lambda e: e[1])
+    return entries
+
+
+class _OpWriter:
+    """Walks the new APK front to back, coalescing copy and literal runs
+    into ops on a zlib stream."""
+
+    def __init__(self, out, new):
+        self.out = out
+        self.new = new
+        self.z = zlib.compressobj(9)
+        self.pos = 0                     # bytes of the new APK covered so far
+        self.copy_start: int | None = None
+        self.copy_len = 0
+        self.literal_start: int | None = None
+        self.copied = 0
+
+    def _emit(self, data) -> None:
+        self.out.write(self.z.compress(data))
+
+    def _flush(self) -> None:
+        if self.copy_start is not None:
+            self._emit(b"C" + COPY_OP.pack(self.copy_start, self.copy_len))
+            self.copied += self.copy_len
+            self.copy_start = None
+        elif self.literal_start is not None:
+            self._emit(b"L" + LITERAL_OP.pack(self.pos - self.literal_start))
+            with memoryview(self.new) as view:
+                for off in range(self.literal_start, self.pos, COPY_CHUNK):
+                    self._emit(view[off:min(off + COPY_CHUNK, self.pos)])
+            self.literal_start = None
+
+    def copy(self, old_off: int, length: int) -> None:
+        if not length:
+            return
+        if self.copy_start is None or self.copy_start + self.copy_len != old_off:
+            self._flush()
+            self.copy_start, self.copy_len = old_off, 0
+        self.copy_len += length
+        self.pos += length
+
+    def literal(self, length: int) -> None:
+        if not length:
+            return
+        if self.literal_start is None:
+            self._flush()
+            self.literal_start = self.pos
+        self.pos += length
+
+    def close(self) -> None:
+        self._flush()
+        self._emit(b"E")
+        self.out.write(self.z.flush())
+
+
+def _diff_range(ops: _OpWriter, old, old_off: int, old_len: int,
+                new, new_off: int, new_len: int) -> None:
+    """Copy the BLOCK_SIZE blocks of new[new_off:] that equal the block at
+    the same position in old[old_off:]; the rest is literal."""
+    common = min(old_len, new_len)
+    with memoryview(old) as old_view, memoryview(new) as new_view:
+        for off in range(0, common, BLOCK_SIZE):
+            size = min(BLOCK_SIZE, common - off)
+            if old_view[old_off + off:old_off + off + size] == new_view[new_off + off:new_off + off + size]:
+                ops.copy(old_off + off, size)
+            else:
+                ops.literal(size)
+    if new_len > common:
+        ops.literal(new_len - common)
+
+
+def make_delta(old_path: str, new_path: str, delta_path: str) -> dict:
+    """Write the delta that turns old_path into new_path.
+
+    Returns {"old_size", "new_size", "copied", "delta_size"}.
+    """
+    with open(old_path, "rb") as fo, open(new_path, "rb") as fn, \
+            mmap.mmap(fo.fileno(), 0, access=mmap.ACCESS_READ) as old, \
+            mmap.mmap(fn.fileno(), 0, access=mmap.ACCESS_READ) as new:
+        old_entries = {name: (hdr, data, end) for name, hdr, data, end in _entries(old_path, old)}
+        header = HEADER.pack(MAGIC, VERSION, len(old), hashlib.sha256(old).digest(),
+                             len(new), hashlib.sha256(new).digest())
+
+        fd, tmp = temp_beside(delta_path, ".delta-")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                out.write(header)
+                ops = _OpWriter(out, new)
+                for name, hdr, data, end in _entries(new_path, new):
+                    if hdr > ops.pos:
+                        ops.literal(hdr - ops.pos)     # data descriptor or gap
+                    match = old_entries.get(name)
+                    if match is None:
+                        ops.literal(end - hdr)
+                        continue
+                    old_hdr, old_data, old_end = match
+                    _diff_range(ops, old, old_hdr, old_data - old_hdr, new, hdr, data - hdr)
+                    _diff_range(ops, old, old_data, old_end - old_data, new, data, end - data)
+                ops.literal(len(new) - ops.pos)       # signing block, central directory
+                ops.close()
+            os.replace(tmp, delta_path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        return {"old_size": len(old), "new_size": len(new), "copied": ops.copied,
+                "delta_size": os.path.getsize(delta_path)}
+
+
+class _Inflater:
+    """Reads exact byte counts from the zlib op stream of a delta."""
+
+    def __init__(self, f):
+        self.f = f
+        self.z = zlib.decompressobj()
+        self.buf = bytearray()
+
+    def read(self, n: int) -> bytes:
+        while len(self.buf) < n:
+            data = self.z.unconsumed_tail or self.f.read(COPY_CHUNK)
+            if not data:
+                raise DeltaError("truncated delta")
+            self.buf += self.z.decompress(data, COPY_CHUNK)
+        out = bytes(self.buf[:n])
+        del self.buf[:n]
+        return out
+
+
+def read_header(f) -> tuple[int, bytes, int, bytes]:
+    """(old size, old SHA-256, new size, new SHA-256) of an open delta."""
+    raw = f.read(HEADER.size)
+    if len(raw) != HEADER.size:
+        raise DeltaError("not an APK delta (truncated header)")
+    magic, version, old_size, old_hash, new_size, new_hash = HEADER.unpack(raw)
+    if magic != MAGIC:
+        raise DeltaError("not an APK delta (bad magic)")
+    if version != VERSION:
+        raise DeltaError(f"unsupported delta version {version}")
+    return old_size, old_hash, new_size, new_hash
+
+
+def apply_delta(old_path: str, delta_path: str, out_path: str) -> int:
+    """Rebuild the new APK from old_path and a delta; returns its size.
+
+    Raises DeltaError if old_path is not the build the delta was made
+    against, or if the result does not hash as recorded.
+    """
+    with open(delta_path, "rb") as df, open(old_path, "rb") as old:
+        old_size, old_hash, new_size, new_hash = read_header(df)
+        if os.fstat(old.fileno()).st_size != old_size or file_sha256(old_path) != old_hash:
+            raise DeltaError(f"{old_path} is not the APK this delta was made against")
+
+        stream = _Inflater(df)
+        h = hashlib.sha256()
+        fd, tmp = temp_beside(out_path, ".apply-")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                def write(chunk: bytes) -> None:
+                    out.write(chunk)
+                    h.update(chunk)
+
+                while (op := stream.read(1)) != b"E":
+                    if op == b"C":
+                        offset, remaining = COPY_OP.unpack(stream.read(COPY_OP.size))
+                        old.seek(offset)
+                        while remaining:
+                            chunk = old.read(min(COPY_CHUNK, remaining))
+                            if not chunk:
+                                raise DeltaError("copy op past the end of the old APK")
+                            write(chunk)
+                            remaining -= len(chunk)
+                    elif op == b"L":
+                        remaining, = LITERAL_OP.unpack(stream.read(LITERAL_OP.size))
+                        while remaining:
+                            chunk = stream.read(min(COPY_CHUNK, remaining))
+                            write(chunk)
+                            remaining -= len(chunk)
+                    else:
+                        raise DeltaError(f"corrupt delta (op {op!r})")
+                size = out.tell()
+            if size != new_size or h.digest() != new_hash:
+                raise DeltaError("rebuilt APK does not match the delta's checksum")
+            os.replace(tmp, out_path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+    return new_size
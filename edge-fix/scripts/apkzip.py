@@ -0,0 +1,183 @@
+"""
+apkzip.py - Single-pass APK rewriter: raw entry copy, strip, inject, align.
+
+Reads the source zip's central directory once and streams every kept entry's
+compressed bytes straight to the output (no inflate/deflate), skipping
+stripped entries and substituting replaced ones. Each local header is
+written with the alignment padding zipalign -p 4 would add (4 bytes for
+stored entries, 4096 for stored .so files), using the same 0xd935 extra
+field as apksigner, so the result needs no separate zipalign pass.
+
+Only what APKs use is supported: no zip64, no encryption, no multi-disk.
+"""
+
+import fnmatch
+import struct
+import zipfile
+import zlib
+
+LOCAL_HEADER = struct.Struct("<4sHHHHHIIIHH")
+CENTRAL_HEADER = struct.Struct("<4sHHHHHHIIIHHHHHII")
+END_OF_CENTRAL_DIR = struct.Struct("<4sHHHHIIH")
+LOCAL_MAGIC = b"PK\x03\x04"
+CENTRAL_MAGIC = b"PK\x01\x02"
+END_MAGIC = b"PK\x05\x06"
+
+FLAG_DATA_DESCRIPTOR = 0x0008
+FLAG_UTF8 = 0x0800
+ALIGNMENT_EXTRA_ID = 0xD935   # apksigner's alignment extra field
+ALIGNMENT_EXTRA_MIN = 6       # id + size + u16 alignment
+STORED_ALIGNMENT = 4
+LIBRARY_ALIGNMENT = 4096      # zipalign -p: page-align stored .so files
+ZIP32_LIMIT = 0xFFFFFFFF
+COPY_CHUNK = 1 << 20
+
+
+def entry_alignment(name: str, compress_type: int) -> int:
+    """Data alignment zipalign -p 4 gives an entry (1 = none)."""
+    if compress_type != zipfile.ZIP_STORED:
+        return 1
+    return LIBRARY_ALIGNMENT if name.endswith(".so") else STORED_ALIGNMENT
+
+
+def _encode_name(info: zipfile.ZipInfo) -> bytes:
+    return info.filename.encode("utf-8" if info.flag_bits & FLAG_UTF8 else "cp437")
+
+
+def _dos_datetime(date_time: tuple) -> tuple[int, int]:
+    year, month, day, hour, minute, second = date_time
+    return (hour << 11) | (minute << 5) | (second // 2), ((year - 1980) << 9) | (month << 5) | day
+
+
+class ApkWriter:
+    """Writes zip entries with zipalign-compatible padding, then the central directory."""
+
+    def __init__(self, f):
+        self.f = f
+        self.offset = 0
+        self.central: list[bytes] = []
+
+    def _local_header(self, info: zipfile.ZipInfo, name: bytes, flags: int, crc: int,
+                      compress_size: int, file_size: int) -> bytes:
+        alignment = entry_alignment(info.filename, info.compress_type)
+        data_start = self.offset + LOCAL_HEADER.size + len(name)
+        pad = -data_start % alignment
+        if 0 < pad < ALIGNMENT_EXTRA_MIN:
+            pad += alignment * (-(-(ALIGNMENT_EXTRA_MIN - pad) // alignment))
+        extra = b""
+        if pad:
+            extra = struct.pack("<HHH", ALIGNMENT_EXTRA_ID, pad - 4, alignment) + bytes(pad - 6)
+        mod_time, mod_date = _dos_datetime(info.date_time)
+        return LOCAL_HEADER.pack(LOCAL_MAGIC, info.extract_version, flags, info.compress_type,
+                                 mod_time, mod_date, crc, compress_size, file_size,
+                                 len(name), len(extra)) + name + extra
+
+    def _add(self, info: zipfile.ZipInfo, crc: int, compress_size: int, file_size: int,
+             write_data) -> None:
+        if max(self.offset, compress_size, file_size) >= ZIP32_LIMIT:
+            raise ValueError(f"{info.filename}: zip64 archives are not supported")
+        name = _encode_name(info)
+        flags = info.flag_bits & ~FLAG_DATA_DESCRIPTOR
+        header_offset = self.offset
+        header = self._local_header(info, name, flags, crc, compress_size, file_size)
+        self.f.write(header)
+        write_data()
+        self.offset += len(header) + compress_size
+        mod_time, mod_date = _dos_datetime(info.date_time)
+        comment = info.comment or b""
+        self.central.append(CENTRAL_HEADER.pack(
+            CENTRAL_MAGIC, (info.create_system << 8) | info.create_version,
+            info.extract_version, flags, info.compress_type, mod_time, mod_date,
+            crc, compress_size, file_size, len(name), 0, len(comment),
+            0, info.internal_attr, info.external_attr, header_offset) + name + comment)
+
+    def copy_entry(self, src, info: zipfile.ZipInfo) -> None:
+        """Copy an entry's compressed bytes from an open source file unchanged."""
+        src.seek(info.header_offset)
+        local = LOCAL_HEADER.unpack(src.read(LOCAL_HEADER.size))
+        if local[0] != LOCAL_MAGIC:
+            raise ValueError(f"{info.filename}: bad local file header")
+        src.seek(info.header_offset + LOCAL_HEADER.size + local[9] + local[10])
+
+        def write_data():
+            remaining = info.compress_size
+            while remaining:
+                chunk = src.read(min(COPY_CHUNK, remaining))
+                if not chunk:
+                    raise ValueError(f"{info.filename}: truncated entry data")
+                self.f.write(chunk)
+                remaining -= len(chunk)
+
+        self._add(info, info.CRC, info.compress_size, info.file_size, write_data)
+
+    def add_entry(self, info: zipfile.ZipInfo, data: bytes) -> None:
+        """Write new contents under info's name, compression and metadata."""
+        if info.compress_type == zipfile.ZIP_STORED:
+            payload = data
+        else:
+            info.compress_type = zipfile.ZIP_DEFLATED
+            compressor = zlib.compressobj(9, zlib.DEFLATED, -15)
+            payload = compressor.compress(data) + compressor.flush()
+        self._add(info, zlib.crc32(data), len(payload), len(data),
+                  lambda: self.f.write(payload))
+
+    def close(self) -> None:
+        central = b"".join(self.central)
+        if len(self.central) > 0xFFFF or self.offset + len(central) >= ZIP32_LIMIT:
+            raise ValueError("zip64 archives are not supported")
+        self.f.write(central)
+        self.f.write(END_OF_CENTRAL_DIR.pack(END_MAGIC, 0, 0, len(self.central),
+                                             len(self.central), len(central), self.offset, 0))
+
+
+def assemble_apk(src_path: str, out_path: str, strip: list[str],
+                 replace: dict[str, str]) -> tuple[list[tuple[str, int]], list[str]]:
+    """Rewrite src_path to out_path in one pass.
+
+    strip      fnmatch patterns (as for zip -d) of entries to drop
+    replace    entry name → file whose contents replace (or add) the entry
+
+    Returns (stripped, replaced): (entry name, compressed bytes saved)
+    for every dropped entry and the names of replaced/added entries.
+    """
+    stripped: list[tuple[str, int]] = []
+    replaced: list[str] = []
+    pending = dict(replace)
+
+    def read_file(path):
+        with open(path, "rb") as f:
+            return f.read()
+
+    with zipfile.ZipFile(src_path) as zf, open(src_path, "rb") as src, \
+            open(out_path, "wb") as out:
+        writer = ApkWriter(out)
+        for info in zf.infolist():
+            name = info.filename
+            if name in pending:
+                writer.add_entry(info, read_file(pending.pop(name)))
+                replaced.append(name)
+            elif any(fnmatch.fnmatchcase(name, pattern) for pattern in strip):
+                stripped.append((name, info.compress_size))
+            else:
+                writer.copy_entry(src, info)
+        for name, path in pending.items():
+            info = zipfile.ZipInfo(name, date_time=(1981, 1, 1, 1, 1, 2))
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = 0o644 << 16
+            writer.add_entry(info, read_file(path))
+            replaced.append(name)
+        writer.close()
+    return stripped, replaced
+
+
+def misaligned_entries(path: str) -> list[str]:
+    """Names of entries whose data is not aligned as zipalign -p 4 requires."""
+    bad = []
+    with zipfile.ZipFile(path) as zf, open(path, "rb") as f:
+        for info in zf.infolist():
+            f.seek(info.header_offset + 26)
+            name_len, extra_len = struct.unpack("<HH", f.read(4))
+            data_start = info.header_offset + LOCAL_HEADER.size + name_len + extra_len
+            if data_start % entry_alignment(info.filename, info.compress_type):
+                bad.append(info.filename)
+    return bad
@@ -0,0 +1,89 @@
+#!/data/data/com.termux/files/usr/bin/python3
+"""
+assemble-apk.py - Build an aligned, unsigned APK from an original in one pass.
+
+Streams the source APK once (apkzip.py): kept entries are copied as raw
+compressed bytes, entries matching --strip patterns or a --strip-list file
+(strip-libs.list format) are dropped, --put files replace or add entries,
+and every stored entry is written zipalign -p 4 aligned. This replaces the
+per-entry `zip -d` / `zip -j` rewrites of the whole archive plus zipalign.
+
+Bytes saved are reported per --strip-list entry (the compressed size each
+dropped lib occupied in the APK).
+
+Usage: python3 assemble-apk.py <in.apk> <out.apk> [--strip PATTERN]...
+           [--strip-list FILE]... [--put ENTRY=FILE]...
+"""
+
+import argparse
+import fnmatch
+import sys
+
+from apkzip import assemble_apk, misaligned_entries
+import buildreport
+from edgeconfig import read_config
+
+
+def format_size(size: int) -> str:
+    if size >= 1 << 20:
+        return f"{size / (1 << 20):.1f} MB"
+    return f"{size / 1024:.1f} KB"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Strip, replace and align APK entries in a single pass.")
+    parser.add_argument("src", help="original APK")
+    parser.add_argument("out", help="output APK (unsigned, aligned)")
+    parser.add_argument("--strip", action="append", default=[], metavar="PATTERN",
+                        help="drop entries matching a zip -d style wildcard")
+    parser.add_argument("--strip-list", action="append", default=[], metavar="FILE",
+                        help="drop the entries listed in FILE (reported per entry)")
+    parser.add_argument("--put", action="append", default=[], metavar="ENTRY=FILE",
+                        help="replace (or add) ENTRY with the contents of FILE")
+    args = parser.parse_args()
+
+    listed: list[str] = []
+    for path in args.strip_list:
+        # Inline comments are allowed after an entry, as in strip-libs.list
+        listed += [e.split("#", 1)[0].strip() for e in read_config(path)]
+    listed = [e for e in listed if e]
+
+    replace: dict[str, str] = {}
+    for spec in args.put:
+        entry, sep, path = spec.partition("=")
+        if not sep or not entry or not path:
+            parser.error(f"--put expects ENTRY=FILE, got {spec!r}")
+        replace[entry] = path
+
+    try:
+        stripped, replaced = assemble_apk(args.src, args.out, args.strip + listed, replace)
+    except (OSError, ValueError) as e:
+        print(f"  ERROR: {e}")
+        sys.exit(1)
+
+    lib_count = lib_bytes = other_count = other_bytes = 0
+    for name, size in stripped:
+        if any(fnmatch.fnmatchcase(name, pattern) for pattern in listed):
+            print(f"    [-] {name} ({format_size(size)})")
+            lib_count += 1
+            lib_bytes += size
+        else:
+            other_count += 1
+            other_bytes += size
+    if listed:
+        print(f"  Stripped {lib_count} listed entries ({format_size(lib_bytes)})")
+    if other_count:
+        print(f"  Stripped {other_count} other entries ({format_size(other_bytes)})")
+    for name in replaced:
+        print(f"  Replaced: {name}")
+    buildreport.count(files=1, patches=len(stripped) + len(replaced))
+
+    misaligned = misaligned_entries(args.out)
+    if misaligned:
+        print(f"  ERROR: {len(misaligned)} entries not aligned, e.g. {misaligned[0]}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    buildreport.run(main)
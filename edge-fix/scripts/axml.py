@@ -0,0 +1,205 @@
+"""
+axml.py - Binary Android XML (AXML) reader/writer for compiled manifests.
+
+A compiled AndroidManifest.xml is a RES_XML chunk holding a string pool, a
+resource-ID map and a flat list of node chunks (namespace/element start and
+end, CDATA). Editing it in place avoids the apktool decode + full resource
+recompile just to drop a few elements:
+
+  - removing an element removes its start..end node chunks, so nothing
+    else in the file moves or needs re-indexing
+  - attribute values are fixed-size Res_value records, patched in place
+  - the string pool is written back byte-for-byte (strings only used by
+    removed elements stay in the pool, unreferenced, as aapt2 allows)
+
+Format reference: frameworks/base/libs/androidfw/include/androidfw/ResourceTypes.h
+"""
+
+import struct
+
+# ResChunk_header types
+RES_STRING_POOL_TYPE = 0x0001
+RES_XML_TYPE = 0x0003
+RES_XML_START_NAMESPACE_TYPE = 0x0100
+RES_XML_END_NAMESPACE_TYPE = 0x0101
+RES_XML_START_ELEMENT_TYPE = 0x0102
+RES_XML_END_ELEMENT_TYPE = 0x0103
+RES_XML_CDATA_TYPE = 0x0104
+RES_XML_RESOURCE_MAP_TYPE = 0x0180
+
+UTF8_FLAG = 0x100
+NO_ENTRY = 0xFFFFFFFF
+
+# Res_value data types
+TYPE_NULL = 0x00
+TYPE_REFERENCE = 0x01
+TYPE_STRING = 0x03
+TYPE_INT_DEC = 0x10
+
+ANDROID_NS = "http://schemas.android.com/apk/res/android"
+# android:name / android:value attribute resource IDs
+ATTR_NAME = 0x01010003
+ATTR_VALUE = 0x01010024
+
+_CHUNK_HEADER = struct.Struct("<HHI")
+_ELEMENT_EXT = struct.Struct("<IIHHHHHH")
+_ATTRIBUTE = struct.Struct("<IIIHBBI")
+
+
+class AxmlFormatError(ValueError):
+    """Raised when a buffer is not a well-formed binary XML document."""
+
+
+def _chunk_header(data: bytes, offset: int) -> tuple[int, int, int]:
+    if offset + _CHUNK_HEADER.size > len(data):
+        raise AxmlFormatError(f"truncated chunk header at 0x{offset:x}")
+    chunk_type, header_size, size = _CHUNK_HEADER.unpack_from(data, offset)
+    if size < header_size or offset + size > len(data):
+        raise AxmlFormatError(f"bad chunk size 0x{size:x} at 0x{offset:x}")
+    return chunk_type, header_size, size
+
+
+def _decode_pool_string(data: bytes, offset: int, utf8: bool) -> str:
+    if utf8:
+        # u8 length in chars, then u8 length in bytes (each 1-2 bytes)
+        if data[offset] & 0x80:
+            offset += 1
+        offset += 1
+        length = data[offset]
+        if length & 0x80:
+            length = ((length & 0x7F) << 8) | data[offset + 1]
+            offset += 1
+        offset += 1
+        return data[offset:offset + length].decode("utf-8", errors="replace")
+    length = struct.unpack_from("<H", data, offset)[0]
+    offset += 2
+    if length & 0x8000:
+        length = ((length & 0x7FFF) << 16) | struct.unpack_from("<H", data, offset)[0]
+        offset += 2
+    return data[offset:offset + length * 2].decode("utf-16-le", errors="replace")
+
+
+def parse_string_pool(data: bytes, offset: int) -> list[str]:
+    """Decode every string of the ResStringPool chunk at offset."""
+    _type, header_size, _size = _chunk_header(data, offset)
+    count, _styles, flags, strings_start, _styles_start = struct.unpack_from(
+        "<IIIII", data, offset + 8)
+    utf8 = bool(flags & UTF8_FLAG)
+    offsets = struct.unpack_from(f"<{count}I", data, offset + header_size)
+    base = offset + strings_start
+    return [_decode_pool_string(data, base + off, utf8) for off in offsets]
+
+
+class XmlAttribute:
+    """One ResXMLTree_attribute of a start-element node."""
+
+    def __init__(self, node: "XmlNode", offset: int):
+        self.node = node
+        self.offset = offset  # within node.data
+        (self.ns, self.name, self.raw_value, _size, _res0,
+         self.data_type, self.data) = _ATTRIBUTE.unpack_from(node.data, offset)
+
+    def set_value(self, data_type: int, data: int, raw_value: int = NO_ENTRY) -> None:
+        """Overwrite the typed value (and raw string) in place."""
+        self.raw_value, self.data_type, self.data = raw_value, data_type, data
+        struct.pack_into("<I", self.node.data, self.offset + 8, raw_value)
+        struct.pack_into("<BI", self.node.data, self.offset + 15, data_type, data)
+
+
+class XmlNode:
+    """A node chunk; start-element nodes also expose name and attributes."""
+
+    def __init__(self, chunk_type: int, data: bytearray, header_size: int):
+        self.type = chunk_type
+        self.data = data
+        self.ns = self.name = NO_ENTRY
+        self.attributes: list[XmlAttribute] = []
+        if chunk_type in (RES_XML_START_ELEMENT_TYPE, RES_XML_END_ELEMENT_TYPE):
+            self.ns, self.name = struct.unpack_from("<II", data, header_size)
+        if chunk_type == RES_XML_START_ELEMENT_TYPE:
+            (_ns, _name, attr_start, attr_size, attr_count,
+             _id, _class, _style) = _ELEMENT_EXT.unpack_from(data, header_size)
+            base = header_size + attr_start
+            self.attributes = [XmlAttribute(self, base + i * attr_size)
+                               for i in range(attr_count)]
+
+
+class AxmlDocument:
+    """A compiled XML document: string pool, resource map and node list."""
+
+    def __init__(self, prologue: bytes, strings: list[str], resource_ids: list[int],
+                 nodes: list[XmlNode]):
+        self.prologue = prologue          # string pool + resource map chunks, verbatim
+        self.strings = strings
+        self.resource_ids = resource_ids  # attribute string index → resource ID
+        self.nodes = nodes
+
+    @classmethod
+    def parse(cls, data: bytes) -> "AxmlDocument":
+        chunk_type, header_size, size = _chunk_header(data, 0)
+        if chunk_type != RES_XML_TYPE:
+            raise AxmlFormatError(f"not a binary XML document (chunk type 0x{chunk_type:04x})")
+        strings: list[str] | None = None
+        resource_ids: list[int] = []
+        nodes: list[XmlNode] = []
+        prologue_end = header_size
+        offset = header_size
+        while offset < size:
+            chunk_type, chunk_header, chunk_size = _chunk_header(data, offset)
+            if nodes and chunk_type in (RES_STRING_POOL_TYPE, RES_XML_RESOURCE_MAP_TYPE):
+                raise AxmlFormatError(f"chunk type 0x{chunk_type:04x} after the first node")
+            if chunk_type == RES_STRING_POOL_TYPE:
+                strings = parse_string_pool(data, offset)
+            elif chunk_type == RES_XML_RESOURCE_MAP_TYPE:
+                count = (chunk_size - chunk_header) // 4
+                resource_ids = list(struct.unpack_from(f"<{count}I", data, offset + chunk_header))
+            elif RES_XML_START_NAMESPACE_TYPE <= chunk_type <= RES_XML_CDATA_TYPE:
+                nodes.append(XmlNode(chunk_type, bytearray(data[offset:offset + chunk_size]),
+                                     chunk_header))
+            else:
+                raise AxmlFormatError(f"unexpected chunk type 0x{chunk_type:04x} at 0x{offset:x}")
+            offset += chunk_size
+            if not nodes:
+                prologue_end = offset
+        if strings is None:
+            raise AxmlFormatError("binary XML document has no string pool")
+        return cls(bytes(data[header_size:prologue_end]), strings, resource_ids, nodes)
+
+    def string(self, index: int) -> str | None:
+        if index == NO_ENTRY or index >= len(self.strings):
+            return None
+        return self.strings[index]
+
+    def is_android_attr(self, attr: XmlAttribute, name: str, resource_id: int) -> bool:
+        """True if attr is android:<name> (by resource ID, else by namespace)."""
+        if attr.name < len(self.resource_ids) and self.resource_ids[attr.name]:
+            return self.resource_ids[attr.name] == resource_id
+        return self.string(attr.ns) == ANDROID_NS and self.string(attr.name) == name
+
+    def attribute(self, node: XmlNode, name: str, resource_id: int) -> XmlAttribute | None:
+        for attr in node.attributes:
+            if self.is_android_attr(attr, name, resource_id):
+                return attr
+        return None
+
+    def attribute_string(self, attr: XmlAttribute | None) -> str | None:
+        """String value of an attribute, or None if it is not a string."""
+        if attr is None:
+            return None
+        if attr.raw_value != NO_ENTRY:
+            return self.string(attr.raw_value)
+        if attr.data_type == TYPE_STRING:
+            return self.string(attr.data)
+        return None
+
+    def to_bytes(self) -> bytes:
+        body = b"".join([self.prologue] + [bytes(node.data) for node in self.nodes])
+        header_size = _CHUNK_HEADER.size
+        return _CHUNK_HEADER.pack(RES_XML_TYPE, header_size, header_size + len(body)) + body
+
+
+def is_null_value(attr: XmlAttribute) -> bool:
+    """True for @null: a TYPE_NULL value or a reference to resource 0."""
+    if attr.raw_value != NO_ENTRY:
+        return False
+    return attr.data_type == TYPE_NULL or (attr.data_type == TYPE_REFERENCE and attr.data == 0)
@@ -0,0 +1,329 @@
+#!/data/data/com.termux/files/usr/bin/python3
+"""
+bench-scripts.py - Offline benchmarks for the patch scripts.
+
+Generates synthetic inputs with benchgen.py (no APK or network needed) and
+times the hot paths of the pipeline on them:
+
+  stub-method         smalipatch.stub_methods over a smali tree
+  neutralize          smalipatch.neutralize_loadlibrary over a smali tree
+  replace-strings     smalipatch.StringRewriter with replace-urls.list
+  is-debug-android    patch-commandline.patch_is_debug_android
+  dex-strings         patch-dex-strings, same-length in-place mode
+  dex-strings-remap   patch-dex-strings, --remap mode (full DEX rewrite)
+  manifest-xml        patch-manifest.py on a decoded manifest
+  manifest-axml       patch-manifest-axml.py on a compiled manifest
+
+Each benchmark runs in a fresh child process on freshly generated inputs.
+Its peak RSS is the child's VmHWM (/proc/self/status), reset through
+/proc/self/clear_refs right before the workload: ru_maxrss would carry
+over the RSS of the parent that generated the inputs, since Linux keeps
+it across fork and exec. Files/s, MB/s and peak RSS are reported; the
+best of --repeat runs is kept.
+
+--save-baseline writes the results to a JSON file (default
+work/bench-baseline.json); --check compares against it and exits 1 if any
+benchmark got slower, or used more memory, than --tolerance allows.
+
+Usage: python3 bench-scripts.py [--scale F] [--repeat N] [--only NAME]...
+           [--baseline FILE] [--save-baseline | --check] [--tolerance F]
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import benchgen
+from edgeconfig import read_config
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_DIR = os.path.join(os.path.dirname(SCRIPT_DIR), "config")
+DEFAULT_BASELINE = os.path.join(os.path.dirname(SCRIPT_DIR), "work", "bench-baseline.json")
+REPLACEMENT = "http://127.0.0.1:18971"
+# Differences below these are timer / allocator noise, never a regression
+NOISE_FLOOR = {"seconds": 0.05, "peak_rss_mb": 2.0}
+
+
+def load_script(name: str):
+    """Import a hyphenated script (e.g. patch-dex-strings.py) as a module."""
+    path = os.path.join(SCRIPT_DIR, f"{name}.py")
+    spec = importlib.util.spec_from_file_location(name.replace("-", "_"), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def urls() -> list[str]:
+    return read_config(os.path.join(CONFIG_DIR, "replace-urls.list"))
+
+
+def files_under(root: str, suffix: str) -> list[str]:
+    found = []
+    for dirpath, _dirs, names in os.walk(root):
+        found += [os.path.join(dirpath, n) for n in names if n.endswith(suffix)]
+    return sorted(found)
+
+
+# ─── input generation (parent process) ───
+
+def setup_smali(work: str, scale: float) -> None:
+    benchgen.write_smali_tree(work, max(1, int(400 * scale)), 60, urls())
+
+
+def setup_buildinfo(work: str, scale: float) -> None:
+    benchgen.write_buildinfo_files(work, max(1, int(500 * scale)))
+
+
+def setup_dex(work: str, scale: float) -> None:
+    for i in range(max(1, int(4 * scale))):
+        with open(os.path.join(work, f"classes{i + 1}.dex"), "wb") as f:
+            f.write(benchgen.synthetic_dex(1500, 20, urls(), seed=i))
+
+
+def setup_manifest_xml(work: str, scale: float) -> None:
+    tree = benchgen.manifest_tree(CONFIG_DIR, max(1, int(3000 * scale)))
+    with open(os.path.join(work, "AndroidManifest.xml"), "w", encoding="utf-8") as f:
+        f.write(benchgen.manifest_xml(tree))
+
+
+def setup_manifest_axml(work: str, scale: float) -> None:
+    tree = benchgen.manifest_tree(CONFIG_DIR, max(1, int(3000 * scale)))
+    with open(os.path.join(work, "AndroidManifest.xml"), "wb") as f:
+        f.write(benchgen.manifest_axml(tree))
+
+
+# ─── workloads (child process) ───
+# Each returns (files processed, bytes read).
+
+def run_smali(work: str, patch) -> tuple[int, int]:
+    from smalifile import SmaliFile
+    paths = files_under(work, ".smali")
+    size = 0
+    for path in paths:
+        smali = SmaliFile.read(path)
+        size += len(smali.text)
+        patch(smali)
+        if smali.changed:
+            smali.save(path)
+    return len(paths), size
+
+
+def run_stub_method(work: str) -> tuple[int, int]:
+    from smalipatch import stub_methods
+    targets = set(benchgen.STUB_TARGETS)
+    return run_smali(work, lambda smali: stub_methods(smali, targets))
+
+
+def run_neutralize(work: str) -> tuple[int, int]:
+    from smalipatch import neutralize_loadlibrary
+    return run_smali(work, neutralize_loadlibrary)
+
+
+def run_replace_strings(work: str) -> tuple[int, int]:
+    from smalipatch import StringRewriter
+    rewriter = StringRewriter(dict.fromkeys(urls(), REPLACEMENT))
+    return run_smali(work, rewriter.rewrite)
+
+
+def run_is_debug_android(work: str) -> tuple[int, int]:
+    patch = load_script("patch-commandline").patch_is_debug_android
+    paths = files_under(work, ".smali")
+    size = sum(os.path.getsize(p) for p in paths)
+    for path in paths:
+        if not patch(path):
+            raise RuntimeError(f"isDebugAndroid() not patched in {path}")
+    return len(paths), size
+
+
+def run_dex(work: str, remap: bool) -> tuple[int, int]:
+    patch_dex_file = load_script("patch-dex-strings").patch_dex_file
+    replacements = dict.fromkeys(urls(), REPLACEMENT if remap else "http://127.0.0.1")
+    paths = files_under(work, ".dex")
+    size = sum(os.path.getsize(p) for p in paths)
+    for path in paths:
+        patch_dex_file(path, replacements, remap=remap)
+    return len(paths), size
+
+
+def run_manifest_xml(work: str) -> tuple[int, int]:
+    import xml.etree.ElementTree as ET
+    from manifestrules import ManifestRules
+    script = load_script("patch-manifest")
+    path = os.path.join(work, "AndroidManifest.xml")
+    size = os.path.getsize(path)
+    root = script.parse_manifest(path).getroot()
+    script.patch_manifest(root, ManifestRules.load(CONFIG_DIR))
+    with open(path, "wb") as f:
+        f.write(ET.tostring(root, encoding="utf-8", xml_declaration=True))
+    return 1, size
+
+
+def run_manifest_axml(work: str) -> tuple[int, int]:
+    from axml import AxmlDocument
+    from manifestrules import ManifestRules
+    patch_axml = load_script("patch-manifest-axml").patch_axml
+    path = os.path.join(work, "AndroidManifest.xml")
+    with open(path, "rb") as f:
+        data = f.read()
+    doc = AxmlDocument.parse(data)
+    patch_axml(doc, ManifestRules.load(CONFIG_DIR))
+    with open(path, "wb") as f:
+        f.write(doc.to_bytes())
+    return 1, len(data)
+
+
+# name → (setup, workload)
+BENCHMARKS = {
+    "stub-method": (setup_smali, run_stub_method),
+    "neutralize": (setup_smali, run_neutralize),
+    "replace-strings": (setup_smali, run_replace_strings),
+    "is-debug-android": (setup_buildinfo, run_is_debug_android),
+    "dex-strings": (setup_dex, lambda work: run_dex(work, remap=False)),
+    "dex-strings-remap": (setup_dex, lambda work: run_dex(work, remap=True)),
+    "manifest-xml": (setup_manifest_xml, run_manifest_xml),
+    "manifest-axml": (setup_manifest_axml, run_manifest_axml),
+}
+
+
+def reset_peak_rss() -> None:
+    """Reset this process's VmHWM to its current RSS (Linux 4.0+)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb() -> float:
+    """VmHWM of this process in MB; ru_maxrss where /proc is unavailable."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    # ru_maxrss is in KB on Linux/Android
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def child_main(name: str, work: str) -> None:
+    """Run one workload and print its measurements as JSON."""
+    workload = BENCHMARKS[name][1]
+    reset_peak_rss()
+    wall, cpu = time.perf_counter(), time.process_time()
+    files, size = workload(work)
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    rss_mb = peak_rss_mb()
+    print(json.dumps({"seconds": wall, "cpu_seconds": cpu, "files": files,
+                      "bytes": size, "peak_rss_mb": rss_mb}))
+
+
+def measure(name: str, scale: float) -> dict:
+    """Generate inputs for one benchmark and run it in a child process."""
+    setup = BENCHMARKS[name][0]
+    work = tempfile.mkdtemp(prefix=f"bench-{name}-")
+    try:
+        setup(work, scale)
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--run", name, work],
+                              capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError(f"{name} failed:\n{proc.stdout}{proc.stderr}")
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    seconds = max(result["seconds"], 1e-9)
+    result["files_per_s"] = result["files"] / seconds
+    result["mb_per_s"] = result["bytes"] / (1 << 20) / seconds
+    return result
+
+
+def check(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Names and reasons of benchmarks that regressed past tolerance."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get("benchmarks", {}).get(name)
+        if base is None:
+            continue
+        for key, label in (("seconds", "time"), ("peak_rss_mb", "peak RSS")):
+            if (result[key] > base[key] * (1 + tolerance)
+                    and result[key] - base[key] > NOISE_FLOOR[key]):
+                regressions.append(f"{name}: {label} {base[key]:.2f} -> {result[key]:.2f} "
+                                   f"(+{(result[key] / base[key] - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main() -> None:
+    if len(sys.argv) == 4 and sys.argv[1] == "--run":
+        child_main(sys.argv[2], sys.argv[3])
+        return
+
+    parser = argparse.ArgumentParser(description="Benchmark the patch scripts on synthetic inputs.")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="input size multiplier (default: 1.0)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="runs per benchmark, best is kept (default: 3)")
+    parser.add_argument("--only", action="append", choices=sorted(BENCHMARKS), default=[],
+                        help="run only this benchmark (repeatable)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE,
+                        help="baseline JSON file (default: work/bench-baseline.json)")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--save-baseline", action="store_true", help="store results as the baseline")
+    mode.add_argument("--check", action="store_true",
+                      help="exit 1 if a benchmark regressed against the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown / memory growth for --check (default: 0.25)")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.check:
+        try:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"  ERROR: Cannot read baseline {args.baseline}: {e}")
+            sys.exit(1)
+        if baseline.get("scale") != args.scale:
+            print(f"  [!] Baseline was recorded at scale {baseline.get('scale')}, "
+                  f"running at {args.scale}")
+
+    print(f"  {'benchmark':<18} {'seconds':>8} {'files/s':>9} {'MB/s':>8} {'peak RSS':>10}")
+    results = {}
+    for name in args.only or BENCHMARKS:
+        try:
+            runs = [measure(name, args.scale) for _ in range(max(1, args.repeat))]
+        except RuntimeError as e:
+            print(f"    [!] {e}")
+            sys.exit(1)
+        result = min(runs, key=lambda r: r["seconds"])
+        result["peak_rss_mb"] = min(r["peak_rss_mb"] for r in runs)
+        results[name] = result
+        print(f"  {name:<18} {result['seconds']:>8.3f} {result['files_per_s']:>9.1f} "
+              f"{result['mb_per_s']:>8.2f} {result['peak_rss_mb']:>7.1f} MB")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump({"scale": args.scale, "python": platform.python_version(),
+                       "machine": platform.machine(), "benchmarks": results}, f, indent=2)
+        print(f"  Baseline saved: {args.baseline}")
+    elif baseline is not None:
+        regressions = check(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"    [!] {line}")
+        if regressions:
+            print(f"  {len(regressions)} regression(s) past {args.tolerance * 100:.0f}% tolerance")
+            sys.exit(1)
+        print(f"  [=] No regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""
+benchgen.py - Synthetic inputs for bench-scripts.py.
+
+Generates workloads shaped like Edge Canary's without needing the APK:
+  - smali trees: many methods per class, annotation blocks, .param
+    declarations, const-strings holding configured telemetry URLs,
+    System.loadLibrary calls and a BuildInfo.isDebugAndroid() method
+  - DEX files built through dexmodel.py, so string tables are sorted and
+    checksums/signatures are valid, with the configured URLs in the pool
+  - AndroidManifest.xml, both decoded (apktool-style XML) and compiled
+    (binary AXML), holding every strip-*.list entry among filler elements
+
+All generators are deterministic for a given seed.
+"""
+
+import os
+import random
+import struct
+
+from axml import (ANDROID_NS, ATTR_NAME, ATTR_VALUE, NO_ENTRY, RES_STRING_POOL_TYPE,
+                  RES_XML_END_ELEMENT_TYPE, RES_XML_END_NAMESPACE_TYPE,
+                  RES_XML_RESOURCE_MAP_TYPE, RES_XML_START_ELEMENT_TYPE,
+                  RES_XML_START_NAMESPACE_TYPE, RES_XML_TYPE, TYPE_REFERENCE, TYPE_STRING)
+from dexmodel import (NO_INDEX, ClassData, ClassDef, CodeItem, DexModel, EncodedMethod,
+                      MethodId, Proto, write_dex)
+from edgeconfig import read_config
+
+STUB_TARGETS = ("send", "flush", "track", "upload")
+RETURN_TYPES = ("V", "Z", "I", "J", "D", "Ljava/lang/String;", "[I", "[Ljava/lang/Object;")
+
+
+# ─── smali ───
+
+def smali_class(rng: random.Random, descriptor: str, methods: int, urls: list[str]) -> str:
+    """One smali class with a mix of bodies, annotations and patch targets."""
+    out = [f".class public {descriptor}", ".super Ljava/lang/Object;", '.source "Gen.java"', ""]
+    for i in range(methods):
+        name = rng.choice(STUB_TARGETS + ("init", "get", "run", "apply"))
+        ret = rng.choice(RETURN_TYPES)
+        mods = rng.choice(("public", "private static", "public final", "public abstract"))
+        out.append(f".method {mods} {name}{i}(Ljava/lang/String;I){ret}"
+                   if name not in STUB_TARGETS else f".method {mods} {name}(Ljava/lang/String;I){ret}")
+        if "abstract" in mods:
+            out += [".end method", ""]
+            continue
+        out.append("    .registers 6")
+        if rng.random() < 0.4:
+            out += ['    .param p1, "url"    # Ljava/lang/String;',
+                    "        .annotation build Landroidx/annotation/NonNull;",
+                    "        .end annotation", "    .end param"]
+        if rng.random() < 0.3 and urls:
+            out += ["    .annotation runtime Lretrofit2/http/GET;",
+                    f'        value = "{rng.choice(urls)}"', "    .end annotation"]
+        for j in range(rng.randint(2, 12)):
+            roll = rng.random()
+            if roll < 0.15 and urls:
+                out.append(f'    const-string v0, "{rng.choice(urls)}"')
+            elif roll < 0.3:
+                out.append(f'    const-string v1, "label_{rng.randrange(1 << 20):x}"')
+            elif roll < 0.36:
+                out.append("    invoke-static {v0}, Ljava/lang/System;->loadLibrary(Ljava/lang/String;)V")
+            else:
+                out.append(f"    add-int/lit8 v{j % 4}, v{j % 4}, 0x{j:x}")
+            out.append("")
+        out += ["    return-void", ".end method", ""]
+    return "\n".join(out)
+
+
+BUILDINFO_SMALI = """.class public Lorg/chromium/base/BuildInfo;
+.super Ljava/lang/Object;
+
+.method public static isDebugAndroid()Z
+    .registers 2
+
+    invoke-static {}, Lorg/chromium/base/ContextUtils;->getApplicationContext()Landroid/content/Context;
+    move-result-object v0
+    invoke-virtual {v0}, Landroid/content/Context;->getApplicationInfo()Landroid/content/pm/ApplicationInfo;
+    move-result-object v0
+    iget v0, v0, Landroid/content/pm/ApplicationInfo;->flags:I
+    and-int/lit8 v0, v0, 0x2
+    if-eqz v0, :cond_0
+    const/4 v0, 0x1
+    return v0
+
+    :cond_0
+    const/4 v0, 0x0
+    return v0
+.end method
+"""
+
+
+def write_smali_tree(root: str, files: int, methods: int, urls: list[str], seed: int = 1) -> list[str]:
+    """Write files smali classes under root/smali_classes2/... Returns their paths."""
+    rng = random.Random(seed)
+    paths = []
+    for i in range(files):
+        package = f"com/gen/p{i % 37}"
+        path = os.path.join(root, "smali_classes2", package, f"C{i}.smali")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            f.write(smali_class(rng, f"L{package}/C{i};", methods, urls))
+        paths.append(path)
+    return paths
+
+
+def write_buildinfo_files(root: str, files: int) -> list[str]:
+    """Write files copies of a BuildInfo.smali holding isDebugAndroid()."""
+    paths = []
+    for i in range(files):
+        path = os.path.join(root, f"b{i}", "smali_classes4/org/chromium/base/BuildInfo.smali")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            f.write(BUILDINFO_SMALI)
+        paths.append(path)
+    return paths
+
+
+# ─── DEX ───
+
+def synthetic_dex(classes: int, strings_per_class: int, urls: list[str], seed: int = 1) -> bytes:
+    """A valid DEX: classes with one static method const-string'ing its strings."""
+    rng = random.Random(seed)
+    model = DexModel()
+    index: dict[str, int] = {}
+    type_index: dict[str, int] = {}
+
+    def string(value: str) -> int:
+        if value not in index:
+            index[value] = len(model.strings)
+            model.strings.append(value)
+        return index[value]
+
+    def type_idx(descriptor: str) -> int:
+        if descriptor not in type_index:
+            type_index[descriptor] = len(model.types)
+            model.types.append(string(descriptor))
+        return type_index[descriptor]
+
+    object_type = type_idx("Ljava/lang/Object;")
+    proto = len(model.protos)
+    model.protos.append(Proto(string("V"), type_idx("V"), ()))
+    for c in range(classes):
+        class_type = type_idx(f"Lgen/p{c % 53}/C{c};")
+        insns = bytearray()
+        for s in range(strings_per_class):
+            value = rng.choice(urls) if urls and rng.random() < 0.05 else \
+                f"gen.string.{c}.{s}.{rng.randrange(1 << 24):x}"
+            # const-string v0, string@idx (indices are remapped by write_dex)
+            insns += struct.pack("<HH", 0x1A, string(value))
+        insns += struct.pack("<H", 0x0E)  # return-void
+        method_idx = len(model.methods)
+        model.methods.append(MethodId(class_type, proto, string(f"m{c}")))
+        code = CodeItem(1, 0, 0, bytes(insns), [], [], None)
+        class_data = ClassData([], [], [EncodedMethod(method_idx, 0x9, code)], [])
+        model.classes.append(ClassDef(class_type, 0x1, object_type, (), NO_INDEX,
+                                      None, class_data, None))
+    if len(model.strings) > 0xFFFF:
+        raise ValueError("too many strings for const-string (use fewer classes)")
+    return bytes(write_dex(model))
+
+
+# ─── manifest ───
+
+def manifest_tree(config_dir: str, filler: int, seed: int = 1) -> tuple:
+    """(tag, attrs, children) tree holding every strip-*.list entry.
+
+    attrs maps android: attribute names to strings; a value of None is
+    an @null reference.
+    """
+    rng = random.Random(seed)
+    perms = read_config(os.path.join(config_dir, "strip-permissions.list"))
+    comps = read_config(os.path.join(config_dir, "strip-components.list"))
+    queries = read_config(os.path.join(config_dir, "strip-queries.list"))
+    metas = read_config(os.path.join(config_dir, "strip-metadata.list"))
+
+    top = [("uses-permission", {"name": p}, []) for p in perms]
+    top += [("uses-permission", {"name": f"gen.permission.P{i}"}, []) for i in range(filler // 4)]
+    top.append(("queries", {}, [("package", {"name": q}, []) for q in queries] +
+                [("package", {"name": f"gen.pkg{i}"}, []) for i in range(filler // 8)]))
+    app = []
+    for entry in comps:
+        comp_type, _, comp_name = entry.partition("|")
+        app.append((comp_type, {"name": comp_name},
+                    [("intent-filter", {}, [("action", {"name": "gen.ACTION"}, [])])]))
+    kinds = ("activity", "service", "receiver", "provider")
+    for i in range(filler):
+        app.append((rng.choice(kinds), {"name": f"gen.component.K{i}"},
+                    [("intent-filter", {}, [("action", {"name": f"gen.ACTION_{i}"}, [])])]))
+    app += [("meta-data", {"name": m, "value": "x"}, []) for m in metas]
+    app.append(("meta-data", {"name": "com.google.android.gms.version", "value": None}, []))
+    app += [("meta-data", {"name": f"gen.null{i}", "value": None}, []) for i in range(3)]
+    top.append(("application", {"name": "gen.App"}, app))
+    return ("manifest", {}, top)
+
+
+def manifest_xml(tree: tuple) -> str:
+    """Decoded (apktool-style) AndroidManifest.xml text for a manifest tree."""
+    out = ['<?xml version="1.0" encoding="utf-8" standalone="no"?>']
+
+    def emit(node, depth, root=False):
+        tag, attrs, children = node
+        parts = [tag]
+        if root:
+            parts.append(f'xmlns:android="{ANDROID_NS}" package="gen.app"')
+        for key, value in attrs.items():
+            parts.append(f'android:{key}="{"@null" if value is None else value}"')
+        pad = "    " * depth
+        if not children:
+            out.append(f"{pad}<{' '.join(parts)}/>")
+            return
+        out.append(f"{pad}<{' '.join(parts)}>")
+        for child in children:
+            emit(child, depth + 1)
+        out.append(f"{pad}</{tag}>")
+
+    emit(tree, 0, root=True)
+    return "\n".join(out) + "\n"
+
+
+def _chunk(chunk_type: int, header: bytes, body: bytes) -> bytes:
+    header_size = 8 + len(header)
+    return struct.pack("<HHI", chunk_type, header_size, header_size + len(body)) + header + body
+
+
+def manifest_axml(tree: tuple) -> bytes:
+    """Compiled (binary AXML) AndroidManifest.xml for a manifest tree."""
+    # Attribute names first, so the resource map covers them
+    strings = ["name", "value"]
+    index = {s: i for i, s in enumerate(strings)}
+
+    def string(value: str) -> int:
+        if value not in index:
+            index[value] = len(strings)
+            strings.append(value)
+        return index[value]
+
+    ns_uri, ns_prefix = string(ANDROID_NS), string("android")
+    attr_ids = {"name": ATTR_NAME, "value": ATTR_VALUE}
+    nodes = []
+
+    def node(chunk_type: int, ext: bytes) -> bytes:
+        return _chunk(chunk_type, struct.pack("<II", 1, NO_ENTRY), ext)
+
+    def emit(element):
+        tag, attrs, children = element
+        name = string(tag)
+        attr_bytes = b""
+        for key, value in attrs.items():
+            if value is None:
+                attr_bytes += struct.pack("<IIIHBBI", ns_uri, string(key), NO_ENTRY,
+                                          8, 0, TYPE_REFERENCE, 0)
+            else:
+                idx = string(value)
+                attr_bytes += struct.pack("<IIIHBBI", ns_uri, string(key), idx,
+                                          8, 0, TYPE_STRING, idx)
+        nodes.append(node(RES_XML_START_ELEMENT_TYPE,
+                          struct.pack("<IIHHHHHH", NO_ENTRY, name, 20, 20, len(attrs), 0, 0, 0)
+                          + attr_bytes))
+        for child in children:
+            emit(child)
+        nodes.append(node(RES_XML_END_ELEMENT_TYPE, struct.pack("<II", NO_ENTRY, name)))
+
+    nodes.append(node(RES_XML_START_NAMESPACE_TYPE, struct.pack("<II", ns_prefix, ns_uri)))
+    emit(tree)
+    nodes.append(node(RES_XML_END_NAMESPACE_TYPE, struct.pack("<II", ns_prefix, ns_uri)))
+
+    data = bytearray()
+    offsets = []
+    for value in strings:
+        offsets.append(len(data))
+        encoded = value.encode("utf-16-le")
+        data += struct.pack("<H", len(encoded) // 2) + encoded + b"\0\0"
+    data += bytes(-len(data) % 4)
+    strings_start = 28 + 4 * len(strings)
+    pool = _chunk(RES_STRING_POOL_TYPE,
+                  struct.pack("<IIIII", len(strings), 0, 0, strings_start, 0),
+                  struct.pack(f"<{len(offsets)}I", *offsets) + bytes(data))
+    resource_map = _chunk(RES_XML_RESOURCE_MAP_TYPE, b"",
+                          struct.pack("<II", attr_ids["name"], attr_ids["value"]))
+    return _chunk(RES_XML_TYPE, b"", pool + resource_map + b"".join(nodes))
@@ -0,0 +1,133 @@
+#!/data/data/com.termux/files/usr/bin/python3
+"""
+build-batch.py - Build several .apks bundles side by side (Canary, Dev, Beta, ...).
+
+Each bundle gets its own build.sh run with an isolated work tree
+(work/batch/<name>/) and output directory (output/<name>/). All runs share
+work/cache/, so a DEX file, manifest or split that two bundles have in
+common is patched or signed once and restored by the other build, and
+the DEX indexes of find-callers.py / relocate-targets.py stay shared too.
+
+The builds are stages of one buildgraph.py graph under a global budget:
+up to --builds at once, each given an equal share of the CPU cores
+(BUILD_JOBS) and of the memory budget (BUILD_MEM_BUDGET) for its own
+stage graph, so N concurrent builds never oversubscribe the device the
+way N plain build.sh runs would. By default as many builds run at once
+as the memory budget has room for (BUILD_MEM_MB each), at most one per
+core. Output is streamed with a [name] prefix and kept per build in
+work/batch/logs/.
+
+<name> is the bundle's file name, lower-cased with every other run of
+characters turned into "-" (Edge Canary_131.0.2886.0.apks →
+edge-canary-131-0-2886-0); "name=bundle.apks" sets it explicitly.
+
+Usage: python3 build-batch.py [--resume] [--builds N] [--jobs N] [--mem-budget MB]
+           <[name=]bundle.apks>...
+"""
+
+import argparse
+import glob
+import os
+import re
+import shlex
+import sys
+
+import buildreport
+from buildgraph import Stage, mem_available_mb, run_graph
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+EDGE_FIX_DIR = os.path.dirname(SCRIPT_DIR)
+WORK_DIR = os.path.join(EDGE_FIX_DIR, "work")
+OUTPUT_DIR = os.path.join(EDGE_FIX_DIR, "output")
+# Memory one build needs: a JVM DEX round-trip plus manifest and split
+# stages next to it (build.sh STAGE_MEM_*)
+BUILD_MEM_MB = 2048
+
+
+def variant_name(bundle: str) -> str:
+    name = os.path.splitext(os.path.basename(bundle))[0]
+    return re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-") or "build"
+
+
+def parse_bundles(specs: list[str]) -> list[tuple[str, str]]:
+    """(name, bundle path) per argument; duplicate names get -2, -3, ..."""
+    bundles, seen = [], set()
+    for spec in specs:
+        name, sep, path = spec.partition("=")
+        if not sep or not name or os.path.exists(spec):
+            name, path = variant_name(spec), spec
+        unique, n = name, 2
+        while unique in seen:
+            unique, n = f"{name}-{n}", n + 1
+        seen.add(unique)
+        bundles.append((unique, os.path.abspath(path)))
+    return bundles
+
+
+def build_command(name: str, bundle: str, jobs: int, mem_mb: int | None, resume: bool) -> str:
+    env = {
+        "BUILD_WORK_DIR": os.path.join(WORK_DIR, "batch", name),
+        "BUILD_OUTPUT_DIR": os.path.join(OUTPUT_DIR, name),
+        "BUILD_CACHE_DIR": os.path.join(WORK_DIR, "cache"),
+        "BUILD_JOBS": str(jobs),
+    }
+    if mem_mb is not None:
+        env["BUILD_MEM_BUDGET"] = str(mem_mb)
+    args = ["bash", os.path.join(EDGE_FIX_DIR, "build.sh")] + (["--resume"] if resume else [])
+    return " ".join([f"{k}={shlex.quote(v)}" for k, v in env.items()]
+                    + [shlex.quote(a) for a in args + [bundle]])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Build several .apks bundles concurrently under one CPU/memory budget")
+    parser.add_argument("bundles", nargs="+", metavar="[name=]bundle.apks",
+                        help=".apks bundles to build")
+    parser.add_argument("--resume", action="store_true",
+                        help="pass --resume to every build")
+    parser.add_argument("--builds", type=int, default=None,
+                        help="builds to run at once (default: as many as the memory budget fits)")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1,
+                        help="CPU cores shared by all builds (default: CPU count)")
+    parser.add_argument("--mem-budget", type=int, default=None, metavar="MB",
+                        help="memory shared by all builds (default: MemAvailable)")
+    args = parser.parse_args()
+
+    bundles = parse_bundles(args.bundles)
+    missing = [path for _name, path in bundles if not os.path.isfile(path)]
+    if missing:
+        print(f"  ERROR: Input .apks not found: {', '.join(missing)}")
+        sys.exit(1)
+
+    jobs = max(1, args.jobs)
+    budget = args.mem_budget if args.mem_budget is not None else mem_available_mb()
+    builds = args.builds or min(jobs, max(1, budget // BUILD_MEM_MB) if budget else jobs)
+    builds = max(1, min(builds, len(bundles)))
+    build_jobs = max(1, jobs // builds)
+    build_mem = budget // builds if budget else None
+
+    budget_text = f"{budget} MB" if budget is not None else "unlimited"
+    print(f"  {len(bundles)} bundle(s), {builds} at once, {jobs} core(s) and "
+          f"{budget_text} shared: {build_jobs} job(s)"
+          f"{f' and {build_mem} MB' if build_mem else ''} per build")
+    stages = [Stage(name, build_command(name, path, build_jobs, build_mem, args.resume),
+                    mem_mb=build_mem or 0)
+              for name, path in bundles]
+    results = run_graph(stages, builds, budget, os.path.join(WORK_DIR, "batch", "logs"))
+
+    print("")
+    for name, path in bundles:
+        if results[name] != 0:
+            print(f"  [!] {name}: failed ({os.path.basename(path)}), see work/batch/logs/{name}.log")
+            continue
+        for apk in sorted(glob.glob(os.path.join(OUTPUT_DIR, name, "*-privacy.apk"))):
+            print(f"  [x] {name}: {os.path.relpath(apk, EDGE_FIX_DIR)}")
+    buildreport.count(files=len(bundles))
+    failed = [name for name, status in results.items() if status != 0]
+    if failed:
+        print(f"  [!] {len(failed)} build(s) failed: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    buildreport.run(main)
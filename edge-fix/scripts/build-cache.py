@@ -0,0 +1,187 @@
+#!/data/data/com.termux/files/usr/bin/python3
+"""
+build-cache.py - Restore/store build.sh outputs in the content-addressed cache.
+
+Each input DEX is keyed on its own bytes plus the config entries that affect
+it (buildcache.py); the compiled manifest on AndroidManifest.xml,
+resources.arsc and the strip-*.list files. On a hit build.sh skips the
+apktool / baksmali / smali work for that output entirely.
+
+DEX files are handled in two calls around step 3:
+  restore-dex  hashes every classesN.dex in base.apk, copies cached
+               *-patched.dex files into the DEX work dir and writes
+               cache-hits (one "name cmdline|-" line per hit) and
+               cache-keys for the store call
+  store-dex    caches the step 3 result of every DEX that missed
+
+Signed splits are keyed on the split's bytes and the signer (certificate
+fingerprint + apksigner version, see signer-id), so only base.apk is
+re-signed when just the patches change:
+  restore-splits  copies every cached signed split into the signed dir and
+                  writes split-cache-hits / split-cache-keys to the work dir
+  store-split     caches one freshly signed split (run by each split stage)
+
+Usage: python3 build-cache.py restore-dex <cache-dir> <base.apk> <config-dir> <dex-work>
+       python3 build-cache.py store-dex <cache-dir> <dex-work> [--cmdline-patched]
+       python3 build-cache.py restore-manifest <cache-dir> <base.apk> <config-dir> <out.xml>
+       python3 build-cache.py store-manifest <cache-dir> <base.apk> <config-dir> <manifest.xml>
+       python3 build-cache.py signer-id <keystore> <alias> <storepass> <apksigner>
+       python3 build-cache.py restore-splits <cache-dir> <signer-id> <work-dir> <signed-dir> <split.apk>...
+       python3 build-cache.py store-split <cache-dir> <work-dir> <signed.apk>
+"""
+
+import glob
+import os
+import shutil
+import sys
+import zipfile
+
+from buildcache import (BuildCache, dex_cache_key, manifest_cache_key, pipeline_fingerprint,
+                        signer_id, split_cache_key)
+import buildreport
+from edgeconfig import DEX_ENTRY_RE, dex_sort_key, dex_to_smali_dir
+
+SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Classes patched by patch-commandline.py (step 3c)
+CMDLINE_CLASSES = ("org/chromium/base/BuildInfo.smali", "org/chromium/base/CommandLine.smali")
+
+
+def restore_dex(cache: BuildCache, apk_path: str, config_dir: str, dex_work: str) -> None:
+    fingerprint = pipeline_fingerprint(SCRIPT_DIR)
+    os.makedirs(dex_work, exist_ok=True)
+    keys: list[str] = []
+    hits: list[str] = []
+
+    with zipfile.ZipFile(apk_path) as zf:
+        dex_names = sorted((n for n in zf.namelist() if DEX_ENTRY_RE.fullmatch(n)),
+                           key=dex_sort_key)
+        for dex_name in dex_names:
+            key = dex_cache_key(dex_name, zf.read(dex_name), config_dir, fingerprint)
+            keys.append(f"{dex_name} {key}")
+            meta = cache.get("dex", key)
+            if meta is None:
+                continue
+            stem = dex_name[:-len(".dex")]
+            if meta.get("patched"):
+                shutil.copyfile(os.path.join(meta["dir"], "patched.dex"),
+                                os.path.join(dex_work, f"{stem}-patched.dex"))
+                print(f"    [=] {dex_name}: cached patched DEX")
+            else:
+                print(f"    [=] {dex_name}: cached, unchanged")
+            hits.append(f"{dex_name} {'cmdline' if meta.get('cmdline') else '-'}")
+
+    with open(os.path.join(dex_work, "cache-keys"), "w") as f:
+        f.write("".join(line + "\n" for line in keys))
+    with open(os.path.join(dex_work, "cache-hits"), "w") as f:
+        f.write("".join(line + "\n" for line in hits))
+    buildreport.count(files=len(hits))
+    print(f"    {len(hits)}/{len(keys)} DEX file(s) served from cache")
+
+
+def store_dex(cache: BuildCache, dex_work: str, cmdline_patched: bool) -> None:
+    with open(os.path.join(dex_work, "cache-keys")) as f:
+        keys = dict(line.split() for line in f if line.strip())
+    with open(os.path.join(dex_work, "cache-hits")) as f:
+        hits = {line.split()[0] for line in f if line.strip()}
+
+    stored = 0
+    for dex_name, key in keys.items():
+        if dex_name in hits:
+            continue
+        stem = dex_name[:-len(".dex")]
+        patched = os.path.join(dex_work, f"{stem}-patched.dex")
+        smali_dir = os.path.join(dex_work, dex_to_smali_dir(dex_name))
+        cmdline = cmdline_patched and any(
+            glob.glob(os.path.join(smali_dir, cls)) for cls in CMDLINE_CLASSES)
+        files = {"patched.dex": patched} if os.path.isfile(patched) else {}
+        cache.put("dex", key, files,
+                  {"dex": dex_name, "patched": bool(files), "cmdline": cmdline})
+        stored += 1
+    buildreport.count(files=stored)
+    print(f"    Cached {stored} DEX result(s)")
+
+
+def restore_manifest(cache: BuildCache, apk_path: str, config_dir: str, out_path: str) -> bool:
+    key = manifest_cache_key(apk_path, config_dir, pipeline_fingerprint(SCRIPT_DIR))
+    meta = cache.get("manifest", key)
+    if meta is None:
+        return False
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    shutil.copyfile(os.path.join(meta["dir"], "AndroidManifest.xml"), out_path)
+    return True
+
+
+def store_manifest(cache: BuildCache, apk_path: str, config_dir: str, manifest_path: str) -> None:
+    key = manifest_cache_key(apk_path, config_dir, pipeline_fingerprint(SCRIPT_DIR))
+    cache.put("manifest", key, {"AndroidManifest.xml": manifest_path},
+              {"manifest": os.path.basename(apk_path)})
+
+
+def restore_splits(cache: BuildCache, signer: str, work_dir: str, signed_dir: str,
+                   split_paths: list[str]) -> None:
+    os.makedirs(signed_dir, exist_ok=True)
+    keys: list[str] = []
+    hits: list[str] = []
+    for split_path in split_paths:
+        split_name = os.path.basename(split_path)
+        key = split_cache_key(split_path, signer, SCRIPT_DIR)
+        keys.append(f"{split_name} {key}")
+        meta = cache.get("split", key)
+        if meta is None:
+            continue
+        # Replace rather than overwrite: the delta base hard-links signed APKs
+        signed = os.path.join(signed_dir, split_name)
+        if os.path.exists(signed):
+            os.unlink(signed)
+        shutil.copyfile(os.path.join(meta["dir"], "signed.apk"), signed)
+        print(f"    [=] {split_name}: cached signed split")
+        hits.append(split_name)
+
+    with open(os.path.join(work_dir, "split-cache-keys"), "w") as f:
+        f.write("".join(line + "\n" for line in keys))
+    with open(os.path.join(work_dir, "split-cache-hits"), "w") as f:
+        f.write("".join(line + "\n" for line in hits))
+    buildreport.count(files=len(hits))
+    print(f"    {len(hits)}/{len(keys)} split(s) served from cache")
+
+
+def store_split(cache: BuildCache, work_dir: str, signed_path: str) -> None:
+    split_name = os.path.basename(signed_path)
+    with open(os.path.join(work_dir, "split-cache-keys")) as f:
+        keys = dict(line.split() for line in f if line.strip())
+    cache.put("split", keys[split_name], {"signed.apk": signed_path}, {"split": split_name})
+
+
+def main() -> None:
+    args = sys.argv[1:]
+    command = args[0] if args else ""
+
+    if command == "restore-dex" and len(args) == 5:
+        restore_dex(BuildCache(args[1]), args[2], args[3], args[4])
+    elif command == "store-dex" and len(args) in (3, 4):
+        store_dex(BuildCache(args[1]), args[2], "--cmdline-patched" in args[3:])
+    elif command == "restore-manifest" and len(args) == 5:
+        if not restore_manifest(BuildCache(args[1]), args[2], args[3], args[4]):
+            sys.exit(1)
+    elif command == "store-manifest" and len(args) == 5:
+        store_manifest(BuildCache(args[1]), args[2], args[3], args[4])
+    elif command == "signer-id" and len(args) == 5:
+        print(signer_id(args[1], args[2], args[3], args[4]))
+    elif command == "restore-splits" and len(args) >= 5:
+        restore_splits(BuildCache(args[1]), args[2], args[3], args[4], args[5:])
+    elif command == "store-split" and len(args) == 4:
+        store_split(BuildCache(args[1]), args[2], args[3])
+    else:
+        print(f"Usage: {sys.argv[0]} restore-dex <cache-dir> <base.apk> <config-dir> <dex-work>")
+        print(f"       {sys.argv[0]} store-dex <cache-dir> <dex-work> [--cmdline-patched]")
+        print(f"       {sys.argv[0]} restore-manifest <cache-dir> <base.apk> <config-dir> <out.xml>")
+        print(f"       {sys.argv[0]} store-manifest <cache-dir> <base.apk> <config-dir> <manifest.xml>")
+        print(f"       {sys.argv[0]} signer-id <keystore> <alias> <storepass> <apksigner>")
+        print(f"       {sys.argv[0]} restore-splits <cache-dir> <signer-id> <work-dir> <signed-dir> <split.apk>...")
+        print(f"       {sys.argv[0]} store-split <cache-dir> <work-dir> <signed.apk>")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    buildreport.run(main)
@@ -0,0 +1,67 @@
+#!/data/data/com.termux/files/usr/bin/python3
+"""
+build-checkpoint.py - Check and record build.sh step checkpoints.
+
+build.sh --resume asks `check` before each step and skips the step when
+it exits 0: the step last completed with inputs that hash the same as now
+(pipeline code included) and its outputs are still byte-identical to what
+it wrote. `save` records a step after it succeeds; `clear` drops records.
+See checkpoint.py.
+
+Inputs and outputs may be files or directories; a missing path is part
+of the fingerprint too (e.g. an optional config list).
+
+Usage: python3 build-checkpoint.py check <dir> <step> [--in PATH...] [--out PATH...]
+       python3 build-checkpoint.py save  <dir> <step> [--in PATH...] [--out PATH...]
+       python3 build-checkpoint.py clear <dir> [<step>...]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+
+from checkpoint import Checkpoints
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build step checkpoints for build.sh --resume")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for command, text in (("check", "exit 0 if the step is up to date"),
+                          ("save", "record the step as completed")):
+        p = sub.add_parser(command, help=text)
+        p.add_argument("dir", help="checkpoint directory")
+        p.add_argument("step", help="step name, e.g. extract or dex:classes2.dex")
+        p.add_argument("--in", dest="inputs", nargs="*", default=[], metavar="PATH")
+        p.add_argument("--out", dest="outputs", nargs="*", default=[], metavar="PATH")
+    p = sub.add_parser("clear", help="drop step records (all of them if none given)")
+    p.add_argument("dir", help="checkpoint directory")
+    p.add_argument("steps", nargs="*")
+    args = parser.parse_args()
+
+    if args.command == "clear":
+        if not args.steps:
+            shutil.rmtree(args.dir, ignore_errors=True)
+            return
+        checkpoints = Checkpoints(args.dir, os.path.dirname(SCRIPT_DIR))
+        for step in args.steps:
+            checkpoints.clear(step)
+        return
+
+    checkpoints = Checkpoints(args.dir, os.path.dirname(SCRIPT_DIR))
+    try:
+        if args.command == "check":
+            current = checkpoints.is_current(args.step, args.inputs, args.outputs)
+        else:
+            checkpoints.save(args.step, args.inputs, args.outputs)
+            current = True
+    finally:
+        checkpoints.flush()
+    if not current:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/data/data/com.termux/files/usr/bin/python3
+"""
+build-report.py - Record build.sh steps and write the JSON build report.
+
+build.sh brackets each sequential step with `begin NAME` / `end NAME`,
+which snapshot build.sh's own cumulative CPU time and I/O counters (they
+include every child it has reaped, e.g. java or unzip). Stage-graph stages
+and Python scripts record their own events (buildreport.py). `summarize`
+folds everything into one JSON report and prints the stages by wall time.
+
+The events file is taken from EDGE_FIX_EVENTS.
+
+Usage: python3 build-report.py begin <name>
+       python3 build-report.py end <name>
+       python3 build-report.py summarize <report.json> [--top N]
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from buildreport import EVENTS_ENV, build_report, emit, read_events, snapshot
+
+
+def format_bytes(size: int | None) -> str:
+    if size is None:
+        return "-"
+    if size >= 1 << 20:
+        return f"{size / (1 << 20):.1f} MB"
+    return f"{size / 1024:.1f} KB"
+
+
+def summarize(report_path: str, top: int) -> None:
+    events_path = os.environ.get(EVENTS_ENV)
+    if not events_path:
+        print(f"  [!] {EVENTS_ENV} is not set, no build report written")
+        return
+    report = build_report(read_events(events_path))
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+
+    build = report["build"]
+    if build:
+        print(f"  Build: {build['wall']:.1f}s wall, {build.get('cpu', 0):.1f}s CPU")
+    print(f"  {'stage':<28} {'wall':>7} {'cpu':>7} {'peak RSS':>9} {'read':>9} {'written':>9}"
+          f" {'files':>6} {'patches':>7}")
+    for stage in report["stages"][:top]:
+        rss = stage.get("peak_rss_mb")
+        print(f"  {stage['name'][:28]:<28} {stage['wall']:>6.1f}s {stage.get('cpu', 0):>6.1f}s"
+              f" {f'{rss:.0f} MB' if rss else '-':>9} {format_bytes(stage.get('read_bytes')):>9}"
+              f" {format_bytes(stage.get('write_bytes')):>9} {stage['files']:>6} {stage['patches']:>7}")
+    print(f"  Build report: {report_path}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build report events and summary.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for command in ("begin", "end"):
+        sub.add_parser(command, help=f"record the {command} of a build.sh step").add_argument("name")
+    report = sub.add_parser("summarize", help="write the JSON build report")
+    report.add_argument("report", help="output JSON path")
+    report.add_argument("--top", type=int, default=12, help="stages to print (default: 12)")
+    args = parser.parse_args()
+
+    if args.command == "summarize":
+        try:
+            summarize(args.report, args.top)
+        except OSError as e:
+            print(f"  [!] Cannot write build report: {e}")
+            sys.exit(1)
+        return
+    # The caller is build.sh: measure the parent process
+    emit({"kind": f"stage-{args.command}", "name": args.name, **snapshot(os.getppid())})
+
+
+if __name__ == "__main__":
+    main()
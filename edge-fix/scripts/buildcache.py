@@ -0,0 +1,277 @@
+"""
+buildcache.py - Content-addressed build cache for the edge-fix pipeline.
+
+Outputs are stored under a key that hashes everything they depend on: the
+input bytes, the config entries that can change them, and a fingerprint of
+the pipeline itself (scripts + tool jars). A config edit therefore only
+invalidates the outputs it can actually affect.
+
+Layout: <cache-dir>/<kind>/<key[:2]>/<key>/{meta.json, output files}
+Entries are written to a temporary directory and renamed into place, so an
+interrupted build never leaves a half-written entry behind. An entry is
+never replaced once stored (same key, same outputs), so concurrent builds
+sharing one cache (build-batch.py) never read an entry another removes.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import zipfile
+from array import array
+
+from dexfile import DexFile
+from edgeconfig import read_config, smali_to_dex, strip_class_prefixes
+
+# Config lists that feed each stage
+DEX_LISTS = ("targeted-stubs.list", "neutralize-libs.list")
+MANIFEST_LISTS = ("strip-permissions.list", "strip-components.list",
+                  "strip-queries.list", "strip-metadata.list")
+
+URL_REPLACEMENT = "http://127.0.0.1:18971"
+
+# Scripts that shape a re-signed split before apksigner sees it
+SPLIT_SCRIPTS = ("assemble-apk.py", "apkzip.py")
+
+
+class BuildCache:
+    """Directory-backed store of build outputs, addressed by key."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def entry_dir(self, kind: str, key: str) -> str:
+        return os.path.join(self.root, kind, key[:2], key)
+
+    def get(self, kind: str, key: str) -> dict | None:
+        """Return the entry's metadata (plus "dir"), or None on a miss."""
+        entry = self.entry_dir(kind, key)
+        try:
+            with open(os.path.join(entry, "meta.json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        meta["dir"] = entry
+        return meta
+
+    def put(self, kind: str, key: str, files: dict[str, str], meta: dict) -> None:
+        """Store files ({name in entry: source path}) and metadata under key."""
+        if self.get(kind, key) is not None:
+            return
+        entry = self.entry_dir(kind, key)
+        parent = os.path.dirname(entry)
+        os.makedirs(parent, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=parent, prefix=".tmp-")
+        try:
+            for name, src in files.items():
+                shutil.copyfile(src, os.path.join(tmp, name))
+            with open(os.path.join(tmp, "meta.json"), "w") as f:
+                json.dump(meta, f, indent=2, sort_keys=True)
+            if os.path.isdir(entry) and self.get(kind, key) is None:
+                shutil.rmtree(entry)
+            try:
+                os.rename(tmp, entry)
+            except OSError:
+                # Another build stored the same key in the meantime
+                if self.get(kind, key) is None:
+                    raise
+        finally:
+            if os.path.isdir(tmp):
+                shutil.rmtree(tmp)
+
+
+class CachedDexIndex:
+    """Base of the per-DEX indexes kept in the cache (callindex.py,
+    methodindex.py), keyed by the SHA-256 of the DEX bytes.
+
+    An entry holds methods.txt (the index's method references, one per
+    line) and one file per array in ARRAYS. Subclasses set CACHE_KIND,
+    INDEX_VERSION and ARRAYS ((file name, attribute, typecode), ...),
+    implement scan(data) and take (methods, *arrays in ARRAYS order).
+    """
+
+    CACHE_KIND = ""
+    INDEX_VERSION = b""     # bump when the entry layout changes
+    ARRAYS: tuple[tuple[str, str, str], ...] = ()
+
+    methods: list[str]
+
+    @classmethod
+    def dex_key(cls, data) -> str:
+        """Cache key of a DEX: SHA-256 of its bytes plus the index version."""
+        h = hashlib.sha256(cls.INDEX_VERSION + b"\0")
+        h.update(data)
+        return h.hexdigest()
+
+    @classmethod
+    def scan(cls, data):
+        raise NotImplementedError
+
+    @classmethod
+    def load(cls, entry_dir: str):
+        with open(os.path.join(entry_dir, "methods.txt"), encoding="utf-8",
+                  errors="surrogateescape") as f:
+            methods = f.read().split("\n")[:-1]
+        arrays = []
+        for name, _attr, typecode in cls.ARRAYS:
+            values = array(typecode)
+            with open(os.path.join(entry_dir, name), "rb") as f:
+                values.frombytes(f.read())
+            arrays.append(values)
+        return cls(methods, *arrays)
+
+    @classmethod
+    def open(cls, data, cache: BuildCache | None):
+        """Load the index of a DEX from the cache, scanning (and storing) it
+        on a miss. Returns (index, served from cache)."""
+        if cache is None:
+            return cls.scan(data), False
+        key = cls.dex_key(data)
+        meta = cache.get(cls.CACHE_KIND, key)
+        if meta is not None:
+            try:
+                return cls.load(meta["dir"]), True
+            except OSError:
+                pass
+        index = cls.scan(data)
+        index.store(cache, key)
+        return index, False
+
+    def cache_meta(self) -> dict:
+        return {"methods": len(self.methods)}
+
+    def store(self, cache: BuildCache, key: str) -> None:
+        os.makedirs(cache.root, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=cache.root, prefix=".scan-") as tmp:
+            files = {}
+            path = files["methods.txt"] = os.path.join(tmp, "methods.txt")
+            with open(path, "w", encoding="utf-8", errors="surrogateescape") as f:
+                f.writelines(ref + "\n" for ref in self.methods)
+            for name, attr, _typecode in self.ARRAYS:
+                path = files[name] = os.path.join(tmp, name)
+                with open(path, "wb") as f:
+                    getattr(self, attr).tofile(f)
+            cache.put(self.CACHE_KIND, key, files, self.cache_meta())
+
+
+def pipeline_fingerprint(script_dir: str) -> str:
+    """Hash of the pipeline code: build.sh, scripts/*.py and tool jar names."""
+    h = hashlib.sha256()
+    paths = [os.path.join(script_dir, "build.sh")]
+    paths += sorted(glob.glob(os.path.join(script_dir, "scripts", "*.py")))
+    for path in paths:
+        if os.path.isfile(path):
+            h.update(os.path.basename(path).encode() + b"\0")
+            with open(path, "rb") as f:
+                h.update(hashlib.sha256(f.read()).digest())
+    for jar in sorted(glob.glob(os.path.join(script_dir, "tools", "*.jar"))):
+        h.update(os.path.basename(jar).encode() + b"\0")
+    return h.hexdigest()
+
+
+def _hash_parts(*parts) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        data = part if isinstance(part, bytes) else json.dumps(part, sort_keys=True).encode()
+        h.update(len(data).to_bytes(8, "little"))
+        h.update(data)
+    return h.hexdigest()
+
+
+def dex_config_entries(dex_name: str, dex_data: bytes, config_dir: str) -> dict[str, list[str]]:
+    """The config entries that can change dex_name's patched output.
+
+    Stub / loadLibrary entries are filtered with smali_to_dex(); strip
+    prefixes only matter if this DEX defines a class under them; URLs only
+    matter if they occur in this DEX's string table.
+    """
+    entries: dict[str, list[str]] = {}
+    for list_name in DEX_LISTS:
+        entries[list_name] = [
+            e for e in read_config(os.path.join(config_dir, list_name))
+            if smali_to_dex(e.partition("|")[0]) == dex_name
+        ]
+    dex = DexFile(dex_data)
+    descriptors = list(dex.class_descriptors())
+    entries["strip-classes.list"] = [
+        prefix for prefix in strip_class_prefixes(config_dir)
+        if any(d.startswith(prefix) for d in descriptors)
+    ]
+    entries["replace-urls.list"] = [
+        url for url in read_config(os.path.join(config_dir, "replace-urls.list"))
+        if dex.find_string(url) is not None
+    ]
+    return entries
+
+
+def dex_cache_key(dex_name: str, dex_data: bytes, config_dir: str, fingerprint: str) -> str:
+    """Key for the fully patched output (steps 3-3d) of one input DEX."""
+    return _hash_parts(b"dex", fingerprint.encode(), dex_name.encode(),
+                       hashlib.sha256(dex_data).digest(),
+                       dex_config_entries(dex_name, dex_data, config_dir),
+                       URL_REPLACEMENT)
+
+
+def manifest_cache_key(apk_path: str, config_dir: str, fingerprint: str) -> str:
+    """Key for the compiled, patched AndroidManifest.xml of base.apk.
+
+    apktool resolves manifest references through resources.arsc, so both
+    entries are part of the key.
+    """
+    h_manifest = hashlib.sha256()
+    h_resources = hashlib.sha256()
+    with zipfile.ZipFile(apk_path) as zf:
+        for name, h in (("AndroidManifest.xml", h_manifest), ("resources.arsc", h_resources)):
+            try:
+                with zf.open(name) as f:
+                    for chunk in iter(lambda: f.read(1 << 20), b""):
+                        h.update(chunk)
+            except KeyError:
+                pass
+    config = {name: read_config(os.path.join(config_dir, name)) for name in MANIFEST_LISTS}
+    return _hash_parts(b"manifest", fingerprint.encode(),
+                       h_manifest.digest(), h_resources.digest(), config)
+
+
+def signer_id(keystore: str, alias: str, storepass: str, apksigner: str) -> str:
+    """Identity of the split signer: the SHA-256 of the signing certificate
+    (DER, exported with keytool) plus the apksigner build-tools version.
+
+    If keytool cannot export the certificate, the keystore bytes stand in
+    for it, so a regenerated key still misses the cache.
+    """
+    try:
+        proc = subprocess.run(["keytool", "-exportcert", "-keystore", keystore,
+                               "-alias", alias, "-storepass", storepass],
+                              capture_output=True, check=True)
+        cert = proc.stdout
+    except (OSError, subprocess.CalledProcessError):
+        cert = b""
+    if cert:
+        identity = "cert:" + hashlib.sha256(cert).hexdigest()
+    else:
+        with open(keystore, "rb") as f:
+            identity = "keystore:" + hashlib.sha256(f.read()).hexdigest()
+    return f"{identity}:{os.path.basename(os.path.dirname(apksigner))}"
+
+
+def split_cache_key(split_path: str, signer: str, script_dir: str) -> str:
+    """Key for the re-signed copy of one split APK.
+
+    Splits are never patched, so only their own bytes, the signer and the
+    repackaging code matter: config edits and DEX patches keep every split
+    cached.
+    """
+    h_split = hashlib.sha256()
+    with open(split_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h_split.update(chunk)
+    code = hashlib.sha256()
+    for name in SPLIT_SCRIPTS:
+        with open(os.path.join(script_dir, "scripts", name), "rb") as f:
+            code.update(hashlib.sha256(f.read()).digest())
+    return _hash_parts(b"split", signer.encode(), code.digest(),
+                       os.path.basename(split_path).encode(), h_split.digest())
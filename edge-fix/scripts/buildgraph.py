@@ -0,0 +1,163 @@
+"""
+buildgraph.py - Dependency-graph scheduler for build.sh stages.
+
+A stage is a shell command plus the stages it depends on and a rough peak
+memory estimate. Stages whose dependencies have finished run concurrently,
+bounded by a job count (default: CPU cores) and by a memory budget
+(default: MemAvailable from /proc/meminfo), so two JVM baksmali runs are
+not started on a phone that only has room for one. Each stage's output is
+streamed line by line with a [stage] prefix and also kept in a per-stage
+log file. A failed stage skips everything that depends on it; independent
+stages still run to completion.
+
+Each finished stage is measured over its whole process tree (wall, CPU,
+peak RSS, bytes read/written) and recorded as a buildreport.py "stage"
+event; scripts inside it see the stage name in EDGE_FIX_STAGE.
+"""
+
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+
+from buildreport import STAGE_ENV, emit, wait_child
+
+# Shell used for stage commands: strict mode, like build.sh itself
+STAGE_SHELL = ("bash", "-euo", "pipefail", "-c")
+
+
+class Stage:
+    """One node of the build graph."""
+
+    def __init__(self, name: str, command: str, deps: list[str] | None = None,
+                 mem_mb: int = 0):
+        self.name = name
+        self.command = command
+        self.deps = list(deps or [])
+        self.mem_mb = mem_mb
+
+
+def mem_available_mb() -> int | None:
+    """MemAvailable in MB, or None where /proc/meminfo is unavailable."""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) // 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def check_graph(stages: list[Stage]) -> None:
+    """Raise ValueError on duplicate names, unknown dependencies or cycles."""
+    names = {}
+    for stage in stages:
+        if stage.name in names:
+            raise ValueError(f"duplicate stage: {stage.name}")
+        names[stage.name] = stage
+    for stage in stages:
+        for dep in stage.deps:
+            if dep not in names:
+                raise ValueError(f"{stage.name}: unknown dependency {dep}")
+    remaining = {s.name: set(s.deps) for s in stages}
+    while remaining:
+        ready = [name for name, deps in remaining.items() if not deps]
+        if not ready:
+            raise ValueError(f"dependency cycle among: {', '.join(sorted(remaining))}")
+        for name in ready:
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+
+
+class _Output:
+    """Serializes prefixed stage output onto stdout."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+
+    def line(self, text: str) -> None:
+        with self.lock:
+            sys.stdout.write(text + "\n")
+            sys.stdout.flush()
+
+
+def _pump(stage: Stage, proc: subprocess.Popen, log_path: str | None, out: _Output,
+          done: queue.Queue) -> None:
+    log = open(log_path, "w") if log_path else None
+    try:
+        for line in proc.stdout:
+            line = line.rstrip("\n")
+            out.line(f"  [{stage.name}] {line}")
+            if log:
+                log.write(line + "\n")
+    finally:
+        if log:
+            log.close()
+        done.put((stage.name, wait_child(proc)))
+
+
+def run_graph(stages: list[Stage], jobs: int | None = None, mem_budget_mb: int | None = None,
+              log_dir: str | None = None) -> dict[str, int | None]:
+    """Run every stage, respecting dependencies and resource limits.
+
+    Returns stage name → exit status (None for stages skipped because a
+    dependency failed). Stages are started in list order among those ready.
+    """
+    check_graph(stages)
+    jobs = max(1, jobs or os.cpu_count() or 1)
+    if mem_budget_mb is None:
+        mem_budget_mb = mem_available_mb()
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+
+    out = _Output()
+    done: queue.Queue = queue.Queue()
+    results: dict[str, int | None] = {}
+    pending = list(stages)
+    running: dict[str, tuple[Stage, float]] = {}
+    mem_in_use = 0
+
+    def fits(stage: Stage) -> bool:
+        if not running:
+            return True     # always make progress, even over budget
+        if len(running) >= jobs:
+            return False
+        return mem_budget_mb is None or mem_in_use + stage.mem_mb <= mem_budget_mb
+
+    while pending or running:
+        for stage in list(pending):
+            if any(results.get(dep, 0) != 0 for dep in stage.deps if dep in results):
+                pending.remove(stage)
+                results[stage.name] = None
+                out.line(f"  [-] {stage.name}: skipped (dependency failed)")
+                continue
+            if not all(dep in results for dep in stage.deps) or not fits(stage):
+                continue
+            pending.remove(stage)
+            out.line(f"  [>] {stage.name}")
+            proc = subprocess.Popen(STAGE_SHELL + (stage.command,), stdout=subprocess.PIPE,
+                                    stderr=subprocess.STDOUT, text=True, errors="replace",
+                                    env={**os.environ, STAGE_ENV: stage.name})
+            log_path = os.path.join(log_dir, f"{stage.name.replace('/', '_')}.log") if log_dir else None
+            threading.Thread(target=_pump, args=(stage, proc, log_path, out, done),
+                             daemon=True).start()
+            running[stage.name] = (stage, time.monotonic())
+            mem_in_use += stage.mem_mb
+        if not running:
+            continue
+        name, usage = done.get()
+        stage, started = running.pop(name)
+        mem_in_use -= stage.mem_mb
+        status = results[name] = usage["status"]
+        elapsed = time.monotonic() - started
+        emit({"kind": "stage", "name": name, "deps": stage.deps,
+              "wall": round(elapsed, 3), **usage})
+        if status == 0:
+            out.line(f"  [x] {name} ({elapsed:.1f}s)")
+        else:
+            out.line(f"  [!] {name} failed (exit {status}, {elapsed:.1f}s)")
+    return results
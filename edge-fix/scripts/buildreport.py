@@ -0,0 +1,242 @@
+"""
+buildreport.py - Structured timing/memory events for the build report.
+
+build.sh exports EDGE_FIX_EVENTS (a JSON-lines file); every script run
+through run() and every build stage appends one event to it, and
+build-report.py folds the events into work/build-report.json at the end
+of the build. Without EDGE_FIX_EVENTS nothing is recorded, so scripts run
+by hand behave exactly as before.
+
+Event kinds:
+  script       one script invocation (run()), tagged with the enclosing
+               stage from EDGE_FIX_STAGE
+  stage        one stage-graph stage, measured from its process tree
+  stage-begin  snapshot of build.sh's own counters (build-report.py begin)
+  stage-end    matching snapshot at the end of a sequential step
+
+Measurements: wall and CPU seconds (user + system, including reaped child
+processes such as worker pools or the JVM), peak RSS in MB (largest single
+process), bytes read/written at the syscall level (/proc/<pid>/io rchar /
+wchar, which also include reaped children), plus the files and patches a
+script reports through count().
+
+EDGE_FIX_PROFILE=<dir> additionally runs each script's main() under
+cProfile and writes <dir>/<script>-<pid>.prof (worker pool processes are
+not profiled).
+"""
+
+import cProfile
+import json
+import os
+import resource
+import sys
+import time
+
+EVENTS_ENV = "EDGE_FIX_EVENTS"
+STAGE_ENV = "EDGE_FIX_STAGE"
+PROFILE_ENV = "EDGE_FIX_PROFILE"
+
+_counters = {"files": 0, "patches": 0}
+
+
+def count(files: int = 0, patches: int = 0) -> None:
+    """Add to the files touched / patches applied of the current script."""
+    _counters["files"] += files
+    _counters["patches"] += patches
+
+
+def read_io(pid: int | str = "self") -> tuple[int, int] | None:
+    """(bytes read, bytes written) of a process, or None if unavailable."""
+    try:
+        with open(f"/proc/{pid}/io") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+        return int(fields["rchar"]), int(fields["wchar"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def read_cpu_ticks(pid: int | str = "self") -> float | None:
+    """utime + stime + cutime + cstime of a process in seconds, or None."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # Fields after the parenthesized command name; utime is field 14
+            fields = f.read().rsplit(")", 1)[1].split()
+        return sum(int(v) for v in fields[11:15]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def emit(event: dict) -> None:
+    """Append one event to the events file (no-op when reporting is off)."""
+    path = os.environ.get(EVENTS_ENV)
+    if not path:
+        return
+    event.setdefault("time", time.time())
+    line = (json.dumps(event, sort_keys=True) + "\n").encode()
+    # One O_APPEND write per event: concurrent stages never interleave lines
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+
+def _cpu_seconds() -> float:
+    me = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return me.ru_utime + me.ru_stime + children.ru_utime + children.ru_stime
+
+
+def _usage(before_cpu: float, before_io: tuple[int, int] | None) -> dict:
+    peak_kb = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    usage = {
+        "cpu": round(_cpu_seconds() - before_cpu, 3),
+        # ru_maxrss is in KB on Linux/Android
+        "peak_rss_mb": round(peak_kb / 1024, 1),
+    }
+    after_io = read_io()
+    if before_io and after_io:
+        usage["read_bytes"] = after_io[0] - before_io[0]
+        usage["write_bytes"] = after_io[1] - before_io[1]
+    return usage
+
+
+def run(main, name: str | None = None) -> None:
+    """Run a script's main(), recording a "script" event when it returns.
+
+    Wall, CPU and I/O cover main() itself (not interpreter start-up and
+    imports); peak RSS is the process high-water mark. The exit status is
+    recorded for sys.exit() and for uncaught exceptions, which are
+    re-raised unchanged.
+    """
+    if name is None:
+        name = os.path.splitext(os.path.basename(sys.argv[0]))[0]
+    reporting = bool(os.environ.get(EVENTS_ENV))
+    profile_dir = os.environ.get(PROFILE_ENV)
+    if not reporting and not profile_dir:
+        main()
+        return
+
+    before_io = read_io()
+    before_cpu = _cpu_seconds()
+    start = time.monotonic()
+    profiler = cProfile.Profile() if profile_dir else None
+    status = 0
+    try:
+        if profiler:
+            profiler.runcall(main)
+        else:
+            main()
+    except SystemExit as e:
+        status = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        raise
+    except BaseException:
+        status = 1
+        raise
+    finally:
+        event = {"kind": "script", "name": name, "argv": sys.argv[1:], "status": status,
+                 "wall": round(time.monotonic() - start, 3),
+                 "stage": os.environ.get(STAGE_ENV) or None, **_counters}
+        event.update(_usage(before_cpu, before_io))
+        if profiler:
+            os.makedirs(profile_dir, exist_ok=True)
+            event["profile"] = os.path.join(profile_dir, f"{name}-{os.getpid()}.prof")
+            profiler.dump_stats(event["profile"])
+        if reporting:
+            emit(event)
+
+
+def wait_child(proc) -> dict:
+    """Reap a subprocess.Popen child and measure its whole process tree.
+
+    The child is first waited for without reaping, so /proc/<pid>/io can
+    still be read (it includes every descendant the child reaped), then
+    reaped with wait4 for CPU time and peak RSS. Sets proc.returncode.
+    """
+    os.waitid(os.P_PID, proc.pid, os.WEXITED | os.WNOWAIT)
+    io = read_io(proc.pid)
+    _pid, status, rusage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    usage = {"status": proc.returncode,
+             "cpu": round(rusage.ru_utime + rusage.ru_stime, 3),
+             "peak_rss_mb": round(rusage.ru_maxrss / 1024, 1)}
+    if io:
+        usage["read_bytes"], usage["write_bytes"] = io
+    return usage
+
+
+def snapshot(pid: int) -> dict:
+    """Cumulative counters of a running process (build.sh itself)."""
+    event = {"monotonic": time.monotonic()}
+    cpu = read_cpu_ticks(pid)
+    if cpu is not None:
+        event["cpu"] = cpu
+    io = read_io(pid)
+    if io:
+        event["read_bytes"], event["write_bytes"] = io
+    return event
+
+
+# ─── report ───
+
+def read_events(path: str) -> list[dict]:
+    events = []
+    try:
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        events.append(json.loads(line))
+                    except ValueError:
+                        pass    # a killed build can leave a partial line
+    except OSError:
+        pass
+    return events
+
+
+def build_report(events: list[dict]) -> dict:
+    """Fold raw events into per-stage totals plus the per-script list.
+
+    Sequential steps get their delta between stage-begin and stage-end.
+    Every stage collects the files/patches of the scripts run inside it;
+    peak RSS of a sequential step is the largest of its scripts (build.sh
+    cannot see the peak of its own children).
+    """
+    stages: dict[str, dict] = {}
+    begins: dict[str, dict] = {}
+    scripts = []
+    for event in events:
+        kind = event.get("kind")
+        if kind == "stage-begin":
+            begins[event["name"]] = event
+        elif kind == "stage-end" and event["name"] in begins:
+            begin = begins.pop(event["name"])
+            stage = {"name": event["name"], "kind": "step",
+                     "wall": round(event["monotonic"] - begin["monotonic"], 3)}
+            for key in ("cpu", "read_bytes", "write_bytes"):
+                if key in event and key in begin:
+                    stage[key] = round(event[key] - begin[key], 3)
+            stages[stage["name"]] = stage
+        elif kind == "stage":
+            stages[event["name"]] = {k: v for k, v in event.items() if k not in ("kind", "time")}
+            stages[event["name"]]["kind"] = "graph"
+        elif kind == "script":
+            scripts.append({k: v for k, v in event.items() if k != "kind"})
+
+    for stage in stages.values():
+        stage.setdefault("files", 0)
+        stage.setdefault("patches", 0)
+    for script in scripts:
+        stage = stages.get(script.get("stage"))
+        if stage is None:
+            continue
+        stage["files"] += script.get("files", 0)
+        stage["patches"] += script.get("patches", 0)
+        if stage["kind"] == "step":
+            stage["peak_rss_mb"] = max(stage.get("peak_rss_mb", 0), script.get("peak_rss_mb", 0))
+
+    build = stages.pop("build", None)
+    ordered = sorted(stages.values(), key=lambda s: s["wall"], reverse=True)
+    return {"build": build, "stages": ordered, "scripts": scripts}
@@ -0,0 +1,123 @@
+"""
+callindex.py - Call-site index over the code_items of a DEX file.
+
+Every code_item is walked once with the dalvik.py width table (no
+disassembler) and each invoke-* / invoke-polymorphic is recorded as a
+(callee method_idx, caller method_idx, pc) triple. Queries then answer
+"who calls Ljava/lang/System;->loadLibrary" or "who calls anything in
+Lcom/adjust/sdk/" without baksmali, which is how the obfuscated entries
+of neutralize-libs.list (smali/w760.smali, ...) are found again after an
+Edge release renames them.
+
+An index is keyed by the SHA-256 of the DEX bytes and stored in the build
+cache (buildcache.CachedDexIndex, kind "callsites"): a DEX is scanned once
+per content, and the DEX files a new release did not change are never
+rescanned. An entry holds:
+  methods.txt  every method_ids reference, one per line, in index order
+  calls.bin    uint32 (callee, caller, pc) triples, sorted by callee
+"""
+
+import bisect
+import struct
+from array import array
+
+from buildcache import CachedDexIndex
+from classindex import class_descriptor
+from dalvik import FORMAT_WIDTH, METHOD, OPCODES, instruction_width
+from dexfile import DexFile
+
+INVOKE_OPCODES = frozenset(op for op, (_name, _fmt, kind) in enumerate(OPCODES) if kind == METHOD)
+_WIDTHS = [FORMAT_WIDTH[fmt] for _name, fmt, _kind in OPCODES]
+
+
+def method_matcher(query: str):
+    """Predicate over method references for one query.
+
+      Lx/Y;->name(I)V   that exact method
+      Lx/Y;->name       every overload of name
+      Lx/Y; or x.Y      every method of the class
+      x/y/ or x.y.      every method of every class under the package
+    """
+    if "->" in query:
+        cls, _, name = query.partition("->")
+        prefix = f"{class_descriptor(cls)}->{name}"
+        if "(" in name:
+            return lambda ref: ref == prefix
+        return lambda ref: ref.startswith(prefix + "(")
+    if query.endswith(("/", ".")):
+        prefix = "L" + query.lstrip("L").replace(".", "/")
+        return lambda ref: ref.startswith(prefix)
+    prefix = class_descriptor(query) + "->"
+    return lambda ref: ref.startswith(prefix)
+
+
+def scan_calls(dex: DexFile) -> array:
+    """(callee, caller, pc) triples of every invoke in the DEX, sorted by callee.
+
+    A code_item shared by several methods (d8 deduplicates identical
+    bodies) is walked once and its calls are attributed to each of them.
+    """
+    data = dex.data
+    triples: list[tuple[int, int, int]] = []
+    walked: dict[int, list[tuple[int, int]]] = {}
+    for caller, _flags, code_off in dex.all_methods():
+        if not code_off:
+            continue
+        calls = walked.get(code_off)
+        if calls is None:
+            calls = walked[code_off] = []
+            insns_size, = struct.unpack_from("<I", data, code_off + 12)
+            insns = data[code_off + 16:code_off + 16 + 2 * insns_size]
+            pc = 0
+            while pc < insns_size:
+                opcode = insns[2 * pc]
+                if opcode == 0 and insns[2 * pc + 1]:
+                    width = instruction_width(insns, pc)    # switch/array payload
+                else:
+                    width = _WIDTHS[opcode]
+                    if opcode in INVOKE_OPCODES:
+                        calls.append((insns[2 * pc + 2] | (insns[2 * pc + 3] << 8), pc))
+                pc += width
+        for callee, pc in calls:
+            triples.append((callee, caller, pc))
+    triples.sort()
+    flat = array("I")
+    for triple in triples:
+        flat.extend(triple)
+    return flat
+
+
+class CallIndex(CachedDexIndex):
+    """Call sites of one DEX, queryable by callee."""
+
+    CACHE_KIND = "callsites"
+    INDEX_VERSION = b"callindex-1"
+    ARRAYS = (("calls.bin", "calls", "I"),)
+
+    def __init__(self, methods: list[str], calls: array):
+        self.methods = methods      # method_idx → reference
+        self.calls = calls          # flat (callee, caller, pc) triples
+        self._callees = calls[0::3]
+
+    @classmethod
+    def scan(cls, data: bytes) -> "CallIndex":
+        dex = DexFile(data)
+        methods = [dex.method_ref(idx) for idx in range(dex.header.method_ids_size)]
+        return cls(methods, scan_calls(dex))
+
+    def cache_meta(self) -> dict:
+        return {"methods": len(self.methods), "calls": len(self._callees)}
+
+    def callers(self, query: str) -> list[tuple[str, int, str]]:
+        """(caller, pc, callee) of every call to a method matching query,
+        ordered by callee then caller."""
+        match = method_matcher(query)
+        sites = []
+        for callee, ref in enumerate(self.methods):
+            if not match(ref):
+                continue
+            i = bisect.bisect_left(self._callees, callee)
+            while i < len(self._callees) and self._callees[i] == callee:
+                sites.append((self.methods[self.calls[3 * i + 1]], self.calls[3 * i + 2], ref))
+                i += 1
+        return sites
@@ -0,0 +1,142 @@
+"""
+checkpoint.py - Step checkpoints for resumable builds (build.sh --resume).
+
+A checkpoint records, for one build step, a fingerprint of everything it
+read (input files and directories, plus the pipeline code) and the content
+hash of every output it produced. On --resume a step is skipped when both
+still match: its inputs are unchanged and nothing has touched its outputs
+since. A stale step re-runs and rewrites its outputs, which in turn makes
+every step that reads them stale.
+
+Hashes are SHA-256 of file contents. They are memoized per path under
+(size, mtime_ns) in hashes.json, so an unchanged multi-hundred-MB base.apk
+is only hashed once; write_if_changed() keeps the mtime of outputs whose
+bytes did not change, so the memo stays valid across re-runs.
+
+Layout: <checkpoint-dir>/<step>.json, <checkpoint-dir>/hashes.json
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+from buildcache import pipeline_fingerprint
+
+MISSING = "-"
+
+
+def write_if_changed(path: str, data: bytes | bytearray) -> bool:
+    """Write data to path unless it already holds exactly these bytes.
+
+    Returns True if the file was written. An unchanged file keeps its
+    mtime, so later steps (and the hash memo) see it as untouched.
+    """
+    try:
+        if os.path.getsize(path) == len(data):
+            with open(path, "rb") as f:
+                if f.read() == data:
+                    return False
+    except OSError:
+        pass
+    with open(path, "wb") as f:
+        f.write(data)
+    return True
+
+
+def _atomic_json(path: str, obj: dict) -> None:
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    with os.fdopen(fd, "w") as f:
+        json.dump(obj, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+class Checkpoints:
+    """Checkpoint records of one work directory."""
+
+    def __init__(self, root: str, script_dir: str):
+        self.root = root
+        self.script_dir = script_dir
+        self._memo_path = os.path.join(root, "hashes.json")
+        try:
+            with open(self._memo_path) as f:
+                self._memo: dict[str, list] = json.load(f)
+        except (OSError, ValueError):
+            self._memo = {}
+        self._memo_dirty = False
+
+    def file_hash(self, path: str) -> str:
+        """SHA-256 of a file, memoized under its size and mtime."""
+        st = os.stat(path)
+        path = os.path.abspath(path)
+        memo = self._memo.get(path)
+        if memo and memo[0] == st.st_size and memo[1] == st.st_mtime_ns:
+            return memo[2]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        self._memo[path] = [st.st_size, st.st_mtime_ns, h.hexdigest()]
+        self._memo_dirty = True
+        return h.hexdigest()
+
+    def path_hash(self, path: str) -> str:
+        """Hash of a file, of a directory tree (relative names + contents),
+        or MISSING if the path does not exist."""
+        if os.path.isfile(path):
+            return self.file_hash(path)
+        if not os.path.isdir(path):
+            return MISSING
+        h = hashlib.sha256()
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for name in sorted(filenames):
+                full = os.path.join(dirpath, name)
+                h.update(os.path.relpath(full, path).encode() + b"\0")
+                h.update(self.file_hash(full).encode())
+        return h.hexdigest()
+
+    def fingerprint(self, inputs: list[str]) -> str:
+        """One hash over the pipeline code and every input path."""
+        h = hashlib.sha256(pipeline_fingerprint(self.script_dir).encode())
+        for path in inputs:
+            h.update(b"\0" + os.path.abspath(path).encode() + b"=" + self.path_hash(path).encode())
+        return h.hexdigest()
+
+    def _record_path(self, step: str) -> str:
+        return os.path.join(self.root, step.replace("/", "_").replace(":", "_") + ".json")
+
+    def is_current(self, step: str, inputs: list[str], outputs: list[str]) -> bool:
+        """True if step completed with these inputs and its outputs are intact."""
+        try:
+            with open(self._record_path(step)) as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if record.get("inputs") != self.fingerprint(inputs):
+            return False
+        recorded = record.get("outputs", {})
+        if sorted(recorded) != sorted(os.path.abspath(p) for p in outputs):
+            return False
+        return all(self.path_hash(path) == digest for path, digest in recorded.items())
+
+    def save(self, step: str, inputs: list[str], outputs: list[str]) -> None:
+        """Record step as completed with the current inputs and outputs."""
+        os.makedirs(self.root, exist_ok=True)
+        record = {"step": step, "inputs": self.fingerprint(inputs),
+                  "outputs": {os.path.abspath(p): self.path_hash(p) for p in outputs}}
+        _atomic_json(self._record_path(step), record)
+
+    def clear(self, step: str) -> None:
+        try:
+            os.unlink(self._record_path(step))
+        except FileNotFoundError:
+            pass
+
+    def flush(self) -> None:
+        """Persist newly computed hashes (concurrent stages: last writer wins,
+        the memo is only an optimization)."""
+        if self._memo_dirty:
+            os.makedirs(self.root, exist_ok=True)
+            _atomic_json(self._memo_path, self._memo)
+            self._memo_dirty = False
@@ -0,0 +1,109 @@
+"""
+classindex.py - Class → DEX locator over an APK's classesN.dex files.
+
+Reads class_defs/type_ids straight from each DEX (dexfile.py), so finding
+which DEX defines a class is a couple of binary searches per DEX instead of
+a baksmali run per DEX. Also checks the smali_classesN prefixes hard-coded
+in config lists against where the classes actually live.
+"""
+
+import glob
+import os
+import zipfile
+
+from dexfile import DexFile
+from edgeconfig import DEX_ENTRY_RE, dex_sort_key, dex_to_smali_dir, read_config, smali_to_dex
+
+# Config lists whose entries start with a smali_classesN/ path
+SMALI_PATH_LISTS = ("targeted-stubs.list", "neutralize-libs.list")
+
+
+def class_descriptor(name: str) -> str:
+    """Normalize a class name to a type descriptor.
+
+    Accepts 'Lorg/chromium/base/BuildInfo;', 'org.chromium.base.BuildInfo',
+    'org/chromium/base/BuildInfo' and smali paths such as
+    'smali_classes4/org/chromium/base/BuildInfo.smali'.
+    """
+    if name.startswith("L") and name.endswith(";"):
+        return name
+    if name.endswith(".smali"):
+        name = name[:-len(".smali")]
+        if smali_to_dex(name) is not None:
+            name = name.split("/", 1)[1]
+    return "L" + name.replace(".", "/") + ";"
+
+
+def smali_path(descriptor: str, dex_name: str) -> str:
+    """baksmali output path of a class, e.g. smali_classes4/org/.../X.smali."""
+    return f"{dex_to_smali_dir(dex_name)}/{descriptor[1:-1]}.smali"
+
+
+class ClassIndex:
+    """Locates class definitions across a set of DEX files."""
+
+    def __init__(self, dexes: dict[str, DexFile]):
+        self.dexes = dexes  # DEX name → DexFile, in load order
+
+    @classmethod
+    def open(cls, path: str) -> "ClassIndex":
+        """Index an APK/zip, a directory of classes*.dex or a single DEX."""
+        dexes: dict[str, DexFile] = {}
+        if os.path.isdir(path):
+            names = [os.path.basename(p) for p in glob.glob(os.path.join(path, "classes*.dex"))]
+            for name in sorted((n for n in names if DEX_ENTRY_RE.fullmatch(n)), key=dex_sort_key):
+                dexes[name] = DexFile.open(os.path.join(path, name))
+        elif zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as zf:
+                names = [n for n in zf.namelist() if DEX_ENTRY_RE.fullmatch(n)]
+                for name in sorted(names, key=dex_sort_key):
+                    dexes[name] = DexFile(zf.read(name))
+        else:
+            dexes[os.path.basename(path)] = DexFile.open(path)
+        return cls(dexes)
+
+    def locate(self, name: str) -> str | None:
+        """Name of the DEX that defines class name, or None."""
+        descriptor = class_descriptor(name)
+        for dex_name, dex in self.dexes.items():
+            if dex.defines_class(descriptor):
+                return dex_name
+        return None
+
+    def class_map(self) -> dict[str, str]:
+        """Descriptor → DEX name for every defined class.
+
+        The first definition wins, matching the class loader's search order.
+        """
+        result: dict[str, str] = {}
+        for dex_name, dex in self.dexes.items():
+            for descriptor in dex.class_descriptors():
+                result.setdefault(descriptor, dex_name)
+        return result
+
+
+def dex_sources(path: str) -> list[tuple[str, str]]:
+    """(DEX name, path to read it from) for an APK, a DEX directory or a DEX."""
+    names = list(ClassIndex.open(path).dexes)
+    if zipfile.is_zipfile(path):
+        return [(name, path) for name in names]
+    if os.path.isdir(path):
+        return [(name, os.path.join(path, name)) for name in names]
+    return [(names[0], path)]
+
+
+def check_config(index: ClassIndex, config_dir: str) -> list[tuple[str, str, str | None]]:
+    """Validate the smali_classesN prefixes of the smali-path config lists.
+
+    Returns (list name, entry, actual DEX or None) for every entry whose
+    class is not defined in the DEX its prefix names.
+    """
+    problems = []
+    for list_name in SMALI_PATH_LISTS:
+        for entry in read_config(os.path.join(config_dir, list_name)):
+            path = entry.partition("|")[0]
+            expected = smali_to_dex(path)
+            actual = index.locate(path)
+            if actual != expected:
+                problems.append((list_name, entry, actual))
+    return problems
@@ -0,0 +1,191 @@
+"""
+dalvik.py - Dalvik bytecode instruction table for the edge-fix DEX tools.
+
+Knows the width of every opcode and which operand (if any) is a constant-pool
+index, which is all the binary DEX tools need to walk a code_item's insns,
+find const-string / invoke / field references and rewrite pool indices in
+place without a disassembler.
+
+Format reference: https://source.android.com/docs/core/runtime/dalvik-bytecode
+"""
+
+import struct
+
+# Index kinds carried by instructions
+STRING = "string"
+TYPE = "type"
+FIELD = "field"
+METHOD = "method"
+PROTO = "proto"
+CALL_SITE = "call_site"
+METHOD_HANDLE = "method_handle"
+
+# Instruction format → width in 16-bit code units
+FORMAT_WIDTH = {
+    "10x": 1, "12x": 1, "11n": 1, "11x": 1, "10t": 1,
+    "20t": 2, "22x": 2, "21t": 2, "21s": 2, "21h": 2, "21c": 2,
+    "23x": 2, "22b": 2, "22t": 2, "22s": 2, "22c": 2,
+    "32x": 3, "30t": 3, "31t": 3, "31i": 3, "31c": 3, "35c": 3, "3rc": 3,
+    "45cc": 4, "4rcc": 4,
+    "51l": 5,
+}
+
+
+def _build_table() -> list[tuple[str, str, str | None]]:
+    """(mnemonic, format, index kind) for opcodes 0x00-0xff."""
+    table: list[tuple[str, str, str | None]] = [("unused", "10x", None)] * 256
+
+    def put(op: int, name: str, fmt: str, kind: str | None = None) -> None:
+        table[op] = (name, fmt, kind)
+
+    put(0x00, "nop", "10x")
+    for op, name, fmt in (
+        (0x01, "move", "12x"), (0x02, "move/from16", "22x"), (0x03, "move/16", "32x"),
+        (0x04, "move-wide", "12x"), (0x05, "move-wide/from16", "22x"),
+        (0x06, "move-wide/16", "32x"), (0x07, "move-object", "12x"),
+        (0x08, "move-object/from16", "22x"), (0x09, "move-object/16", "32x"),
+        (0x0a, "move-result", "11x"), (0x0b, "move-result-wide", "11x"),
+        (0x0c, "move-result-object", "11x"), (0x0d, "move-exception", "11x"),
+        (0x0e, "return-void", "10x"), (0x0f, "return", "11x"),
+        (0x10, "return-wide", "11x"), (0x11, "return-object", "11x"),
+        (0x12, "const/4", "11n"), (0x13, "const/16", "21s"), (0x14, "const", "31i"),
+        (0x15, "const/high16", "21h"), (0x16, "const-wide/16", "21s"),
+        (0x17, "const-wide/32", "31i"), (0x18, "const-wide", "51l"),
+        (0x19, "const-wide/high16", "21h"),
+        (0x1d, "monitor-enter", "11x"), (0x1e, "monitor-exit", "11x"),
+        (0x21, "array-length", "12x"), (0x26, "fill-array-data", "31t"),
+        (0x27, "throw", "11x"), (0x28, "goto", "10t"), (0x29, "goto/16", "20t"),
+        (0x2a, "goto/32", "30t"), (0x2b, "packed-switch", "31t"),
+        (0x2c, "sparse-switch", "31t"),
+    ):
+        put(op, name, fmt)
+
+    put(0x1a, "const-string", "21c", STRING)
+    put(0x1b, "const-string/jumbo", "31c", STRING)
+    put(0x1c, "const-class", "21c", TYPE)
+    put(0x1f, "check-cast", "21c", TYPE)
+    put(0x20, "instance-of", "22c", TYPE)
+    put(0x22, "new-instance", "21c", TYPE)
+    put(0x23, "new-array", "22c", TYPE)
+    put(0x24, "filled-new-array", "35c", TYPE)
+    put(0x25, "filled-new-array/range", "3rc", TYPE)
+
+    for i, name in enumerate(("cmpl-float", "cmpg-float", "cmpl-double",
+                              "cmpg-double", "cmp-long")):
+        put(0x2d + i, name, "23x")
+    for i, name in enumerate(("eq", "ne", "lt", "ge", "gt", "le")):
+        put(0x32 + i, f"if-{name}", "22t")
+        put(0x38 + i, f"if-{name}z", "21t")
+
+    suffixes = ("", "-wide", "-object", "-boolean", "-byte", "-char", "-short")
+    for i, suffix in enumerate(suffixes):
+        put(0x44 + i, f"aget{suffix}", "23x")
+        put(0x4b + i, f"aput{suffix}", "23x")
+        put(0x52 + i, f"iget{suffix}", "22c", FIELD)
+        put(0x59 + i, f"iput{suffix}", "22c", FIELD)
+        put(0x60 + i, f"sget{suffix}", "21c", FIELD)
+        put(0x67 + i, f"sput{suffix}", "21c", FIELD)
+
+    for i, kind in enumerate(("virtual", "super", "direct", "static", "interface")):
+        put(0x6e + i, f"invoke-{kind}", "35c", METHOD)
+        put(0x74 + i, f"invoke-{kind}/range", "3rc", METHOD)
+
+    for op in range(0x7b, 0x90):
+        put(op, "unop", "12x")
+    for op in range(0x90, 0xb0):
+        put(op, "binop", "23x")
+    for op in range(0xb0, 0xd0):
+        put(op, "binop/2addr", "12x")
+    for op in range(0xd0, 0xd8):
+        put(op, "binop/lit16", "22s")
+    for op in range(0xd8, 0xe3):
+        put(op, "binop/lit8", "22b")
+
+    put(0xfa, "invoke-polymorphic", "45cc", METHOD)
+    put(0xfb, "invoke-polymorphic/range", "4rcc", METHOD)
+    put(0xfc, "invoke-custom", "35c", CALL_SITE)
+    put(0xfd, "invoke-custom/range", "3rc", CALL_SITE)
+    put(0xfe, "const-method-handle", "21c", METHOD_HANDLE)
+    put(0xff, "const-method-type", "21c", PROTO)
+    return table
+
+
+OPCODES = _build_table()
+
+# Pseudo-instruction payload identifiers (nop opcode with a high byte)
+PACKED_SWITCH_PAYLOAD = 0x0100
+SPARSE_SWITCH_PAYLOAD = 0x0200
+FILL_ARRAY_DATA_PAYLOAD = 0x0300
+
+
+def instruction_width(insns: bytes | bytearray | memoryview, pc: int) -> int:
+    """Width in code units of the instruction at code unit pc."""
+    unit = insns[2 * pc] | (insns[2 * pc + 1] << 8)
+    if unit == PACKED_SWITCH_PAYLOAD:
+        size = insns[2 * pc + 2] | (insns[2 * pc + 3] << 8)
+        return size * 2 + 4
+    if unit == SPARSE_SWITCH_PAYLOAD:
+        size = insns[2 * pc + 2] | (insns[2 * pc + 3] << 8)
+        return size * 4 + 2
+    if unit == FILL_ARRAY_DATA_PAYLOAD:
+        element_width = insns[2 * pc + 2] | (insns[2 * pc + 3] << 8)
+        size, = struct.unpack_from("<I", insns, 2 * pc + 4)
+        return (size * element_width + 1) // 2 + 4
+    return FORMAT_WIDTH[OPCODES[unit & 0xFF][1]]
+
+
+def iter_instructions(insns: bytes | bytearray | memoryview):
+    """Yield (pc, opcode, width) for every instruction, payloads included.
+
+    Payload pseudo-instructions are reported with opcode 0x00 (nop).
+    """
+    pc = 0
+    n_units = len(insns) // 2
+    while pc < n_units:
+        width = instruction_width(insns, pc)
+        yield pc, insns[2 * pc], width
+        pc += width
+
+
+def iter_index_refs(insns: bytes | bytearray | memoryview):
+    """Yield (pc, kind, index) for every pool index an instruction carries.
+
+    invoke-polymorphic yields both its METHOD and its PROTO operand.
+    """
+    for pc, opcode, width in iter_instructions(insns):
+        _name, fmt, kind = OPCODES[opcode]
+        if kind is None:
+            continue
+        if fmt == "31c":
+            yield pc, kind, struct.unpack_from("<I", insns, 2 * pc + 2)[0]
+        else:
+            yield pc, kind, struct.unpack_from("<H", insns, 2 * pc + 2)[0]
+            if fmt in ("45cc", "4rcc"):
+                yield pc, PROTO, struct.unpack_from("<H", insns, 2 * pc + 6)[0]
+
+
+def remap_indices(insns: bytearray, remap) -> None:
+    """Rewrite pool indices in place.
+
+    remap(kind, old_index) returns the new index. Raises OverflowError if a
+    16-bit operand (e.g. const-string) would need a wider instruction.
+    """
+    for pc, opcode, width in iter_instructions(insns):
+        _name, fmt, kind = OPCODES[opcode]
+        if kind is None:
+            continue
+        if fmt == "31c":
+            old, = struct.unpack_from("<I", insns, 2 * pc + 2)
+            struct.pack_into("<I", insns, 2 * pc + 2, remap(kind, old))
+            continue
+        old, = struct.unpack_from("<H", insns, 2 * pc + 2)
+        new = remap(kind, old)
+        if new > 0xFFFF:
+            raise OverflowError(f"{kind} index {new} does not fit {OPCODES[opcode][0]} at pc {pc}")
+        struct.pack_into("<H", insns, 2 * pc + 2, new)
+        if fmt in ("45cc", "4rcc"):
+            old, = struct.unpack_from("<H", insns, 2 * pc + 6)
+            new = remap(PROTO, old)
+            if new > 0xFFFF:
+                raise OverflowError(f"proto index {new} does not fit {OPCODES[opcode][0]} at pc {pc}")
+            struct.pack_into("<H", insns, 2 * pc + 6, new)
@@ -0,0 +1,364 @@
+"""
+dexfile.py - Minimal DEX reader shared by the edge-fix binary tools.
+
+Parses the DEX header and the string_ids table into an offset-indexed string
+table. string_ids are sorted by UTF-16 code point value, so an exact lookup
+is a binary search over the table (O(log n) string decodes) instead of a
+byte-by-byte scan of a multi-megabyte classesN.dex. Only offsets reached
+through string_ids are ever treated as string_data_items.
+
+type_ids (sorted by descriptor string index) and class_defs are exposed the
+same way, which is enough to answer "does this DEX define class X" without
+parsing any code. method_ids, proto_ids and a class's class_data_item can be
+read on demand to find a method's code_item for in-place edits (dexpatch.py)
+or to walk every code_item for call sites (callindex.py).
+
+DexFile works on bytes, a bytearray or an mmap (dexio.py); DexFile.open()
+maps the file instead of reading it.
+
+Format reference: https://source.android.com/docs/core/runtime/dex-format
+"""
+
+import mmap
+import struct
+
+# Signature/checksum helpers live with the mmap I/O layer; re-exported here
+from dexio import compute_checksum, compute_signature, open_mapped, update_checksums
+
+DEX_MAGIC = b"dex\n"
+HEADER_SIZE = 0x70
+ENDIAN_CONSTANT = 0x12345678
+
+# header_item layout after magic/checksum/signature (offset 0x20)
+_HEADER_FIELDS = (
+    "file_size", "header_size", "endian_tag",
+    "link_size", "link_off", "map_off",
+    "string_ids_size", "string_ids_off",
+    "type_ids_size", "type_ids_off",
+    "proto_ids_size", "proto_ids_off",
+    "field_ids_size", "field_ids_off",
+    "method_ids_size", "method_ids_off",
+    "class_defs_size", "class_defs_off",
+    "data_size", "data_off",
+)
+
+
+class DexFormatError(ValueError):
+    """Raised when a buffer is not a well-formed DEX file."""
+
+
+def decode_uleb128(data: bytes, offset: int) -> tuple[int, int]:
+    """Decode ULEB128 at offset. Returns (value, bytes_consumed)."""
+    result = 0
+    shift = 0
+    size = 0
+    while True:
+        byte = data[offset + size]
+        result |= (byte & 0x7F) << shift
+        size += 1
+        shift += 7
+        if (byte & 0x80) == 0:
+            break
+    return result, size
+
+
+def encode_uleb128(value: int) -> bytes:
+    """Encode a non-negative integer as ULEB128."""
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def decode_mutf8(raw: bytes) -> str:
+    """Decode DEX Modified UTF-8 (NUL as C0 80, supplementary chars as
+    surrogate pairs) into a Python string."""
+    text = raw.replace(b"\xc0\x80", b"\x00").decode("utf-8", "surrogatepass")
+    # Re-pair surrogates that MUTF-8 encodes as two 3-byte sequences
+    return text.encode("utf-16-le", "surrogatepass").decode("utf-16-le", "surrogatepass")
+
+
+def encode_mutf8(text: str) -> bytes:
+    """Encode a Python string as DEX Modified UTF-8."""
+    out = bytearray()
+    for unit in struct.unpack(f"<{utf16_length(text)}H",
+                              text.encode("utf-16-le", "surrogatepass")):
+        if 0 < unit < 0x80:
+            out.append(unit)
+        elif unit < 0x800:
+            out += bytes((0xC0 | (unit >> 6), 0x80 | (unit & 0x3F)))
+        else:
+            out += bytes((0xE0 | (unit >> 12), 0x80 | ((unit >> 6) & 0x3F),
+                          0x80 | (unit & 0x3F)))
+    return bytes(out)
+
+
+def utf16_length(text: str) -> int:
+    """Number of UTF-16 code units, as stored in string_data_item.utf16_size."""
+    return len(text.encode("utf-16-le", "surrogatepass")) // 2
+
+
+def utf16_sort_key(text: str) -> bytes:
+    """Sort key matching the DEX string_ids order (UTF-16 code unit values)."""
+    return text.encode("utf-16-be", "surrogatepass")
+
+
+class DexHeader:
+    """Parsed header_item."""
+
+    def __init__(self, data: bytes | bytearray | memoryview):
+        if len(data) < HEADER_SIZE or bytes(data[:4]) != DEX_MAGIC:
+            raise DexFormatError("not a DEX file (bad magic)")
+        self.magic = bytes(data[:8])
+        self.version = self.magic[4:7].decode("ascii", "replace")
+        self.checksum, = struct.unpack_from("<I", data, 8)
+        self.signature = bytes(data[12:32])
+        values = struct.unpack_from(f"<{len(_HEADER_FIELDS)}I", data, 32)
+        for name, value in zip(_HEADER_FIELDS, values):
+            setattr(self, name, value)
+        if self.endian_tag != ENDIAN_CONSTANT:
+            raise DexFormatError(f"unsupported endian tag 0x{self.endian_tag:08x}")
+
+
+class DexFile:
+    """Read-only view of a DEX file with an indexed string table.
+
+    Strings are addressed by their string_ids index. Decoded strings are
+    cached, so repeated lookups during binary search stay cheap.
+    """
+
+    def __init__(self, data: bytes | bytearray | mmap.mmap):
+        self.data = data
+        self.header = DexHeader(data)
+        h = self.header
+        if h.string_ids_off + 4 * h.string_ids_size > len(data):
+            raise DexFormatError("string_ids table extends past end of file")
+        self._string_cache: dict[int, str] = {}
+
+    @classmethod
+    def open(cls, path: str) -> "DexFile":
+        """DexFile over a read-only mmap of path (nothing is read up front)."""
+        return cls(open_mapped(path))
+
+    # ─── string_ids / string_data_item ───
+
+    @property
+    def string_count(self) -> int:
+        return self.header.string_ids_size
+
+    def string_data_off(self, idx: int) -> int:
+        """Offset of the string_data_item for string index idx."""
+        if not 0 <= idx < self.header.string_ids_size:
+            raise IndexError(f"string index {idx} out of range")
+        return struct.unpack_from("<I", self.data, self.header.string_ids_off + 4 * idx)[0]
+
+    def string_entry(self, idx: int) -> tuple[int, int, int]:
+        """Locate string idx. Returns (utf16_size, data_start, data_end).
+
+        data_start..data_end are the MUTF-8 bytes, excluding the NUL.
+        """
+        off = self.string_data_off(idx)
+        utf16_size, uleb_size = decode_uleb128(self.data, off)
+        start = off + uleb_size
+        end = self.data.find(b"\x00", start)
+        if end < start:
+            raise DexFormatError(f"unterminated string_data_item at 0x{off:x}")
+        return utf16_size, start, end
+
+    def string_bytes(self, idx: int) -> bytes:
+        """Raw MUTF-8 bytes of string idx."""
+        _, start, end = self.string_entry(idx)
+        return bytes(self.data[start:end])
+
+    def string(self, idx: int) -> str:
+        """Decoded string idx."""
+        cached = self._string_cache.get(idx)
+        if cached is None:
+            cached = decode_mutf8(self.string_bytes(idx))
+            self._string_cache[idx] = cached
+        return cached
+
+    def strings(self):
+        """Iterate (idx, string) over the whole table in index order."""
+        for idx in range(self.header.string_ids_size):
+            yield idx, decode_mutf8(self.string_bytes(idx))
+
+    def find_string(self, text: str) -> int | None:
+        """Binary-search the sorted string table. Returns the index or None."""
+        key = utf16_sort_key(text)
+        lo, hi = 0, self.header.string_ids_size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            mid_key = utf16_sort_key(self.string(mid))
+            if mid_key < key:
+                lo = mid + 1
+            elif mid_key > key:
+                hi = mid
+            else:
+                return mid
+        return None
+
+    def string_insertion_point(self, text: str) -> int:
+        """Index at which text would be inserted to keep string_ids sorted."""
+        key = utf16_sort_key(text)
+        lo, hi = 0, self.header.string_ids_size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if utf16_sort_key(self.string(mid)) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    # ─── type_ids / class_defs ───
+
+    def type_string_idx(self, type_idx: int) -> int:
+        """descriptor_idx of type_ids[type_idx]."""
+        if not 0 <= type_idx < self.header.type_ids_size:
+            raise IndexError(f"type index {type_idx} out of range")
+        return struct.unpack_from("<I", self.data, self.header.type_ids_off + 4 * type_idx)[0]
+
+    def type_descriptor(self, type_idx: int) -> str:
+        """Descriptor of type_idx, e.g. 'Lorg/chromium/base/BuildInfo;'."""
+        return self.string(self.type_string_idx(type_idx))
+
+    def find_type(self, descriptor: str) -> int | None:
+        """type_idx for descriptor, or None if the DEX never references it.
+
+        type_ids are sorted by descriptor_idx, so this is two binary searches.
+        """
+        string_idx = self.find_string(descriptor)
+        if string_idx is None:
+            return None
+        lo, hi = 0, self.header.type_ids_size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            mid_idx = self.type_string_idx(mid)
+            if mid_idx < string_idx:
+                lo = mid + 1
+            elif mid_idx > string_idx:
+                hi = mid
+            else:
+                return mid
+        return None
+
+    def class_type_indices(self) -> list[int]:
+        """class_idx of every class_def, in class_defs order."""
+        h = self.header
+        return [class_idx for class_idx, in struct.iter_unpack(
+            "<I28x", self.data[h.class_defs_off:h.class_defs_off + 32 * h.class_defs_size])]
+
+    def class_descriptors(self):
+        """Iterate the descriptors of all classes defined in this DEX."""
+        for class_idx in self.class_type_indices():
+            yield self.type_descriptor(class_idx)
+
+    def defines_class(self, descriptor: str) -> bool:
+        """True if descriptor has a class_def here (not just a reference)."""
+        type_idx = self.find_type(descriptor)
+        return type_idx is not None and type_idx in self.class_type_indices()
+
+    # ─── method_ids / proto_ids / class_data ───
+
+    def method_id(self, method_idx: int) -> tuple[int, int, int]:
+        """(class_idx, proto_idx, name_idx) of method_ids[method_idx]."""
+        if not 0 <= method_idx < self.header.method_ids_size:
+            raise IndexError(f"method index {method_idx} out of range")
+        return struct.unpack_from("<HHI", self.data, self.header.method_ids_off + 8 * method_idx)
+
+    def method_name(self, method_idx: int) -> str:
+        return self.string(self.method_id(method_idx)[2])
+
+    def method_return_type(self, method_idx: int) -> str:
+        """Return type descriptor of a method, e.g. 'V' or 'Ljava/lang/String;'."""
+        proto_idx = self.method_id(method_idx)[1]
+        return_type_idx, = struct.unpack_from(
+            "<I", self.data, self.header.proto_ids_off + 12 * proto_idx + 4)
+        return self.type_descriptor(return_type_idx)
+
+    def find_method(self, class_descriptor: str, name: str, proto_descriptor: str) -> int | None:
+        """method_idx of a method reference such as System.loadLibrary, or None.
+
+        proto_descriptor is the smali form, e.g. '(Ljava/lang/String;)V'.
+        """
+        class_idx = self.find_type(class_descriptor)
+        name_idx = self.find_string(name)
+        if class_idx is None or name_idx is None:
+            return None
+        h = self.header
+        for method_idx, (m_class, m_proto, m_name) in enumerate(struct.iter_unpack(
+                "<HHI", self.data[h.method_ids_off:h.method_ids_off + 8 * h.method_ids_size])):
+            if m_class == class_idx and m_name == name_idx \
+                    and self.proto_descriptor(m_proto) == proto_descriptor:
+                return method_idx
+        return None
+
+    def proto_descriptor(self, proto_idx: int) -> str:
+        """Smali-style descriptor of proto_ids[proto_idx], e.g. '(IJ)V'."""
+        _shorty, return_type_idx, params_off = struct.unpack_from(
+            "<III", self.data, self.header.proto_ids_off + 12 * proto_idx)
+        params = ""
+        if params_off:
+            size, = struct.unpack_from("<I", self.data, params_off)
+            params = "".join(self.type_descriptor(t) for t in
+                             struct.unpack_from(f"<{size}H", self.data, params_off + 4))
+        return f"({params}){self.type_descriptor(return_type_idx)}"
+
+    def method_ref(self, method_idx: int) -> str:
+        """Smali-style reference, e.g. 'Ljava/lang/System;->loadLibrary(Ljava/lang/String;)V'."""
+        class_idx, proto_idx, name_idx = self.method_id(method_idx)
+        return (f"{self.type_descriptor(class_idx)}->{self.string(name_idx)}"
+                f"{self.proto_descriptor(proto_idx)}")
+
+    def class_data_off(self, descriptor: str) -> int | None:
+        """class_data_off of the class_def for descriptor (0 if it has no
+        members), or None if this DEX does not define the class."""
+        type_idx = self.find_type(descriptor)
+        if type_idx is None:
+            return None
+        h = self.header
+        for def_off in range(h.class_defs_off, h.class_defs_off + 32 * h.class_defs_size, 32):
+            class_idx, = struct.unpack_from("<I", self.data, def_off)
+            if class_idx == type_idx:
+                return struct.unpack_from("<I", self.data, def_off + 24)[0]
+        return None
+
+    def class_methods(self, class_data_off: int) -> list[tuple[int, int, int]]:
+        """(method_idx, access_flags, code_off) of every direct and virtual
+        method in a class_data_item. code_off is 0 for abstract/native."""
+        if not class_data_off:
+            return []
+        off = class_data_off
+        sizes = []
+        for _ in range(4):
+            value, size = decode_uleb128(self.data, off)
+            sizes.append(value)
+            off += size
+        static_fields, instance_fields, direct_methods, virtual_methods = sizes
+        for _ in range(2 * (static_fields + instance_fields)):
+            off += decode_uleb128(self.data, off)[1]
+        methods = []
+        for count in (direct_methods, virtual_methods):
+            method_idx = 0
+            for _ in range(count):
+                diff, size = decode_uleb128(self.data, off)
+                off += size
+                access_flags, size = decode_uleb128(self.data, off)
+                off += size
+                code_off, size = decode_uleb128(self.data, off)
+                off += size
+                method_idx += diff
+                methods.append((method_idx, access_flags, code_off))
+        return methods
+
+    def all_methods(self):
+        """Iterate (method_idx, access_flags, code_off) over every class_def."""
+        h = self.header
+        for def_off in range(h.class_defs_off, h.class_defs_off + 32 * h.class_defs_size, 32):
+            class_data_off, = struct.unpack_from("<I", self.data, def_off + 24)
+            yield from self.class_methods(class_data_off)
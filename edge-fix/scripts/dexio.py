@@ -0,0 +1,174 @@
+"""
+dexio.py - mmap-backed DEX file I/O shared by the edge-fix binary tools.
+
+A multi-megabyte classesN.dex is never read into the Python heap:
+
+  map_dex(path)        read-only mmap; DexFile, read_dex() and the call-site
+                       scanner work on it directly (slices copy only the
+                       bytes they touch)
+  DexEdit(src, dst)    writable mmap of a temporary copy of src, made next to
+                       dst by the kernel (no Python buffer). Same-size patches
+                       go straight into the mapping; commit() fixes the
+                       signature and checksum in streamed chunks, then
+                       renames the copy over dst — atomically, and only if
+                       the bytes differ from what dst already holds
+  replace_file()       the same atomic, change-only write for a DEX that was
+                       rebuilt in memory (dexmodel.write_dex)
+
+Memory therefore stays bounded by the pages actually touched (plus the
+model, for tools that rebuild a DEX), whatever the DEX size. A failed edit
+leaves the original file untouched.
+"""
+
+import hashlib
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import zlib
+from contextlib import contextmanager
+
+CHUNK_SIZE = 1 << 20
+
+
+def compute_signature(buf) -> bytes:
+    """SHA-1 of everything after the signature field (bytes 32..end),
+    hashed in CHUNK_SIZE slices of a memoryview (no copy)."""
+    h = hashlib.sha1()
+    with memoryview(buf) as view:
+        for off in range(32, len(view), CHUNK_SIZE):
+            h.update(view[off:off + CHUNK_SIZE])
+    return h.digest()
+
+
+def compute_checksum(buf) -> int:
+    """Adler-32 of everything after the checksum field (bytes 12..end), streamed."""
+    value = 1
+    with memoryview(buf) as view:
+        for off in range(12, len(view), CHUNK_SIZE):
+            value = zlib.adler32(view[off:off + CHUNK_SIZE], value)
+    return value & 0xFFFFFFFF
+
+
+def update_checksums(buf) -> None:
+    """Recompute the header signature, then the checksum that covers it.
+
+    buf is any writable buffer: bytearray or a writable mmap.
+    """
+    buf[12:32] = compute_signature(buf)
+    struct.pack_into("<I", buf, 8, compute_checksum(buf))
+
+
+def same_contents(path: str, buf) -> bool:
+    """True if the file at path holds exactly the bytes of buf (streamed)."""
+    try:
+        if os.path.getsize(path) != len(buf):
+            return False
+        with open(path, "rb") as f, memoryview(buf) as view:
+            for off in range(0, len(view), CHUNK_SIZE):
+                if f.read(CHUNK_SIZE) != view[off:off + CHUNK_SIZE]:
+                    return False
+        return True
+    except OSError:
+        return False
+
+
+def temp_beside(path: str, prefix: str | None = None) -> tuple[int, str]:
+    """Temporary file in path's directory (same filesystem, so os.replace()
+    is atomic), with the permissions a plain open() would have given it.
+    prefix defaults to ".<file name>."."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                               prefix=prefix or f".{os.path.basename(path)}.")
+    umask = os.umask(0)
+    os.umask(umask)
+    os.fchmod(fd, 0o666 & ~umask)
+    return fd, tmp
+
+
+def replace_file(path: str, buf) -> bool:
+    """Atomically write buf to path (temp file + rename) unless path already
+    holds these bytes. Returns True if written."""
+    if same_contents(path, buf):
+        return False
+    fd, tmp = temp_beside(path)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(buf)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return True
+
+
+def open_mapped(path: str) -> mmap.mmap | bytes:
+    """Read-only mmap that lives as long as the returned object (for long-lived
+    readers such as DexFile.open(); the descriptor is closed right away).
+
+    An empty file cannot be mapped and comes back as b"", which DexFile
+    rejects like any other non-DEX input.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+@contextmanager
+def map_dex(path: str):
+    """Read-only mmap of a DEX file for the duration of the block."""
+    data = open_mapped(path)
+    try:
+        yield data
+    finally:
+        if isinstance(data, mmap.mmap):
+            data.close()
+
+
+class DexEdit:
+    """In-place edits on a writable mmap of a temporary copy of a DEX.
+
+    The copy is created in dst's directory so commit() can rename it over
+    dst. Use as a context manager: leaving the block without commit()
+    (including through an exception) discards the copy.
+    """
+
+    def __init__(self, src: str, dst: str | None = None):
+        self.dst = dst or src
+        fd, self._tmp = temp_beside(self.dst)
+        os.close(fd)
+        try:
+            shutil.copyfile(src, self._tmp)     # sendfile/copy_file_range: no Python buffer
+            with open(self._tmp, "r+b") as f:
+                self.data = mmap.mmap(f.fileno(), 0)
+        except BaseException:
+            os.unlink(self._tmp)
+            raise
+
+    def __enter__(self) -> "DexEdit":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.discard()
+
+    def commit(self) -> bool:
+        """Fix signature and checksum, then atomically replace dst unless it
+        already holds the same bytes. Returns True if dst was written."""
+        update_checksums(self.data)
+        if same_contents(self.dst, self.data):
+            self.discard()
+            return False
+        self.data.flush()
+        self.data.close()
+        os.replace(self._tmp, self.dst)
+        self._tmp = None
+        return True
+
+    def discard(self) -> None:
+        if self._tmp is None:
+            return
+        if not self.data.closed:
+            self.data.close()
+        os.unlink(self._tmp)
+        self._tmp = None
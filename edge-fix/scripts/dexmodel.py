@@ -0,0 +1,1472 @@
+"""
+dexmodel.py - Full DEX reader/writer for structural rewrites.
+
+Loads every section of a DEX file into plain Python objects (DexModel) and
+writes a model back out as a valid DEX: pools are re-sorted and
+de-duplicated, every index reference (instructions, class_data, annotations,
+encoded values, debug info, call sites) is remapped, data items are laid
+out again with correct alignment, and the map_list, header sizes/offsets,
+signature and checksum are regenerated.
+
+This is what lets binary patches change the *contents* of pools (e.g. a
+string of a different length that sorts elsewhere) instead of being limited
+to same-length, in-place byte edits.
+
+Format reference: https://source.android.com/docs/core/runtime/dex-format
+"""
+
+import struct
+
+import dalvik
+from dexfile import (
+    DexFile, DexFormatError, HEADER_SIZE, ENDIAN_CONSTANT,
+    decode_uleb128, encode_uleb128, encode_mutf8, update_checksums,
+    utf16_length, utf16_sort_key,
+)
+from dexio import map_dex, replace_file
+
+NO_INDEX = 0xFFFFFFFF
+
+# map_list item type codes
+TYPE_HEADER_ITEM = 0x0000
+TYPE_STRING_ID_ITEM = 0x0001
+TYPE_TYPE_ID_ITEM = 0x0002
+TYPE_PROTO_ID_ITEM = 0x0003
+TYPE_FIELD_ID_ITEM = 0x0004
+TYPE_METHOD_ID_ITEM = 0x0005
+TYPE_CLASS_DEF_ITEM = 0x0006
+TYPE_CALL_SITE_ID_ITEM = 0x0007
+TYPE_METHOD_HANDLE_ITEM = 0x0008
+TYPE_MAP_LIST = 0x1000
+TYPE_TYPE_LIST = 0x1001
+TYPE_ANNOTATION_SET_REF_LIST = 0x1002
+TYPE_ANNOTATION_SET_ITEM = 0x1003
+TYPE_CLASS_DATA_ITEM = 0x2000
+TYPE_CODE_ITEM = 0x2001
+TYPE_STRING_DATA_ITEM = 0x2002
+TYPE_DEBUG_INFO_ITEM = 0x2003
+TYPE_ANNOTATION_ITEM = 0x2004
+TYPE_ENCODED_ARRAY_ITEM = 0x2005
+TYPE_ANNOTATIONS_DIRECTORY_ITEM = 0x2006
+TYPE_HIDDENAPI_CLASS_DATA_ITEM = 0xF000
+
+# encoded_value types
+VALUE_BYTE = 0x00
+VALUE_SHORT = 0x02
+VALUE_CHAR = 0x03
+VALUE_INT = 0x04
+VALUE_LONG = 0x06
+VALUE_FLOAT = 0x10
+VALUE_DOUBLE = 0x11
+VALUE_METHOD_TYPE = 0x15
+VALUE_METHOD_HANDLE = 0x16
+VALUE_STRING = 0x17
+VALUE_TYPE = 0x18
+VALUE_FIELD = 0x19
+VALUE_METHOD = 0x1a
+VALUE_ENUM = 0x1b
+VALUE_ARRAY = 0x1c
+VALUE_ANNOTATION = 0x1d
+VALUE_NULL = 0x1e
+VALUE_BOOLEAN = 0x1f
+
+_RAW_VALUES = {VALUE_BYTE, VALUE_SHORT, VALUE_CHAR, VALUE_INT, VALUE_LONG,
+               VALUE_FLOAT, VALUE_DOUBLE}
+_INDEX_VALUES = {
+    VALUE_METHOD_TYPE: dalvik.PROTO,
+    VALUE_METHOD_HANDLE: dalvik.METHOD_HANDLE,
+    VALUE_STRING: dalvik.STRING,
+    VALUE_TYPE: dalvik.TYPE,
+    VALUE_FIELD: dalvik.FIELD,
+    VALUE_METHOD: dalvik.METHOD,
+    VALUE_ENUM: dalvik.FIELD,
+}
+
+# debug_info_item opcodes that carry pool references
+DBG_END_SEQUENCE = 0x00
+DBG_ADVANCE_PC = 0x01
+DBG_ADVANCE_LINE = 0x02
+DBG_START_LOCAL = 0x03
+DBG_START_LOCAL_EXTENDED = 0x04
+DBG_END_LOCAL = 0x05
+DBG_RESTART_LOCAL = 0x06
+DBG_SET_FILE = 0x09
+
+# method_handle_item types that point at field_ids (the rest use method_ids)
+_FIELD_HANDLE_TYPES = {0x00, 0x01, 0x02, 0x03}
+
+# Element kind of each pool, used by remap callbacks
+POOLS = (dalvik.STRING, dalvik.TYPE, dalvik.PROTO, dalvik.FIELD, dalvik.METHOD,
+         dalvik.CALL_SITE, dalvik.METHOD_HANDLE)
+
+
+# ─── Model ───
+#
+# Encoded values are (value_type, payload) tuples:
+#   raw numeric types   → (value_arg, raw little-endian bytes)
+#   index types         → pool index
+#   VALUE_ARRAY         → list of encoded values
+#   VALUE_ANNOTATION    → EncodedAnnotation
+#   VALUE_NULL          → None
+#   VALUE_BOOLEAN       → bool
+# Annotations are (visibility, EncodedAnnotation) tuples.
+
+class Proto:
+    __slots__ = ("shorty_idx", "return_type_idx", "params")
+
+    def __init__(self, shorty_idx: int, return_type_idx: int, params: tuple[int, ...]):
+        self.shorty_idx = shorty_idx
+        self.return_type_idx = return_type_idx
+        self.params = params
+
+
+class FieldId:
+    __slots__ = ("class_idx", "type_idx", "name_idx")
+
+    def __init__(self, class_idx: int, type_idx: int, name_idx: int):
+        self.class_idx = class_idx
+        self.type_idx = type_idx
+        self.name_idx = name_idx
+
+
+class MethodId:
+    __slots__ = ("class_idx", "proto_idx", "name_idx")
+
+    def __init__(self, class_idx: int, proto_idx: int, name_idx: int):
+        self.class_idx = class_idx
+        self.proto_idx = proto_idx
+        self.name_idx = name_idx
+
+
+class MethodHandle:
+    __slots__ = ("handle_type", "target_idx")
+
+    def __init__(self, handle_type: int, target_idx: int):
+        self.handle_type = handle_type
+        self.target_idx = target_idx
+
+    @property
+    def target_kind(self) -> str:
+        return dalvik.FIELD if self.handle_type in _FIELD_HANDLE_TYPES else dalvik.METHOD
+
+
+class EncodedAnnotation:
+    __slots__ = ("type_idx", "elements")
+
+    def __init__(self, type_idx: int, elements: list[tuple[int, tuple]]):
+        self.type_idx = type_idx
+        self.elements = elements  # [(name string idx, encoded value)]
+
+
+class DebugInfo:
+    """debug_info_item; program mixes raw bytecode chunks and pool refs.
+
+    A ref is a (kind, index) tuple encoded as uleb128p1 (NO_INDEX → 0).
+    """
+    __slots__ = ("line_start", "parameter_names", "program")
+
+    def __init__(self, line_start: int, parameter_names: list[int], program: list):
+        self.line_start = line_start
+        self.parameter_names = parameter_names
+        self.program = program
+
+
+class CodeItem:
+    __slots__ = ("registers_size", "ins_size", "outs_size", "insns",
+                 "tries", "handlers", "debug_info")
+
+    def __init__(self, registers_size: int, ins_size: int, outs_size: int,
+                 insns: bytes, tries: list[tuple[int, int, int]],
+                 handlers: list[tuple[list[tuple[int, int]], int | None]],
+                 debug_info: DebugInfo | None):
+        self.registers_size = registers_size
+        self.ins_size = ins_size
+        self.outs_size = outs_size
+        self.insns = insns          # raw code units, little-endian
+        self.tries = tries          # [(start_addr, insn_count, handler index)]
+        self.handlers = handlers    # [([(type_idx, addr)], catch_all_addr | None)]
+        self.debug_info = debug_info
+
+
+class EncodedMethod:
+    __slots__ = ("method_idx", "access_flags", "code")
+
+    def __init__(self, method_idx: int, access_flags: int, code: CodeItem | None):
+        self.method_idx = method_idx
+        self.access_flags = access_flags
+        self.code = code
+
+
+class ClassData:
+    __slots__ = ("static_fields", "instance_fields", "direct_methods", "virtual_methods")
+
+    def __init__(self, static_fields: list[tuple[int, int]],
+                 instance_fields: list[tuple[int, int]],
+                 direct_methods: list[EncodedMethod],
+                 virtual_methods: list[EncodedMethod]):
+        self.static_fields = static_fields        # [(field_idx, access_flags)]
+        self.instance_fields = instance_fields
+        self.direct_methods = direct_methods
+        self.virtual_methods = virtual_methods
+
+    def methods(self):
+        yield from self.direct_methods
+        yield from self.virtual_methods
+
+
+class AnnotationsDirectory:
+    __slots__ = ("class_annotations", "fields", "methods", "parameters")
+
+    def __init__(self, class_annotations: list | None, fields: list, methods: list,
+                 parameters: list):
+        self.class_annotations = class_annotations  # [annotation] or None
+        self.fields = fields            # [(field_idx, [annotation])]
+        self.methods = methods          # [(method_idx, [annotation])]
+        self.parameters = parameters    # [(method_idx, [[annotation] | None])]
+
+    def is_empty(self) -> bool:
+        return (self.class_annotations is None and not self.fields
+                and not self.methods and not self.parameters)
+
+
+class ClassDef:
+    __slots__ = ("class_idx", "access_flags", "superclass_idx", "interfaces",
+                 "source_file_idx", "annotations", "class_data", "static_values")
+
+    def __init__(self, class_idx: int, access_flags: int, superclass_idx: int,
+                 interfaces: tuple[int, ...], source_file_idx: int,
+                 annotations: AnnotationsDirectory | None,
+                 class_data: ClassData | None, static_values: list | None):
+        self.class_idx = class_idx
+        self.access_flags = access_flags
+        self.superclass_idx = superclass_idx
+        self.interfaces = interfaces
+        self.source_file_idx = source_file_idx
+        self.annotations = annotations
+        self.class_data = class_data
+        self.static_values = static_values
+
+
+class DexModel:
+    """All pools and class definitions of one DEX file."""
+
+    def __init__(self, version: str = "035"):
+        self.version = version
+        self.strings: list[str] = []
+        self.types: list[int] = []              # descriptor string idx
+        self.protos: list[Proto] = []
+        self.fields: list[FieldId] = []
+        self.methods: list[MethodId] = []
+        self.classes: list[ClassDef] = []
+        self.call_sites: list[list] = []        # encoded arrays
+        self.method_handles: list[MethodHandle] = []
+
+    # ─── convenience accessors ───
+
+    def type_name(self, type_idx: int) -> str:
+        return self.strings[self.types[type_idx]]
+
+    def method_name(self, method_idx: int) -> str:
+        return self.strings[self.methods[method_idx].name_idx]
+
+    def method_return_type(self, method_idx: int) -> str:
+        proto = self.protos[self.methods[method_idx].proto_idx]
+        return self.type_name(proto.return_type_idx)
+
+    def find_class(self, descriptor: str) -> ClassDef | None:
+        for class_def in self.classes:
+            if self.type_name(class_def.class_idx) == descriptor:
+                return class_def
+        return None
+
+    # ─── I/O ───
+
+    @classmethod
+    def load(cls, path: str) -> "DexModel":
+        with map_dex(path) as data:
+            return read_dex(data)
+
+    def save(self, path: str, prune: bool = False) -> int:
+        """Write the model to path (atomically, and only if the bytes differ)."""
+        data = write_dex(self, prune=prune)
+        replace_file(path, data)
+        return len(data)
+
+
+# ─── Reader ───
+
+def _decode_sleb128(data: bytes, offset: int) -> tuple[int, int]:
+    value, size = decode_uleb128(data, offset)
+    bits = 7 * size
+    if value & (1 << (bits - 1)):
+        value -= 1 << bits
+    return value, size
+
+
+class _Reader:
+    def __init__(self, data: bytes):
+        self.data = data
+        self.dex = DexFile(data)
+        self.h = self.dex.header
+        self.model = DexModel(self.h.version)
+        self._annotation_sets: dict[int, list] = {}
+        self._type_lists: dict[int, tuple[int, ...]] = {}
+
+    def read(self) -> DexModel:
+        h, data, m = self.h, self.data, self.model
+        if h.link_size:
+            raise DexFormatError("DEX files with a link section are not supported")
+
+        map_types = self._map_types()
+        if TYPE_HIDDENAPI_CLASS_DATA_ITEM in map_types:
+            raise DexFormatError("hiddenapi_class_data_item is not supported")
+
+        m.strings = [s for _, s in self.dex.strings()]
+        m.types = list(struct.unpack_from(f"<{h.type_ids_size}I", data, h.type_ids_off))
+
+        for i in range(h.proto_ids_size):
+            shorty, ret, params_off = struct.unpack_from("<3I", data, h.proto_ids_off + 12 * i)
+            m.protos.append(Proto(shorty, ret, self._type_list(params_off)))
+        for i in range(h.field_ids_size):
+            cls_idx, type_idx, name = struct.unpack_from("<HHI", data, h.field_ids_off + 8 * i)
+            m.fields.append(FieldId(cls_idx, type_idx, name))
+        for i in range(h.method_ids_size):
+            cls_idx, proto, name = struct.unpack_from("<HHI", data, h.method_ids_off + 8 * i)
+            m.methods.append(MethodId(cls_idx, proto, name))
+
+        if TYPE_CALL_SITE_ID_ITEM in map_types:
+            off, count = map_types[TYPE_CALL_SITE_ID_ITEM]
+            for i in range(count):
+                array_off, = struct.unpack_from("<I", data, off + 4 * i)
+                m.call_sites.append(self._encoded_array(array_off)[0])
+        if TYPE_METHOD_HANDLE_ITEM in map_types:
+            off, count = map_types[TYPE_METHOD_HANDLE_ITEM]
+            for i in range(count):
+                handle_type, _, target, _ = struct.unpack_from("<HHHH", data, off + 8 * i)
+                m.method_handles.append(MethodHandle(handle_type, target))
+
+        for i in range(h.class_defs_size):
+            (class_idx, access, superclass, interfaces_off, source_file,
+             annotations_off, class_data_off, static_values_off) = \
+                struct.unpack_from("<8I", data, h.class_defs_off + 32 * i)
+            m.classes.append(ClassDef(
+                class_idx, access, superclass, self._type_list(interfaces_off),
+                source_file,
+                self._annotations_directory(annotations_off) if annotations_off else None,
+                self._class_data(class_data_off) if class_data_off else None,
+                self._encoded_array(static_values_off)[0] if static_values_off else None,
+            ))
+        return m
+
+    def _map_types(self) -> dict[int, tuple[int, int]]:
+        off = self.h.map_off
+        count, = struct.unpack_from("<I", self.data, off)
+        result = {}
+        for i in range(count):
+            item_type, _, size, item_off = struct.unpack_from("<HHII", self.data, off + 4 + 12 * i)
+            result[item_type] = (item_off, size)
+        return result
+
+    def _type_list(self, off: int) -> tuple[int, ...]:
+        if not off:
+            return ()
+        cached = self._type_lists.get(off)
+        if cached is None:
+            size, = struct.unpack_from("<I", self.data, off)
+            cached = struct.unpack_from(f"<{size}H", self.data, off + 4)
+            self._type_lists[off] = cached
+        return cached
+
+    # encoded values
+
+    def _encoded_value(self, off: int) -> tuple[tuple, int]:
+        data = self.data
+        header = data[off]
+        vtype, arg = header & 0x1F, header >> 5
+        off += 1
+        if vtype in _RAW_VALUES:
+            return (vtype, (arg, bytes(data[off:off + arg + 1]))), off + arg + 1
+        if vtype in _INDEX_VALUES:
+            value = int.from_bytes(data[off:off + arg + 1], "little")
+            return (vtype, value), off + arg + 1
+        if vtype == VALUE_ARRAY:
+            values, off = self._encoded_array(off)
+            return (vtype, values), off
+        if vtype == VALUE_ANNOTATION:
+            annotation, off = self._encoded_annotation(off)
+            return (vtype, annotation), off
+        if vtype == VALUE_NULL:
+            return (vtype, None), off
+        if vtype == VALUE_BOOLEAN:
+            return (vtype, bool(arg)), off
+        raise DexFormatError(f"bad encoded_value type 0x{vtype:02x} at 0x{off - 1:x}")
+
+    def _encoded_array(self, off: int) -> tuple[list, int]:
+        size, n = decode_uleb128(self.data, off)
+        off += n
+        values = []
+        for _ in range(size):
+            value, off = self._encoded_value(off)
+            values.append(value)
+        return values, off
+
+    def _encoded_annotation(self, off: int) -> tuple[EncodedAnnotation, int]:
+        type_idx, n = decode_uleb128(self.data, off)
+        off += n
+        size, n = decode_uleb128(self.data, off)
+        off += n
+        elements = []
+        for _ in range(size):
+            name_idx, n = decode_uleb128(self.data, off)
+            value, off = self._encoded_value(off + n)
+            elements.append((name_idx, value))
+        return EncodedAnnotation(type_idx, elements), off
+
+    # annotations
+
+    def _annotation_set(self, off: int) -> list | None:
+        if not off:
+            return None
+        cached = self._annotation_sets.get(off)
+        if cached is None:
+            size, = struct.unpack_from("<I", self.data, off)
+            cached = []
+            for item_off in struct.unpack_from(f"<{size}I", self.data, off + 4):
+                visibility = self.data[item_off]
+                annotation, _ = self._encoded_annotation(item_off + 1)
+                cached.append((visibility, annotation))
+            self._annotation_sets[off] = cached
+        return cached
+
+    def _annotations_directory(self, off: int) -> AnnotationsDirectory:
+        data = self.data
+        class_off, n_fields, n_methods, n_params = struct.unpack_from("<4I", data, off)
+        off += 16
+        fields = []
+        for _ in range(n_fields):
+            idx, set_off = struct.unpack_from("<II", data, off)
+            fields.append((idx, self._annotation_set(set_off)))
+            off += 8
+        methods = []
+        for _ in range(n_methods):
+            idx, set_off = struct.unpack_from("<II", data, off)
+            methods.append((idx, self._annotation_set(set_off)))
+            off += 8
+        parameters = []
+        for _ in range(n_params):
+            idx, ref_off = struct.unpack_from("<II", data, off)
+            size, = struct.unpack_from("<I", data, ref_off)
+            sets = [self._annotation_set(o)
+                    for o in struct.unpack_from(f"<{size}I", data, ref_off + 4)]
+            parameters.append((idx, sets))
+            off += 8
+        return AnnotationsDirectory(self._annotation_set(class_off), fields, methods, parameters)
+
+    # class data / code
+
+    def _class_data(self, off: int) -> ClassData:
+        data = self.data
+        counts = []
+        for _ in range(4):
+            value, n = decode_uleb128(data, off)
+            counts.append(value)
+            off += n
+
+        def read_fields(count: int) -> list[tuple[int, int]]:
+            nonlocal off
+            result, idx = [], 0
+            for _ in range(count):
+                diff, n = decode_uleb128(data, off)
+                access, n2 = decode_uleb128(data, off + n)
+                off += n + n2
+                idx += diff
+                result.append((idx, access))
+            return result
+
+        def read_methods(count: int) -> list[EncodedMethod]:
+            nonlocal off
+            result, idx = [], 0
+            for _ in range(count):
+                diff, n = decode_uleb128(data, off)
+                off += n
+                access, n = decode_uleb128(data, off)
+                off += n
+                code_off, n = decode_uleb128(data, off)
+                off += n
+                idx += diff
+                result.append(EncodedMethod(idx, access,
+                                            self._code_item(code_off) if code_off else None))
+            return result
+
+        static_fields = read_fields(counts[0])
+        instance_fields = read_fields(counts[1])
+        direct_methods = read_methods(counts[2])
+        virtual_methods = read_methods(counts[3])
+        return ClassData(static_fields, instance_fields, direct_methods, virtual_methods)
+
+    def _code_item(self, off: int) -> CodeItem:
+        data = self.data
+        registers, ins, outs, tries_size, debug_off, insns_size = \
+            struct.unpack_from("<4HII", data, off)
+        insns_off = off + 16
+        insns = bytes(data[insns_off:insns_off + 2 * insns_size])
+        off = insns_off + 2 * insns_size
+        tries: list[tuple[int, int, int]] = []
+        handlers: list[tuple[list[tuple[int, int]], int | None]] = []
+        if tries_size:
+            if insns_size & 1:
+                off += 2
+            raw_tries = [struct.unpack_from("<IHH", data, off + 8 * i) for i in range(tries_size)]
+            list_off = off + 8 * tries_size
+            count, n = decode_uleb128(data, list_off)
+            pos = list_off + n
+            handler_index: dict[int, int] = {}
+            for _ in range(count):
+                handler_index[pos - list_off] = len(handlers)
+                size, n = _decode_sleb128(data, pos)
+                pos += n
+                catches = []
+                for _ in range(abs(size)):
+                    type_idx, n = decode_uleb128(data, pos)
+                    pos += n
+                    addr, n = decode_uleb128(data, pos)
+                    pos += n
+                    catches.append((type_idx, addr))
+                catch_all = None
+                if size <= 0:
+                    catch_all, n = decode_uleb128(data, pos)
+                    pos += n
+                handlers.append((catches, catch_all))
+            tries = [(start, count, handler_index[handler_off])
+                     for start, count, handler_off in raw_tries]
+        debug_info = self._debug_info(debug_off) if debug_off else None
+        return CodeItem(registers, ins, outs, insns, tries, handlers, debug_info)
+
+    def _debug_info(self, off: int) -> DebugInfo:
+        data = self.data
+        line_start, n = decode_uleb128(data, off)
+        off += n
+        params_size, n = decode_uleb128(data, off)
+        off += n
+        parameter_names = []
+        for _ in range(params_size):
+            value, n = decode_uleb128(data, off)
+            off += n
+            parameter_names.append(value - 1 if value else NO_INDEX)
+
+        program: list = []
+        chunk = bytearray()
+
+        def copy_uleb() -> None:
+            nonlocal off
+            _, n = decode_uleb128(data, off)
+            chunk.extend(data[off:off + n])
+            off += n
+
+        def ref(kind: str) -> None:
+            nonlocal off, chunk
+            value, n = decode_uleb128(data, off)
+            off += n
+            if chunk:
+                program.append(bytes(chunk))
+                chunk = bytearray()
+            program.append((kind, value - 1 if value else NO_INDEX))
+
+        while True:
+            opcode = data[off]
+            chunk.append(opcode)
+            off += 1
+            if opcode == DBG_END_SEQUENCE:
+                break
+            if opcode in (DBG_ADVANCE_PC, DBG_ADVANCE_LINE, DBG_END_LOCAL, DBG_RESTART_LOCAL):
+                copy_uleb()
+            elif opcode in (DBG_START_LOCAL, DBG_START_LOCAL_EXTENDED):
+                copy_uleb()  # register
+                ref(dalvik.STRING)
+                ref(dalvik.TYPE)
+                if opcode == DBG_START_LOCAL_EXTENDED:
+                    ref(dalvik.STRING)
+            elif opcode == DBG_SET_FILE:
+                ref(dalvik.STRING)
+        program.append(bytes(chunk))
+        return DebugInfo(line_start, parameter_names, program)
+
+
+def read_dex(data: bytes) -> DexModel:
+    """Parse a complete DEX file into a DexModel."""
+    return _Reader(data).read()
+
+
+# ─── Index remapping ───
+#
+# Every structure is rebuilt through a callback f(kind, old_index) → new
+# index. The same traversal is used to remap (lookup tables) and to collect
+# references (a callback that records and returns its argument).
+
+def _remap_value(value: tuple, f) -> tuple:
+    vtype, payload = value
+    kind = _INDEX_VALUES.get(vtype)
+    if kind is not None:
+        return vtype, f(kind, payload)
+    if vtype == VALUE_ARRAY:
+        return vtype, [_remap_value(v, f) for v in payload]
+    if vtype == VALUE_ANNOTATION:
+        return vtype, _remap_encoded_annotation(payload, f)
+    return value
+
+
+def _remap_encoded_annotation(annotation: EncodedAnnotation, f) -> EncodedAnnotation:
+    elements = [(f(dalvik.STRING, name), _remap_value(value, f))
+                for name, value in annotation.elements]
+    elements.sort(key=lambda e: e[0])
+    return EncodedAnnotation(f(dalvik.TYPE, annotation.type_idx), elements)
+
+
+def _remap_annotation_set(annotations: list | None, f) -> list | None:
+    if annotations is None:
+        return None
+    result = [(visibility, _remap_encoded_annotation(a, f)) for visibility, a in annotations]
+    result.sort(key=lambda a: a[1].type_idx)
+    return result
+
+
+def _remap_debug_info(debug: DebugInfo, f) -> DebugInfo:
+    def idx(kind: str, value: int) -> int:
+        return NO_INDEX if value == NO_INDEX else f(kind, value)
+
+    program = [part if isinstance(part, bytes) else (part[0], idx(*part))
+               for part in debug.program]
+    return DebugInfo(debug.line_start,
+                     [idx(dalvik.STRING, n) for n in debug.parameter_names], program)
+
+
+def _remap_code(code: CodeItem, f) -> CodeItem:
+    insns = bytearray(code.insns)
+    dalvik.remap_indices(insns, f)
+    handlers = [([(f(dalvik.TYPE, t), addr) for t, addr in catches], catch_all)
+                for catches, catch_all in code.handlers]
+    debug = _remap_debug_info(code.debug_info, f) if code.debug_info else None
+    return CodeItem(code.registers_size, code.ins_size, code.outs_size, bytes(insns),
+                    list(code.tries), handlers, debug)
+
+
+def _remap_methods(methods: list[EncodedMethod], f) -> list[EncodedMethod]:
+    result = [EncodedMethod(f(dalvik.METHOD, m.method_idx), m.access_flags,
+                            _remap_code(m.code, f) if m.code else None)
+              for m in methods]
+    result.sort(key=lambda m: m.method_idx)
+    return result
+
+
+def remap_class(class_def: ClassDef, f) -> ClassDef:
+    """Return a copy of class_def with every pool index passed through f."""
+    def idx(kind: str, value: int) -> int:
+        return NO_INDEX if value == NO_INDEX else f(kind, value)
+
+    annotations = None
+    if class_def.annotations is not None:
+        d = class_def.annotations
+        annotations = AnnotationsDirectory(
+            _remap_annotation_set(d.class_annotations, f),
+            sorted(((f(dalvik.FIELD, i), _remap_annotation_set(s, f)) for i, s in d.fields),
+                   key=lambda e: e[0]),
+            sorted(((f(dalvik.METHOD, i), _remap_annotation_set(s, f)) for i, s in d.methods),
+                   key=lambda e: e[0]),
+            sorted(((f(dalvik.METHOD, i), [_remap_annotation_set(s, f) for s in sets])
+                    for i, sets in d.parameters), key=lambda e: e[0]),
+        )
+
+    class_data = None
+    if class_def.class_data is not None:
+        cd = class_def.class_data
+        class_data = ClassData(
+            sorted((f(dalvik.FIELD, i), a) for i, a in cd.static_fields),
+            sorted((f(dalvik.FIELD, i), a) for i, a in cd.instance_fields),
+            _remap_methods(cd.direct_methods, f),
+            _remap_methods(cd.virtual_methods, f),
+        )
+
+    static_values = None
+    if class_def.static_values is not None:
+        static_values = [_remap_value(v, f) for v in class_def.static_values]
+
+    return ClassDef(
+        f(dalvik.TYPE, class_def.class_idx), class_def.access_flags,
+        idx(dalvik.TYPE, class_def.superclass_idx),
+        tuple(f(dalvik.TYPE, t) for t in class_def.interfaces),
+        idx(dalvik.STRING, class_def.source_file_idx),
+        annotations, class_data, static_values,
+    )
+
+
+def collect_references(model: DexModel, classes: list[ClassDef] | None = None,
+                       roots: dict[str, set[int]] | None = None) -> dict[str, set[int]]:
+    """Pool indices transitively referenced by classes (default: all) and
+    by the pool entries in roots.
+
+    Returns {kind: set(indices)} for every pool kind.
+    """
+    used: dict[str, set[int]] = {kind: set(roots.get(kind, ())) if roots else set()
+                                 for kind in POOLS}
+
+    def mark(kind: str, value: int) -> int:
+        used[kind].add(value)
+        return value
+
+    for class_def in model.classes if classes is None else classes:
+        remap_class(class_def, mark)
+
+    # Call sites and method handles reference further pools
+    pending_sites = set(used[dalvik.CALL_SITE])
+    for site in pending_sites:
+        for value in model.call_sites[site]:
+            _remap_value(value, mark)
+    for handle in set(used[dalvik.METHOD_HANDLE]):
+        h = model.method_handles[handle]
+        mark(h.target_kind, h.target_idx)
+
+    for idx in used[dalvik.METHOD]:
+        m = model.methods[idx]
+        used[dalvik.TYPE].add(m.class_idx)
+        used[dalvik.PROTO].add(m.proto_idx)
+        used[dalvik.STRING].add(m.name_idx)
+    for idx in used[dalvik.FIELD]:
+        fid = model.fields[idx]
+        used[dalvik.TYPE].update((fid.class_idx, fid.type_idx))
+        used[dalvik.STRING].add(fid.name_idx)
+    for idx in used[dalvik.PROTO]:
+        p = model.protos[idx]
+        used[dalvik.STRING].add(p.shorty_idx)
+        used[dalvik.TYPE].add(p.return_type_idx)
+        used[dalvik.TYPE].update(p.params)
+    for idx in used[dalvik.TYPE]:
+        used[dalvik.STRING].add(model.types[idx])
+    return used
+
+
+def shorty_for(return_type: str, params: list[str]) -> str:
+    """ShortyDescriptor for a prototype (references collapse to 'L')."""
+    def short(desc: str) -> str:
+        return "L" if desc[0] in "L[" else desc[0]
+    return short(return_type) + "".join(short(p) for p in params)
+
+
+def canonicalize(model: DexModel, prune: bool = False,
+                 keep_ids: dict[str, set[int]] | None = None) -> DexModel:
+    """Return a new model with sorted, de-duplicated pools.
+
+    All references are remapped to the new pool order. With prune=True,
+    pool entries not reachable from any class definition or from keep_ids
+    are dropped.
+    """
+    used = collect_references(model, roots=keep_ids) if prune else None
+
+    def keep(kind: str, count: int):
+        return range(count) if used is None else sorted(used[kind])
+
+    out = DexModel(model.version)
+
+    # strings: UTF-16 code unit order, unique
+    string_keys = {}
+    for i in keep(dalvik.STRING, len(model.strings)):
+        string_keys.setdefault(model.strings[i], []).append(i)
+    ordered = sorted(string_keys, key=utf16_sort_key)
+    string_map = {}
+    for new, text in enumerate(ordered):
+        for old in string_keys[text]:
+            string_map[old] = new
+    out.strings = ordered
+
+    # types: by descriptor string index
+    type_keys: dict[int, list[int]] = {}
+    for i in keep(dalvik.TYPE, len(model.types)):
+        type_keys.setdefault(string_map[model.types[i]], []).append(i)
+    out.types = sorted(type_keys)
+    type_map = {}
+    for new, desc in enumerate(out.types):
+        for old in type_keys[desc]:
+            type_map[old] = new
+
+    # protos: by (return type, parameter list)
+    proto_keys: dict[tuple, list[int]] = {}
+    for i in keep(dalvik.PROTO, len(model.protos)):
+        p = model.protos[i]
+        key = (type_map[p.return_type_idx], tuple(type_map[t] for t in p.params))
+        proto_keys.setdefault(key, []).append(i)
+    proto_map = {}
+    for new, key in enumerate(sorted(proto_keys)):
+        old_proto = model.protos[proto_keys[key][0]]
+        out.protos.append(Proto(string_map[old_proto.shorty_idx], key[0], key[1]))
+        for old in proto_keys[key]:
+            proto_map[old] = new
+
+    # fields: by (class, name, type)
+    field_keys: dict[tuple, list[int]] = {}
+    for i in keep(dalvik.FIELD, len(model.fields)):
+        fid = model.fields[i]
+        key = (type_map[fid.class_idx], string_map[fid.name_idx], type_map[fid.type_idx])
+        field_keys.setdefault(key, []).append(i)
+    field_map = {}
+    for new, key in enumerate(sorted(field_keys)):
+        out.fields.append(FieldId(key[0], key[2], key[1]))
+        for old in field_keys[key]:
+            field_map[old] = new
+
+    # methods: by (class, name, proto)
+    method_keys: dict[tuple, list[int]] = {}
+    for i in keep(dalvik.METHOD, len(model.methods)):
+        mid = model.methods[i]
+        key = (type_map[mid.class_idx], string_map[mid.name_idx], proto_map[mid.proto_idx])
+        method_keys.setdefault(key, []).append(i)
+    method_map = {}
+    for new, key in enumerate(sorted(method_keys)):
+        out.methods.append(MethodId(key[0], key[2], key[1]))
+        for old in method_keys[key]:
+            method_map[old] = new
+
+    # method handles and call sites keep their relative order
+    handle_map = {old: new for new, old in
+                  enumerate(keep(dalvik.METHOD_HANDLE, len(model.method_handles)))}
+    site_map = {old: new for new, old in
+                enumerate(keep(dalvik.CALL_SITE, len(model.call_sites)))}
+
+    maps = {
+        dalvik.STRING: string_map, dalvik.TYPE: type_map, dalvik.PROTO: proto_map,
+        dalvik.FIELD: field_map, dalvik.METHOD: method_map,
+        dalvik.METHOD_HANDLE: handle_map, dalvik.CALL_SITE: site_map,
+    }
+
+    def f(kind: str, old: int) -> int:
+        return maps[kind][old]
+
+    for old in handle_map:
+        h = model.method_handles[old]
+        out.method_handles.append(MethodHandle(h.handle_type, f(h.target_kind, h.target_idx)))
+    for old in site_map:
+        out.call_sites.append([_remap_value(v, f) for v in model.call_sites[old]])
+
+    out.classes = order_classes([remap_class(c, f) for c in model.classes])
+    return out
+
+
+def order_classes(classes: list[ClassDef]) -> list[ClassDef]:
+    """Order class_defs so superclasses and interfaces precede subclasses.
+
+    The relative order of otherwise unconstrained classes is preserved.
+    """
+    by_type = {c.class_idx: c for c in classes}
+    placed: set[int] = set()
+    ordered: list[ClassDef] = []
+
+    def place(class_def: ClassDef) -> None:
+        stack = [(class_def, False)]
+        while stack:
+            current, expanded = stack.pop()
+            if current.class_idx in placed:
+                continue
+            if expanded:
+                placed.add(current.class_idx)
+                ordered.append(current)
+                continue
+            stack.append((current, True))
+            for parent in reversed((current.superclass_idx,) + tuple(current.interfaces)):
+                dep = by_type.get(parent)
+                if dep is not None and dep.class_idx not in placed:
+                    stack.append((dep, False))
+
+    for class_def in classes:
+        place(class_def)
+    return ordered
+
+
+def _literal_value(value: tuple, f) -> tuple:
+    """Remap the VALUE_STRING payloads of an encoded value with f(idx);
+    annotation element names are left alone."""
+    vtype, payload = value
+    if vtype == VALUE_STRING:
+        return vtype, f(payload)
+    if vtype == VALUE_ARRAY:
+        return vtype, [_literal_value(v, f) for v in payload]
+    if vtype == VALUE_ANNOTATION:
+        return vtype, _literal_annotation(payload, f)
+    return value
+
+
+def _literal_annotation(annotation: EncodedAnnotation, f) -> EncodedAnnotation:
+    return EncodedAnnotation(annotation.type_idx,
+                             [(name, _literal_value(value, f)) for name, value in annotation.elements])
+
+
+def _class_annotation_sets(class_def: ClassDef) -> list:
+    d = class_def.annotations
+    if d is None:
+        return []
+    sets = [d.class_annotations] + [s for _i, s in d.fields] + [s for _i, s in d.methods]
+    sets += [s for _i, param_sets in d.parameters for s in param_sets]
+    return [s for s in sets if s is not None]
+
+
+def _name_references(model: DexModel) -> set[int]:
+    """String indices used as something other than a literal: identifiers,
+    source files, annotation element names and debug info names."""
+    names = set(model.types)
+    names.update(p.shorty_idx for p in model.protos)
+    names.update(f.name_idx for f in model.fields)
+    names.update(m.name_idx for m in model.methods)
+    names.update(c.source_file_idx for c in model.classes)
+
+    def element_names(annotation: EncodedAnnotation) -> None:
+        for name, value in annotation.elements:
+            names.add(name)
+            walk(value)
+
+    def walk(value: tuple) -> None:
+        vtype, payload = value
+        if vtype == VALUE_ARRAY:
+            for v in payload:
+                walk(v)
+        elif vtype == VALUE_ANNOTATION:
+            element_names(payload)
+
+    def debug_name(kind: str, idx: int) -> int:
+        if kind == dalvik.STRING:
+            names.add(idx)
+        return idx
+
+    for class_def in model.classes:
+        for value in class_def.static_values or ():
+            walk(value)
+        for annotations in _class_annotation_sets(class_def):
+            for _visibility, annotation in annotations:
+                element_names(annotation)
+        if class_def.class_data is not None:
+            for method in class_def.class_data.methods():
+                if method.code is not None and method.code.debug_info is not None:
+                    _remap_debug_info(method.code.debug_info, debug_name)
+    for site in model.call_sites:
+        for value in site:
+            walk(value)
+    return names
+
+
+def rewrite_strings(model: DexModel, replacements: dict[str, str]) -> dict[str, int]:
+    """Replace string literals whose full text is a key of replacements.
+
+    Only literals change: const-string / const-string/jumbo operands and
+    VALUE_STRING encoded values. Strings used only as literals are changed
+    in the pool itself; strings that are also referenced another way (type
+    descriptors, member names, shorties, source files, annotation element
+    names, debug info names) keep their entry and get the replacement
+    appended, with only the literal references redirected to it. Pool
+    order is restored by write_dex(). Returns per-string hit counts.
+    """
+    hits = dict.fromkeys(replacements, 0)
+    targets = {i: s for i, s in enumerate(model.strings) if s in replacements}
+    if not targets:
+        return hits
+
+    names = _name_references(model)
+    redirect: dict[int, int] = {}
+    for idx, text in targets.items():
+        hits[text] += 1
+        if idx in names:
+            redirect[idx] = len(model.strings)
+            model.strings.append(replacements[text])
+        else:
+            model.strings[idx] = replacements[text]
+    if not redirect:
+        return hits
+
+    def literal(idx: int) -> int:
+        return redirect.get(idx, idx)
+
+    def instruction(kind: str, idx: int) -> int:
+        return literal(idx) if kind == dalvik.STRING else idx
+
+    for class_def in model.classes:
+        if class_def.static_values is not None:
+            class_def.static_values = [_literal_value(v, literal) for v in class_def.static_values]
+        if class_def.class_data is not None:
+            for method in class_def.class_data.methods():
+                if method.code is not None:
+                    insns = bytearray(method.code.insns)
+                    dalvik.remap_indices(insns, instruction)
+                    method.code.insns = bytes(insns)
+        d = class_def.annotations
+        if d is not None:
+            def sets(annotations):
+                if annotations is None:
+                    return None
+                return [(visibility, _literal_annotation(a, literal)) for visibility, a in annotations]
+            d.class_annotations = sets(d.class_annotations)
+            d.fields = [(i, sets(s)) for i, s in d.fields]
+            d.methods = [(i, sets(s)) for i, s in d.methods]
+            d.parameters = [(i, [sets(s) for s in param_sets]) for i, param_sets in d.parameters]
+    model.call_sites = [[_literal_value(v, literal) for v in site] for site in model.call_sites]
+    return hits
+
+
+# ─── Merging ───
+
+class ClassImporter:
+    """Builds a new model from class_defs of other models.
+
+    Pool entries are interned by content (descriptor, member signature),
+    so classes from different DEX files share the ids they have in common
+    and the pool sizes are those the written DEX will have. Call sites are
+    copied per source model.
+    """
+
+    def __init__(self, version: str = "035"):
+        self.model = DexModel(version)
+        self._strings: dict[str, int] = {}
+        self._types: dict[str, int] = {}
+        self._protos: dict[tuple, int] = {}
+        self._fields: dict[tuple, int] = {}
+        self._methods: dict[tuple, int] = {}
+        self._handles: dict[tuple, int] = {}
+        self._sites: dict[tuple, int] = {}
+
+    def _intern(self, table: dict, key, pool: list, make) -> int:
+        idx = table.get(key)
+        if idx is None:
+            idx = table[key] = len(pool)
+            pool.append(None)           # reserve the slot before make() recurses
+            pool[idx] = make()
+        return idx
+
+    def string(self, text: str) -> int:
+        return self._intern(self._strings, text, self.model.strings, lambda: text)
+
+    def type(self, descriptor: str) -> int:
+        return self._intern(self._types, descriptor, self.model.types,
+                            lambda: self.string(descriptor))
+
+    def add_class(self, source: DexModel, class_def: ClassDef, source_id: int = 0) -> None:
+        """Copy class_def (and everything it references) from source.
+
+        source_id tells the call sites of different source models apart.
+        """
+        def f(kind: str, idx: int) -> int:
+            if kind == dalvik.STRING:
+                return self.string(source.strings[idx])
+            if kind == dalvik.TYPE:
+                return self.type(source.type_name(idx))
+            if kind == dalvik.PROTO:
+                p = source.protos[idx]
+                key = (source.type_name(p.return_type_idx),
+                       tuple(source.type_name(t) for t in p.params))
+                return self._intern(self._protos, key, self.model.protos, lambda: Proto(
+                    self.string(source.strings[p.shorty_idx]),
+                    self.type(key[0]), tuple(self.type(t) for t in key[1])))
+            if kind == dalvik.FIELD:
+                fid = source.fields[idx]
+                key = (source.type_name(fid.class_idx), source.strings[fid.name_idx],
+                       source.type_name(fid.type_idx))
+                return self._intern(self._fields, key, self.model.fields, lambda: FieldId(
+                    self.type(key[0]), self.type(key[2]), self.string(key[1])))
+            if kind == dalvik.METHOD:
+                mid = source.methods[idx]
+                proto = f(dalvik.PROTO, mid.proto_idx)
+                key = (source.type_name(mid.class_idx), source.strings[mid.name_idx], proto)
+                return self._intern(self._methods, key, self.model.methods, lambda: MethodId(
+                    self.type(key[0]), proto, self.string(key[1])))
+            if kind == dalvik.METHOD_HANDLE:
+                h = source.method_handles[idx]
+                key = (h.handle_type, h.target_kind, f(h.target_kind, h.target_idx))
+                return self._intern(self._handles, key, self.model.method_handles,
+                                    lambda: MethodHandle(h.handle_type, key[2]))
+            if kind == dalvik.CALL_SITE:
+                return self._intern(self._sites, (source_id, idx), self.model.call_sites,
+                                    lambda: [_remap_value(v, f) for v in source.call_sites[idx]])
+            raise DexFormatError(f"unknown pool kind {kind!r}")
+
+        self.model.classes.append(remap_class(class_def, f))
+
+
+# ─── Writer ───
+
+def _encode_sleb128(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if (value == 0 and not byte & 0x40) or (value == -1 and byte & 0x40):
+            out.append(byte)
+            return bytes(out)
+        out.append(byte | 0x80)
+
+
+def _encode_value(value: tuple, out: bytearray) -> None:
+    vtype, payload = value
+    if vtype in _RAW_VALUES:
+        arg, raw = payload
+        out.append((arg << 5) | vtype)
+        out += raw
+    elif vtype in _INDEX_VALUES:
+        size = max(1, (payload.bit_length() + 7) // 8)
+        out.append(((size - 1) << 5) | vtype)
+        out += payload.to_bytes(size, "little")
+    elif vtype == VALUE_ARRAY:
+        out.append(vtype)
+        _encode_array(payload, out)
+    elif vtype == VALUE_ANNOTATION:
+        out.append(vtype)
+        _encode_annotation(payload, out)
+    elif vtype == VALUE_NULL:
+        out.append(vtype)
+    elif vtype == VALUE_BOOLEAN:
+        out.append((int(payload) << 5) | vtype)
+    else:
+        raise DexFormatError(f"cannot encode value type 0x{vtype:02x}")
+
+
+def _encode_array(values: list, out: bytearray) -> None:
+    out += encode_uleb128(len(values))
+    for value in values:
+        _encode_value(value, out)
+
+
+def _encode_annotation(annotation: EncodedAnnotation, out: bytearray) -> None:
+    out += encode_uleb128(annotation.type_idx)
+    out += encode_uleb128(len(annotation.elements))
+    for name_idx, value in annotation.elements:
+        out += encode_uleb128(name_idx)
+        _encode_value(value, out)
+
+
+def _uleb128p1(value: int) -> bytes:
+    return encode_uleb128(0 if value == NO_INDEX else value + 1)
+
+
+class _Writer:
+    """Lay out a canonical model. Data section order follows dx/d8."""
+
+    def __init__(self, model: DexModel):
+        self.m = model
+        self.out = bytearray()
+        self.map: list[tuple[int, int, int]] = []   # (type, count, offset)
+        self.type_lists: dict[tuple[int, ...], int] = {}
+        self.annotation_items: dict[bytes, int] = {}
+        self.annotation_sets: dict[tuple[int, ...], int] = {}
+        self.ref_lists: dict[tuple[int, ...], int] = {}
+        self.encoded_arrays: dict[bytes, int] = {}
+
+    def align(self, alignment: int = 4) -> None:
+        self.out += b"\x00" * (-len(self.out) % alignment)
+
+    def section(self, item_type: int, count: int, start: int) -> None:
+        if count:
+            self.map.append((item_type, count, start))
+
+    def write(self) -> bytearray:
+        m, out = self.m, self.out
+        counts = (len(m.strings), len(m.types), len(m.protos), len(m.fields),
+                  len(m.methods), len(m.classes), len(m.call_sites), len(m.method_handles))
+        sizes = (4, 4, 12, 8, 8, 32, 4, 8)
+        ids_off = []
+        pos = HEADER_SIZE
+        for count, size in zip(counts, sizes):
+            ids_off.append(pos if count else 0)
+            pos += count * size
+        out += b"\x00" * pos
+        self.align()
+        data_off = len(out)
+
+        code_offs = self._write_code_items()
+        type_list_count = self._write_type_lists()
+        string_offs = self._write_string_data()
+        annotation_count = self._write_annotation_items()
+        class_data_offs = self._write_class_data(code_offs)
+        site_offs, static_offs = self._write_encoded_arrays()
+        set_count = self._write_annotation_sets()
+        dir_offs = self._write_annotation_directories()
+
+        self.align()
+        map_off = len(out)
+        items = [(TYPE_HEADER_ITEM, 1, 0)]
+        for item_type, count, off in zip(
+                (TYPE_STRING_ID_ITEM, TYPE_TYPE_ID_ITEM, TYPE_PROTO_ID_ITEM,
+                 TYPE_FIELD_ID_ITEM, TYPE_METHOD_ID_ITEM, TYPE_CLASS_DEF_ITEM,
+                 TYPE_CALL_SITE_ID_ITEM, TYPE_METHOD_HANDLE_ITEM), counts, ids_off):
+            if count:
+                items.append((item_type, count, off))
+        items += sorted(self.map, key=lambda e: e[2])
+        items.append((TYPE_MAP_LIST, 1, map_off))
+        out += struct.pack("<I", len(items))
+        for item_type, count, off in items:
+            out += struct.pack("<HHII", item_type, 0, count, off)
+
+        # ids sections (all data offsets are known now)
+        for i, off in enumerate(string_offs):
+            struct.pack_into("<I", out, ids_off[0] + 4 * i, off)
+        if m.types:
+            struct.pack_into(f"<{len(m.types)}I", out, ids_off[1], *m.types)
+        for i, p in enumerate(m.protos):
+            struct.pack_into("<3I", out, ids_off[2] + 12 * i, p.shorty_idx, p.return_type_idx,
+                             self.type_lists.get(p.params, 0))
+        for i, fid in enumerate(m.fields):
+            struct.pack_into("<HHI", out, ids_off[3] + 8 * i, fid.class_idx, fid.type_idx, fid.name_idx)
+        for i, mid in enumerate(m.methods):
+            struct.pack_into("<HHI", out, ids_off[4] + 8 * i, mid.class_idx, mid.proto_idx, mid.name_idx)
+        for i, c in enumerate(m.classes):
+            struct.pack_into("<8I", out, ids_off[5] + 32 * i, c.class_idx, c.access_flags,
+                             c.superclass_idx, self.type_lists.get(c.interfaces, 0),
+                             c.source_file_idx, dir_offs[i], class_data_offs[i], static_offs[i])
+        for i, off in enumerate(site_offs):
+            struct.pack_into("<I", out, ids_off[6] + 4 * i, off)
+        for i, h in enumerate(m.method_handles):
+            struct.pack_into("<HHHH", out, ids_off[7] + 8 * i, h.handle_type, 0, h.target_idx, 0)
+
+        # header
+        version = m.version.encode("ascii")
+        out[0:8] = b"dex\n" + version + b"\x00"
+        fields = [len(out), HEADER_SIZE, ENDIAN_CONSTANT, 0, 0, map_off]
+        for count, off in zip(counts[:6], ids_off[:6]):
+            fields += [count, off]
+        fields += [len(out) - data_off, data_off]
+        struct.pack_into("<20I", out, 32, *fields)
+        update_checksums(out)
+        return out
+
+    # data sections
+
+    def _write_code_items(self) -> dict[int, int]:
+        out = self.out
+        offs: dict[int, int] = {}
+        debug_fixups: list[tuple[int, DebugInfo]] = []
+        start, count = None, 0
+        for c in self.m.classes:
+            if c.class_data is None:
+                continue
+            for method in c.class_data.methods():
+                code = method.code
+                if code is None:
+                    continue
+                self.align()
+                if start is None:
+                    start = len(out)
+                offs[id(code)] = len(out)
+                count += 1
+                insns_size = len(code.insns) // 2
+                header_pos = len(out)
+                out += struct.pack("<4HII", code.registers_size, code.ins_size, code.outs_size,
+                                   len(code.tries), 0, insns_size)
+                out += code.insns
+                if code.debug_info is not None:
+                    debug_fixups.append((header_pos + 8, code.debug_info))
+                if code.tries:
+                    if insns_size & 1:
+                        out += b"\x00\x00"
+                    handler_list = bytearray(encode_uleb128(len(code.handlers)))
+                    handler_offs = []
+                    for catches, catch_all in code.handlers:
+                        handler_offs.append(len(handler_list))
+                        size = len(catches) if catch_all is None else -len(catches)
+                        handler_list += _encode_sleb128(size)
+                        for type_idx, addr in catches:
+                            handler_list += encode_uleb128(type_idx) + encode_uleb128(addr)
+                        if catch_all is not None:
+                            handler_list += encode_uleb128(catch_all)
+                    for start_addr, insn_count, handler in code.tries:
+                        out += struct.pack("<IHH", start_addr, insn_count, handler_offs[handler])
+                    out += handler_list
+        self.section(TYPE_CODE_ITEM, count, start or 0)
+
+        if debug_fixups:
+            debug_start = len(out)
+            for pos, debug in debug_fixups:
+                struct.pack_into("<I", out, pos, len(out))
+                out += encode_uleb128(debug.line_start)
+                out += encode_uleb128(len(debug.parameter_names))
+                for name in debug.parameter_names:
+                    out += _uleb128p1(name)
+                for part in debug.program:
+                    out += part if isinstance(part, bytes) else _uleb128p1(part[1])
+            self.section(TYPE_DEBUG_INFO_ITEM, len(debug_fixups), debug_start)
+        return offs
+
+    def _write_type_lists(self) -> int:
+        lists = [p.params for p in self.m.protos] + [c.interfaces for c in self.m.classes]
+        start = None
+        for type_list in lists:
+            if not type_list or type_list in self.type_lists:
+                continue
+            self.align()
+            if start is None:
+                start = len(self.out)
+            self.type_lists[type_list] = len(self.out)
+            self.out += struct.pack(f"<I{len(type_list)}H", len(type_list), *type_list)
+        self.section(TYPE_TYPE_LIST, len(self.type_lists), start or 0)
+        return len(self.type_lists)
+
+    def _write_string_data(self) -> list[int]:
+        out = self.out
+        start = len(out)
+        offs = []
+        for text in self.m.strings:
+            offs.append(len(out))
+            out += encode_uleb128(utf16_length(text))
+            out += encode_mutf8(text)
+            out.append(0)
+        self.section(TYPE_STRING_DATA_ITEM, len(offs), start)
+        return offs
+
+    def _iter_annotation_sets(self):
+        for c in self.m.classes:
+            d = c.annotations
+            if d is None:
+                continue
+            if d.class_annotations is not None:
+                yield d.class_annotations
+            for _, s in d.fields:
+                yield s
+            for _, s in d.methods:
+                yield s
+            for _, sets in d.parameters:
+                for s in sets:
+                    if s is not None:
+                        yield s
+
+    def _write_annotation_items(self) -> int:
+        start = len(self.out)
+        for annotation_set in self._iter_annotation_sets():
+            for visibility, annotation in annotation_set:
+                item = bytearray((visibility,))
+                _encode_annotation(annotation, item)
+                item = bytes(item)
+                if item not in self.annotation_items:
+                    self.annotation_items[item] = len(self.out)
+                    self.out += item
+        self.section(TYPE_ANNOTATION_ITEM, len(self.annotation_items), start)
+        return len(self.annotation_items)
+
+    def _annotation_key(self, annotation_set: list) -> tuple[int, ...]:
+        key = []
+        for visibility, annotation in annotation_set:
+            item = bytearray((visibility,))
+            _encode_annotation(annotation, item)
+            key.append(self.annotation_items[bytes(item)])
+        return tuple(key)
+
+    def _write_class_data(self, code_offs: dict[int, int]) -> list[int]:
+        out = self.out
+        offs = []
+        start, count = len(out), 0
+        for c in self.m.classes:
+            cd = c.class_data
+            if cd is None:
+                offs.append(0)
+                continue
+            offs.append(len(out))
+            count += 1
+            for n in (len(cd.static_fields), len(cd.instance_fields),
+                      len(cd.direct_methods), len(cd.virtual_methods)):
+                out += encode_uleb128(n)
+            for fields in (cd.static_fields, cd.instance_fields):
+                prev = 0
+                for idx, access in fields:
+                    out += encode_uleb128(idx - prev) + encode_uleb128(access)
+                    prev = idx
+            for methods in (cd.direct_methods, cd.virtual_methods):
+                prev = 0
+                for method in methods:
+                    code_off = code_offs[id(method.code)] if method.code is not None else 0
+                    out += (encode_uleb128(method.method_idx - prev)
+                            + encode_uleb128(method.access_flags)
+                            + encode_uleb128(code_off))
+                    prev = method.method_idx
+        self.section(TYPE_CLASS_DATA_ITEM, count, start)
+        return offs
+
+    def _write_encoded_arrays(self) -> tuple[list[int], list[int]]:
+        out = self.out
+        start, count = len(out), 0
+        site_offs = []
+        # call_site_ids must be sorted by offset: emit them first, in order
+        for site in self.m.call_sites:
+            site_offs.append(len(out))
+            _encode_array(site, out)
+            count += 1
+        static_offs = []
+        for c in self.m.classes:
+            if c.static_values is None:
+                static_offs.append(0)
+                continue
+            item = bytearray()
+            _encode_array(c.static_values, item)
+            item = bytes(item)
+            off = self.encoded_arrays.get(item)
+            if off is None:
+                off = self.encoded_arrays[item] = len(out)
+                out += item
+                count += 1
+            static_offs.append(off)
+        self.section(TYPE_ENCODED_ARRAY_ITEM, count, start)
+        return site_offs, static_offs
+
+    def _write_annotation_sets(self) -> int:
+        start = None
+        for annotation_set in self._iter_annotation_sets():
+            key = self._annotation_key(annotation_set)
+            if key in self.annotation_sets:
+                continue
+            self.align()
+            if start is None:
+                start = len(self.out)
+            self.annotation_sets[key] = len(self.out)
+            self.out += struct.pack(f"<I{len(key)}I", len(key), *key)
+        self.section(TYPE_ANNOTATION_SET_ITEM, len(self.annotation_sets), start or 0)
+
+        start = None
+        for c in self.m.classes:
+            if c.annotations is None:
+                continue
+            for _, sets in c.annotations.parameters:
+                key = tuple(self._set_off(s) for s in sets)
+                if key in self.ref_lists:
+                    continue
+                self.align()
+                if start is None:
+                    start = len(self.out)
+                self.ref_lists[key] = len(self.out)
+                self.out += struct.pack(f"<I{len(key)}I", len(key), *key)
+        self.section(TYPE_ANNOTATION_SET_REF_LIST, len(self.ref_lists), start or 0)
+        return len(self.annotation_sets)
+
+    def _set_off(self, annotation_set: list | None) -> int:
+        if annotation_set is None:
+            return 0
+        return self.annotation_sets[self._annotation_key(annotation_set)]
+
+    def _write_annotation_directories(self) -> list[int]:
+        out = self.out
+        offs = []
+        start, count = None, 0
+        for c in self.m.classes:
+            d = c.annotations
+            if d is None or d.is_empty():
+                offs.append(0)
+                continue
+            self.align()
+            if start is None:
+                start = len(out)
+            offs.append(len(out))
+            count += 1
+            out += struct.pack("<4I", self._set_off(d.class_annotations),
+                               len(d.fields), len(d.methods), len(d.parameters))
+            for idx, s in d.fields:
+                out += struct.pack("<II", idx, self._set_off(s))
+            for idx, s in d.methods:
+                out += struct.pack("<II", idx, self._set_off(s))
+            for idx, sets in d.parameters:
+                key = tuple(self._set_off(s) for s in sets)
+                out += struct.pack("<II", idx, self.ref_lists[key])
+        self.section(TYPE_ANNOTATIONS_DIRECTORY_ITEM, count, start or 0)
+        return offs
+
+
+def write_dex(model: DexModel, prune: bool = False,
+              keep_ids: dict[str, set[int]] | None = None) -> bytearray:
+    """Serialize a model to DEX bytes (pools sorted, references remapped)."""
+    return _Writer(canonicalize(model, prune=prune, keep_ids=keep_ids)).write()
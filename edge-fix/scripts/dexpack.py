@@ -0,0 +1,207 @@
+"""
+dexpack.py - Repack a set of DEX files into as few as the 64K id limits allow.
+
+Stubbing and stripping leave Edge's classes*.dex files in their original
+split, each with dead weight. A repacked set holds the same classes in
+fewer, fuller DEX files, so there are fewer files to open, verify and
+compile at install.
+
+A DEX is full when one more class would push its string_ids,
+proto_ids, method_ids, field_ids or type_ids past 65536 (16-bit indices
+in instructions and in method_id.proto_idx; dexmodel.write_dex does not
+rewrite const-string to const-string/jumbo). Planning works on
+footprints: for each class, stable 64-bit hashes of the strings, protos,
+method, field and type ids it references, keyed by content as ClassImporter interns them. Classes are then packed greedily in load order: first the classes
+under the main-dex prefixes (they have to fit in classes.dex), then all
+others in their original order, so classes that were together stay
+together. A class defined in more than one DEX keeps the definition ART
+would have loaded, the one from the earliest DEX.
+
+Output DEX files are built one at a time with ClassImporter, and a source
+model is only kept in memory while classes of it are still to be copied.
+"""
+
+import hashlib
+
+import dalvik
+from dexmodel import ClassImporter, DexModel, collect_references, read_dex, write_dex
+
+ID_LIMIT = 0x10000
+# id pools of build_dex() counts that ID_LIMIT applies to
+ID_POOLS = ("strings", "protos", "methods", "fields", "types")
+
+
+class PackError(Exception):
+    pass
+
+
+class Footprint:
+    """The ids one class needs in whichever DEX holds it."""
+    __slots__ = ("descriptor", "strings", "protos", "methods", "fields", "types")
+
+    def __init__(self, descriptor: str, strings: frozenset, protos: frozenset,
+                 methods: frozenset, fields: frozenset, types: frozenset):
+        self.descriptor = descriptor
+        self.strings = strings
+        self.protos = protos
+        self.methods = methods
+        self.fields = fields
+        self.types = types
+
+
+def _key_hash(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8", "surrogatepass"),
+                                          digest_size=8).digest(), "little")
+
+
+def class_footprints(model: DexModel) -> list[Footprint]:
+    """Footprint of every class_def of model, in class_defs order."""
+    string_keys = [_key_hash(text) for text in model.strings]
+    type_keys = [string_keys[s] for s in model.types]
+    proto_sigs = [
+        "(" + "".join(model.type_name(t) for t in p.params) + ")" + model.type_name(p.return_type_idx)
+        for p in model.protos]
+    proto_keys = [_key_hash(sig) for sig in proto_sigs]
+    method_keys = [_key_hash(f"{model.type_name(m.class_idx)}->{model.strings[m.name_idx]}"
+                             f"{proto_sigs[m.proto_idx]}") for m in model.methods]
+    field_keys = [_key_hash(f"{model.type_name(fid.class_idx)}->{model.strings[fid.name_idx]}:"
+                            f"{model.type_name(fid.type_idx)}") for fid in model.fields]
+
+    footprints = []
+    for class_def in model.classes:
+        refs = collect_references(model, [class_def])
+        footprints.append(Footprint(
+            model.type_name(class_def.class_idx),
+            frozenset(string_keys[i] for i in refs[dalvik.STRING]),
+            frozenset(proto_keys[i] for i in refs[dalvik.PROTO]),
+            frozenset(method_keys[i] for i in refs[dalvik.METHOD]),
+            frozenset(field_keys[i] for i in refs[dalvik.FIELD]),
+            frozenset(type_keys[i] for i in refs[dalvik.TYPE]),
+        ))
+    return footprints
+
+
+def dex_footprints(data) -> tuple[str, list[Footprint]]:
+    """(DEX version, class footprints) of a DEX image."""
+    model = read_dex(data)
+    return model.version, class_footprints(model)
+
+
+class _Bin:
+    __slots__ = ("classes", "strings", "protos", "methods", "fields", "types")
+
+    def __init__(self):
+        self.classes: list[tuple[int, int]] = []    # (source, class_def position)
+        self.strings: set[int] = set()
+        self.protos: set[int] = set()
+        self.methods: set[int] = set()
+        self.fields: set[int] = set()
+        self.types: set[int] = set()
+
+    def add(self, fp: Footprint, entry: tuple[int, int]) -> bool:
+        """Add a class unless that would overflow an id pool."""
+        new_strings = fp.strings - self.strings
+        new_protos = fp.protos - self.protos
+        new_methods = fp.methods - self.methods
+        new_fields = fp.fields - self.fields
+        new_types = fp.types - self.types
+        if (len(self.strings) + len(new_strings) > ID_LIMIT
+                or len(self.protos) + len(new_protos) > ID_LIMIT
+                or len(self.methods) + len(new_methods) > ID_LIMIT
+                or len(self.fields) + len(new_fields) > ID_LIMIT
+                or len(self.types) + len(new_types) > ID_LIMIT):
+            if self.classes:
+                return False
+            raise PackError(f"{fp.descriptor} alone exceeds the 64K id limits")
+        self.strings |= new_strings
+        self.protos |= new_protos
+        self.methods |= new_methods
+        self.fields |= new_fields
+        self.types |= new_types
+        self.classes.append(entry)
+        return True
+
+
+def plan_packing(footprints: list[list[Footprint]],
+                 main_prefixes: list[str]) -> tuple[list[list[tuple[int, int]]], list[str]]:
+    """Assign classes to output DEX files.
+
+    footprints holds the class footprints of each source DEX, in load
+    order. Returns (per output DEX, the (source, class position) entries
+    it holds; descriptors of shadowed duplicate definitions dropped).
+    """
+    seen: set[str] = set()
+    duplicates: list[str] = []
+    main: list[tuple[int, int]] = []
+    rest: list[tuple[int, int]] = []
+    main_prefixes = tuple(main_prefixes)
+    for source, classes in enumerate(footprints):
+        for position, fp in enumerate(classes):
+            if fp.descriptor in seen:
+                duplicates.append(fp.descriptor)
+                continue
+            seen.add(fp.descriptor)
+            is_main = main_prefixes and fp.descriptor.startswith(main_prefixes)
+            (main if is_main else rest).append((source, position))
+
+    bins = [_Bin()]
+    for entry in main:
+        if not bins[0].add(footprints[entry[0]][entry[1]], entry):
+            raise PackError(f"main-dex classes do not fit in one DEX "
+                            f"({len(bins[0].classes)} of {len(main)} placed)")
+    for entry in rest:
+        fp = footprints[entry[0]][entry[1]]
+        if not bins[-1].add(fp, entry):
+            bins.append(_Bin())
+            bins[-1].add(fp, entry)
+    return [b.classes for b in bins], duplicates
+
+
+def build_dex(entries: list[tuple[int, int]], load_source, version: str) -> tuple[bytearray, dict]:
+    """Write one output DEX from (source, class position) entries.
+
+    load_source(source) returns the DexModel of a source DEX. Returns the
+    DEX bytes and its {"classes", "strings", "protos", "methods", "fields",
+    "types"} counts.
+    """
+    importer = ClassImporter(version)
+    for source, position in entries:
+        model = load_source(source)
+        importer.add_class(model, model.classes[position], source)
+    model = importer.model
+    counts = {"classes": len(model.classes), "strings": len(model.strings),
+              "protos": len(model.protos), "methods": len(model.methods),
+              "fields": len(model.fields), "types": len(model.types)}
+    for pool in ID_POOLS:
+        if counts[pool] > ID_LIMIT:     # only on a footprint hash collision
+            raise PackError(f"{counts[pool]} {pool[:-1]} ids in one DEX")
+    return write_dex(model), counts
+
+
+def write_packed(bins: list[list[tuple[int, int]]], dex_paths: list[str],
+                 class_counts: list[int], version: str):
+    """Yield (DEX bytes, counts) for each bin of plan_packing(), in order.
+
+    class_counts holds the number of class_defs planned per source, to
+    catch a source that changed in between.
+    """
+    remaining = [0] * len(dex_paths)
+    for entries in bins:
+        for source, _position in entries:
+            remaining[source] += 1
+    loaded: dict[int, DexModel] = {}
+
+    def load_source(source: int) -> DexModel:
+        model = loaded.get(source)
+        if model is None:
+            model = loaded[source] = DexModel.load(dex_paths[source])
+            if len(model.classes) != class_counts[source]:
+                raise PackError(f"{dex_paths[source]} changed since it was planned")
+        return model
+
+    for entries in bins:
+        yield build_dex(entries, load_source, version)
+        for source, _position in entries:
+            remaining[source] -= 1
+        for source in [s for s in loaded if not remaining[s]]:
+            del loaded[source]
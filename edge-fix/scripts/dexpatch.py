@@ -0,0 +1,253 @@
+"""
+dexpatch.py - In-place bytecode patches on a DEX file (no baksmali/smali).
+
+The binary counterparts of smalipatch.py's stub_methods() and
+neutralize_loadlibrary(). A method is located through class_defs →
+class_data_item → code_item, and its insns are overwritten with the same
+const/return sequence smalipatch.stub_body() emits, followed by nops:
+
+  V           → return-void
+  Z/B/C/S/I/F → const/4 v0, 0x0; return v0
+  J/D         → const-wide/16 v0, 0x0; return-wide v0
+  L.../[...   → const/4 v0, 0x0; return-object v0
+
+No item changes size, so no offset anywhere in the file moves. registers_size
+is raised if the stub needs more registers than the method had. Try blocks
+are cleared by setting tries_size to 0 and growing insns_size over the old
+try/handler bytes (as nops), keeping the next code_item where ART's verifier
+expects it: at the next 4-byte boundary after this one. debug_info is kept;
+it is only used by debuggers.
+
+PatchError is raised when an edit is not possible in place: the code_item
+is shared with a method that is not being patched (d8 deduplicates identical
+bodies), the body is shorter than the stub, or the try/handler layout cannot
+be cleared without touching bytes outside the item. The caller then discards
+the buffer and falls back to the smali round-trip.
+
+System.loadLibrary calls (invoke-static / invoke-static/range) are replaced
+by nops of the same width.
+"""
+
+import bisect
+import mmap
+import struct
+
+from dalvik import iter_instructions
+from dexfile import DexFile, decode_uleb128
+from dexio import DexEdit
+
+# Opcodes used by the stubs (nop is 0x00: zeroed code units)
+OP_RETURN_VOID = 0x0E
+OP_RETURN = 0x0F
+OP_RETURN_WIDE = 0x10
+OP_RETURN_OBJECT = 0x11
+OP_CONST_4 = 0x12
+OP_CONST_WIDE_16 = 0x16
+OP_INVOKE_STATIC = 0x71
+OP_INVOKE_STATIC_RANGE = 0x77
+
+CODE_ITEM_HEADER = 16
+
+LOADLIBRARY = ("Ljava/lang/System;", "loadLibrary", "(Ljava/lang/String;)V")
+
+
+class PatchError(Exception):
+    """An in-place edit is not possible; the DEX needs the smali round-trip."""
+
+
+def stub_insns(return_type: str) -> tuple[int, bytes]:
+    """Return (registers needed, code units) for a safe default return.
+
+    The binary form of smalipatch.stub_body().
+    """
+    if return_type == "V":
+        return 0, struct.pack("<H", OP_RETURN_VOID)
+    if return_type in ("Z", "B", "C", "S", "I", "F"):
+        return 1, struct.pack("<HH", OP_CONST_4, OP_RETURN)
+    if return_type in ("J", "D"):
+        return 2, struct.pack("<HHH", OP_CONST_WIDE_16, 0, OP_RETURN_WIDE)
+    return 1, struct.pack("<HH", OP_CONST_4, OP_RETURN_OBJECT)
+
+
+def code_item_end(data: bytes | bytearray, code_off: int) -> int:
+    """Offset just past a code_item, including its tries and handlers."""
+    tries_size, = struct.unpack_from("<H", data, code_off + 6)
+    insns_size, = struct.unpack_from("<I", data, code_off + 12)
+    end = code_off + CODE_ITEM_HEADER + 2 * insns_size
+    if not tries_size:
+        return end
+    if insns_size % 2:
+        end += 2                        # padding before the try_items
+    end += 8 * tries_size
+    handler_lists, size = decode_uleb128(data, end)
+    end += size
+    for _ in range(handler_lists):
+        value, size = decode_uleb128(data, end)
+        end += size
+        # encoded_catch_handler.size is a sleb128: <= 0 means a catch-all follows
+        value = value - (1 << (7 * size)) if value & (1 << (7 * size - 1)) else value
+        for _ in range(2 * abs(value) + (1 if value <= 0 else 0)):
+            end += decode_uleb128(data, end)[1]
+    return end
+
+
+def stub_code_item(data: bytearray, code_off: int, return_type: str, next_off: int) -> None:
+    """Overwrite a code_item's body with a stub return, in place.
+
+    next_off is where the next item (or section) after this code_item
+    starts; the rewritten item never extends past it.
+    """
+    registers_needed, stub = stub_insns(return_type)
+    registers_size, _ins, _outs, tries_size = struct.unpack_from("<HHHH", data, code_off)
+    insns_size, = struct.unpack_from("<I", data, code_off + 12)
+    insns_off = code_off + CODE_ITEM_HEADER
+
+    if tries_size:
+        # Without tries the item ends right after insns (an even offset), and
+        # it must still round up to the same 4-byte boundary. An odd old end
+        # moves back one byte, or forward into the zero padding that follows
+        end = code_item_end(data, code_off)
+        new_end = end if end % 4 in (0, 2) else end - 1 if end % 4 == 3 else end + 1
+        if new_end > next_off or any(data[end:new_end]):
+            raise PatchError(f"code_item at 0x{code_off:x}: try blocks cannot be cleared in place")
+        insns_size = (new_end - insns_off) // 2
+        data[insns_off:new_end] = bytes(new_end - insns_off)
+        struct.pack_into("<H", data, code_off + 6, 0)
+        struct.pack_into("<I", data, code_off + 12, insns_size)
+
+    if len(stub) > 2 * insns_size:
+        raise PatchError(f"code_item at 0x{code_off:x}: body too short for the stub")
+    data[insns_off:insns_off + 2 * insns_size] = stub + bytes(2 * insns_size - len(stub))
+    if registers_size < registers_needed:
+        struct.pack_into("<H", data, code_off, registers_needed)
+
+
+class DexPatcher:
+    """Batched in-place edits on one DEX.
+
+    Works on any writable buffer; open() patches a writable mmap of a copy
+    of the file (dexio.DexEdit), so the DEX is never read into memory.
+    Use open() as a context manager: unless save() is called, the
+    original is left untouched.
+    """
+
+    def __init__(self, data: bytearray | mmap.mmap, edit: DexEdit | None = None):
+        self.data = data
+        self.dex = DexFile(self.data)
+        self._edit = edit
+        self._code_refs: dict[int, int] | None = None
+        self._item_offsets: list[int] | None = None
+        self._loadlibrary_idx: int | None = -1
+        self.changed = False
+
+    @classmethod
+    def open(cls, path: str, out_path: str | None = None) -> "DexPatcher":
+        """Patch path; save() writes the result to out_path (default: path)."""
+        edit = DexEdit(path, out_path)
+        return cls(edit.data, edit)
+
+    def __enter__(self) -> "DexPatcher":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self._edit is not None:
+            self._edit.discard()
+
+    def code_refs(self) -> dict[int, int]:
+        """code_off → number of methods using it (built on first use)."""
+        if self._code_refs is None:
+            self._code_refs = {}
+            for _idx, _flags, code_off in self.dex.all_methods():
+                if code_off:
+                    self._code_refs[code_off] = self._code_refs.get(code_off, 0) + 1
+        return self._code_refs
+
+    def next_item_off(self, code_off: int) -> int:
+        """Start of whatever follows a code_item: the next code_item, the
+        next map_list section or the end of the file."""
+        if self._item_offsets is None:
+            h = self.dex.header
+            offsets = set(self.code_refs())
+            count, = struct.unpack_from("<I", self.data, h.map_off)
+            for i in range(count):
+                offsets.add(struct.unpack_from("<I", self.data, h.map_off + 4 + 12 * i + 8)[0])
+            offsets.add(len(self.data))
+            self._item_offsets = sorted(offsets)
+        return self._item_offsets[bisect.bisect_right(self._item_offsets, code_off)]
+
+    def class_methods(self, descriptor: str) -> list[tuple[int, int, int]] | None:
+        """(method_idx, access_flags, code_off) of a class, None if not defined here."""
+        class_data_off = self.dex.class_data_off(descriptor)
+        if class_data_off is None:
+            return None
+        return self.dex.class_methods(class_data_off)
+
+    def stub_methods(self, descriptor: str, names: set[str]) -> dict[str, int] | None:
+        """Stub every overload of each name in a class.
+
+        Abstract and native methods (no code_item) are left alone, as in
+        smalipatch.stub_methods(). Returns {name: count}, or None if the
+        class is not defined in this DEX. Raises PatchError if any target
+        cannot be stubbed in place.
+        """
+        methods = self.class_methods(descriptor)
+        if methods is None:
+            return None
+        counts = dict.fromkeys(names, 0)
+        targets = []
+        for method_idx, _flags, code_off in methods:
+            name = self.dex.method_name(method_idx)
+            if name in counts and code_off:
+                targets.append((name, code_off, self.dex.method_return_type(method_idx)))
+        for name, code_off, _ret in targets:
+            users = sum(1 for _n, off, _r in targets if off == code_off)
+            if self.code_refs()[code_off] > users:
+                raise PatchError(f"{descriptor}->{name}: code_item shared with other methods")
+        stubbed = set()
+        for name, code_off, return_type in targets:
+            # A body shared only among targets is stubbed once
+            if code_off not in stubbed:
+                stub_code_item(self.data, code_off, return_type, self.next_item_off(code_off))
+                stubbed.add(code_off)
+            counts[name] += 1
+            self.changed = True
+        return counts
+
+    def neutralize_loadlibrary(self, descriptor: str) -> int | None:
+        """Replace System.loadLibrary calls in a class with nops.
+
+        Returns the number of calls replaced, or None if the class is not
+        defined in this DEX.
+        """
+        methods = self.class_methods(descriptor)
+        if methods is None:
+            return None
+        if self._loadlibrary_idx == -1:
+            self._loadlibrary_idx = self.dex.find_method(*LOADLIBRARY)
+        if self._loadlibrary_idx is None:
+            return 0
+        count = 0
+        for _idx, _flags, code_off in methods:
+            if not code_off:
+                continue
+            insns_size, = struct.unpack_from("<I", self.data, code_off + 12)
+            insns_off = code_off + CODE_ITEM_HEADER
+            insns = memoryview(self.data)[insns_off:insns_off + 2 * insns_size]
+            calls = [pc for pc, opcode, _width in iter_instructions(insns)
+                     if opcode in (OP_INVOKE_STATIC, OP_INVOKE_STATIC_RANGE)
+                     and struct.unpack_from("<H", insns, 2 * pc + 2)[0] == self._loadlibrary_idx]
+            insns.release()
+            if calls and self.code_refs()[code_off] > 1:
+                raise PatchError(f"{descriptor}: loadLibrary caller's code_item is shared")
+            for pc in calls:
+                # invoke-static is 3 code units; three nops keep every offset
+                self.data[insns_off + 2 * pc:insns_off + 2 * pc + 6] = bytes(6)
+            count += len(calls)
+        if count:
+            self.changed = True
+        return count
+
+    def save(self) -> bool:
+        """Fix signature and checksum, then atomically replace the output
+        unless it already holds the same bytes. Returns True if written."""
+        return self._edit.commit()
@@ -0,0 +1,177 @@
+"""
+dexstrip.py - Remove whole packages from a DEX (strip-classes.list).
+
+The binary counterpart of deleting smali/<package>/ trees before smali
+reassembles a DEX: class_defs under the given descriptor prefixes are
+dropped from the model, and write_dex(prune=True) then leaves out their
+class_data, code_items, debug info, annotations and static values, plus
+every string/type/proto/field/method id they referenced and nothing else
+does, with map_list, header, signature and checksum regenerated. Pool
+entries no class referenced to begin with (the D8 marker string, say)
+are kept: stripping removes what the packages brought in, nothing else.
+
+Savings are reported per package. The DEX total is exact (file sizes).
+The per-package split is attributed from what each package owns alone:
+its class_defs, class_data, code_items and debug info, and the pool
+entries that no kept class and no other stripped package references.
+Bytes shared between stripped packages and section padding only show in
+the total. Code units are exact: that is the bytecode ART no longer has
+to verify and compile at install.
+"""
+
+import dalvik
+from dexfile import DexFile, encode_mutf8, encode_uleb128
+from dexmodel import POOLS, ClassDef, DexModel, collect_references, read_dex, write_dex
+
+CLASS_DEF_SIZE = 32
+CODE_ITEM_HEADER = 16
+# id item sizes per pool (proto type_lists and call site arrays are added below)
+ID_SIZES = {dalvik.TYPE: 4, dalvik.PROTO: 12, dalvik.FIELD: 8, dalvik.METHOD: 8,
+            dalvik.METHOD_HANDLE: 8, dalvik.CALL_SITE: 4}
+
+
+class PackageSavings:
+    """What stripping one strip-classes.list package removed from a DEX."""
+    __slots__ = ("prefix", "classes", "methods", "code_units", "bytes")
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self.classes = 0
+        self.methods = 0
+        self.code_units = 0     # 16-bit bytecode units
+        self.bytes = 0          # attributed, see module docstring
+
+
+def _uleb_size(value: int) -> int:
+    return len(encode_uleb128(value))
+
+
+def _class_bytes(class_def: ClassDef) -> tuple[int, int, int]:
+    """(owned data bytes, methods, code units) of one class_def."""
+    size = CLASS_DEF_SIZE
+    if class_def.interfaces:
+        size += 4 + 2 * len(class_def.interfaces)
+    if class_def.static_values:
+        size += 1 + 2 * len(class_def.static_values)
+    methods = code_units = 0
+    data = class_def.class_data
+    if data is not None:
+        size += sum(_uleb_size(len(group)) for group in (
+            data.static_fields, data.instance_fields, data.direct_methods, data.virtual_methods))
+        for group in (data.static_fields, data.instance_fields):
+            prev = 0
+            for field_idx, flags in group:
+                size += _uleb_size(field_idx - prev) + _uleb_size(flags)
+                prev = field_idx
+        for group in (data.direct_methods, data.virtual_methods):
+            prev = 0
+            for method in group:
+                methods += 1
+                size += _uleb_size(method.method_idx - prev) + _uleb_size(method.access_flags) + 3
+                prev = method.method_idx
+                code = method.code
+                if code is None:
+                    continue
+                code_units += len(code.insns) // 2
+                size += CODE_ITEM_HEADER + len(code.insns)
+                if code.tries:
+                    size += 8 * len(code.tries) + 1
+                    size += sum(2 + 3 * len(catches) for catches, _catch_all in code.handlers)
+                if code.debug_info is not None:
+                    debug = code.debug_info
+                    size += 2 + len(debug.parameter_names)
+                    size += sum(len(p) if isinstance(p, bytes) else 2 for p in debug.program)
+    return size, methods, code_units
+
+
+def _pool_bytes(model: DexModel, kind: str, idx: int) -> int:
+    if kind == dalvik.STRING:
+        text = model.strings[idx]
+        return 4 + _uleb_size(len(text)) + len(encode_mutf8(text)) + 1
+    size = ID_SIZES[kind]
+    if kind == dalvik.PROTO and model.protos[idx].params:
+        size += 4 + 2 * len(model.protos[idx].params)
+    elif kind == dalvik.CALL_SITE:
+        size += 1 + 3 * len(model.call_sites[idx])
+    return size
+
+
+def _unreferenced(model: DexModel) -> dict[str, set[int]]:
+    """Pool indices no class_def references, per kind."""
+    sizes = {dalvik.STRING: len(model.strings), dalvik.TYPE: len(model.types),
+             dalvik.PROTO: len(model.protos), dalvik.FIELD: len(model.fields),
+             dalvik.METHOD: len(model.methods), dalvik.CALL_SITE: len(model.call_sites),
+             dalvik.METHOD_HANDLE: len(model.method_handles)}
+    used = collect_references(model)
+    return {kind: set(range(sizes[kind])) - used[kind] for kind in POOLS}
+
+
+def strip_packages(model: DexModel, prefixes: list[str]) -> tuple[list[PackageSavings], list[str]]:
+    """Drop every class under prefixes from model.classes.
+
+    Returns (savings of each prefix that matched, in config order; kept
+    classes whose superclass or an interface was stripped). A class under
+    nested prefixes counts towards the longest one.
+    """
+    by_length = sorted(prefixes, key=len, reverse=True)
+    owned: dict[str, list[ClassDef]] = {}
+    kept: list[ClassDef] = []
+    for class_def in model.classes:
+        descriptor = model.type_name(class_def.class_idx)
+        prefix = next((p for p in by_length if descriptor.startswith(p)), None)
+        if prefix is None:
+            kept.append(class_def)
+        else:
+            owned.setdefault(prefix, []).append(class_def)
+    if not owned:
+        return [], []
+
+    stripped_types = {c.class_idx for classes in owned.values() for c in classes}
+    broken = [model.type_name(c.class_idx) for c in kept
+              if c.superclass_idx in stripped_types
+              or any(t in stripped_types for t in c.interfaces)]
+
+    # Pool entries each package references, minus anything still needed
+    # by a kept class or by another stripped package
+    refs = {prefix: collect_references(model, classes) for prefix, classes in owned.items()}
+    shared = collect_references(model, kept)
+    for prefix in refs:
+        for other, other_refs in refs.items():
+            if other != prefix:
+                for kind in POOLS:
+                    shared[kind] |= refs[prefix][kind] & other_refs[kind]
+
+    savings = []
+    for prefix in prefixes:
+        if prefix not in owned:
+            continue
+        result = PackageSavings(prefix)
+        for class_def in owned[prefix]:
+            size, methods, code_units = _class_bytes(class_def)
+            result.classes += 1
+            result.methods += methods
+            result.code_units += code_units
+            result.bytes += size
+        for kind in POOLS:
+            for idx in refs[prefix][kind] - shared[kind]:
+                result.bytes += _pool_bytes(model, kind, idx)
+        savings.append(result)
+
+    model.classes = kept
+    return savings, broken
+
+
+def strip_dex(data, prefixes: list[str]) -> tuple[bytearray | None, list[PackageSavings], list[str]]:
+    """Strip prefixes from a DEX image.
+
+    Returns (rewritten DEX, or None if no class matched; savings; kept
+    classes left extending a stripped one).
+    """
+    if not any(d.startswith(tuple(prefixes)) for d in DexFile(data).class_descriptors()):
+        return None, [], []     # decided from class_defs alone, no full parse
+    model = read_dex(data)
+    orphans = _unreferenced(model)
+    savings, broken = strip_packages(model, prefixes)
+    if not savings:
+        return None, [], []
+    return write_dex(model, prune=True, keep_ids=orphans), savings, broken
@@ -0,0 +1,80 @@
+"""
+edgeconfig.py - Shared config/*.list helpers for the edge-fix Python scripts.
+
+Mirrors the read_config() and smali_to_dex() helpers in build.sh so that
+Python entry points resolve config entries exactly like the shell pipeline.
+"""
+
+import os
+import re
+
+# classes.dex, classes2.dex, ... as stored at the root of an APK
+DEX_ENTRY_RE = re.compile(r"classes\d*\.dex")
+
+
+def read_config(filepath: str) -> list[str]:
+    """Read a config file, skip comments and blanks.
+
+    Returns an empty list if the file does not exist.
+    """
+    entries: list[str] = []
+    if not os.path.isfile(filepath):
+        return entries
+    with open(filepath, "r") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                entries.append(line)
+    return entries
+
+
+def smali_to_dex(smali_path: str) -> str | None:
+    """Map a smali path prefix to its DEX filename.
+
+    smali/...            → classes.dex
+    smali_classesN/...   → classesN.dex
+    """
+    smali_dir = smali_path.split("/", 1)[0]
+    if smali_dir == "smali":
+        return "classes.dex"
+    if smali_dir.startswith("smali_classes"):
+        return smali_dir[len("smali_"):] + ".dex"
+    return None
+
+
+def dex_to_smali_dir(dex_name: str) -> str:
+    """Map a DEX filename back to its baksmali output directory name."""
+    base = os.path.basename(dex_name)
+    if base.endswith(".dex"):
+        base = base[:-4]
+    return "smali" if base == "classes" else f"smali_{base}"
+
+
+def dex_sort_key(dex_name: str) -> tuple[int, str]:
+    """Sort classes.dex, classes2.dex, ..., classes10.dex in load order."""
+    base = os.path.basename(dex_name)
+    return len(base), base
+
+
+def _package_prefixes(filepath: str) -> list[str]:
+    """Package list entries as descriptor prefixes ('Lcom/huawei/hms/').
+
+    Entries are parsed like the round-trip's smali directory deletion in
+    build.sh: inline comments and spaces are dropped.
+    """
+    prefixes = []
+    for entry in read_config(filepath):
+        entry = entry.split("#", 1)[0].replace(" ", "").strip("/")
+        if entry:
+            prefixes.append(f"L{entry}/")
+    return prefixes
+
+
+def strip_class_prefixes(config_dir: str) -> list[str]:
+    """strip-classes.list packages as descriptor prefixes."""
+    return _package_prefixes(os.path.join(config_dir, "strip-classes.list"))
+
+
+def main_dex_prefixes(config_dir: str) -> list[str]:
+    """main-dex.list packages (kept in classes.dex) as descriptor prefixes."""
+    return _package_prefixes(os.path.join(config_dir, "main-dex.list"))
@@ -0,0 +1,114 @@
+"""
+endpoints.py - Find URL and host strings in a DEX without decoding its strings.
+
+The string_data items of a DEX are contiguous NUL-terminated MUTF-8, so
+two precompiled patterns run over the whole section as one buffer:
+
+  URL_RE       scheme://host[:port][/path] anywhere in a string
+  HOST_END_RE  a known TLD right before a NUL: the end of a string that
+               may be a bare hostname (www.google-analytics.com)
+
+Neither can match across a NUL, so every hit lies in a single string.
+Only the strings that contain a hit are located (bisect over the sorted
+string_data offsets) and decoded; the other strings, by far the most,
+are never turned into Python objects. A bare hostname counts when it is
+a host already known from a URL or from replace-urls.list, or when it
+has at least three labels and its TLD is not also a common Java package
+word (WORD_TLDS: app, io, dev, ...). That keeps dotted names like
+java.io and androidx.core.app out.
+
+Found strings are then diffed against replace-urls.list (whole-string
+entries, as patch-dex-strings.py replaces them):
+  patched     the string is listed
+  unpatched   not listed, but its host is a host of a listed entry
+  new         host not covered by the list at all
+"""
+
+import bisect
+import re
+import struct
+from urllib.parse import urlsplit
+
+from dexfile import DexFile, decode_mutf8, decode_uleb128
+
+TLDS = (b"com", b"net", b"org", b"io", b"ms", b"cn", b"co", b"info", b"app", b"dev",
+        b"cloud", b"ai", b"us", b"de", b"jp", b"uk", b"fr", b"ru", b"in", b"me", b"tv",
+        b"xyz", b"invalid")
+# TLDs that also end Java package names: a bare host ending in one of
+# them only counts when it is a known host
+WORD_TLDS = {"io", "co", "app", "dev", "ai", "us", "de", "in", "me"}
+URL_RE = re.compile(rb"(?:https?|wss?)://[A-Za-z0-9.-]+(?::[0-9]{1,5})?(?:[/?#][!#-;=?-~]*)?")
+HOST_END_RE = re.compile(rb"\.(?:" + b"|".join(TLDS) + rb")\x00")
+HOST_RE = re.compile(r"(?:[a-z0-9](?:[a-z0-9-]*[a-z0-9])?\.)+(?:"
+                     + "|".join(t.decode() for t in TLDS) + r")")
+URL_TEXT_RE = re.compile(URL_RE.pattern.decode())
+
+PATCHED, UNPATCHED, NEW = "patched", "unpatched", "new"
+
+
+def endpoint_host(endpoint: str) -> str:
+    """Lower-case host of a URL or bare hostname."""
+    if "://" in endpoint:
+        return (urlsplit(endpoint).hostname or "").lower()
+    return endpoint.lower()
+
+
+def _is_host(text: str, known_hosts: set[str]) -> bool:
+    """Whether a string is a bare hostname worth reporting."""
+    if not HOST_RE.fullmatch(text):
+        return False
+    if text in known_hosts:
+        return True
+    return text.count(".") >= 2 and text.rsplit(".", 1)[1] not in WORD_TLDS
+
+
+def _string_starts(dex: DexFile) -> list[int]:
+    h = dex.header
+    return sorted(struct.unpack_from(f"<{h.string_ids_size}I", dex.data, h.string_ids_off))
+
+
+def _string_at(dex: DexFile, item_off: int) -> str:
+    _size, uleb_size = decode_uleb128(dex.data, item_off)
+    start = item_off + uleb_size
+    return decode_mutf8(bytes(dex.data[start:dex.data.find(b"\x00", start)]))
+
+
+def scan_dex(data, known_hosts: set[str] = frozenset()) -> dict[str, list[str]]:
+    """Strings of a DEX that hold endpoints: {string: [URLs or host]}."""
+    dex = DexFile(data)
+    starts = _string_starts(dex)
+    if not starts:
+        return {}
+    last = starts[-1]
+    end = dex.data.find(b"\x00", last + decode_uleb128(dex.data, last)[1]) + 1
+
+    found: dict[str, list[str]] = {}
+    seen: set[int] = set()
+    with memoryview(dex.data)[:end] as view:
+        for match in URL_RE.finditer(view, starts[0]):
+            item_off = starts[bisect.bisect_right(starts, match.start()) - 1]
+            if item_off not in seen:
+                seen.add(item_off)
+                text = _string_at(dex, item_off)
+                urls = URL_TEXT_RE.findall(text)
+                if urls:
+                    found[text] = urls
+        hosts = {endpoint_host(u) for urls in found.values() for u in urls} | set(known_hosts)
+        for match in HOST_END_RE.finditer(view, starts[0]):
+            item_off = starts[bisect.bisect_right(starts, match.start()) - 1]
+            if item_off in seen:
+                continue
+            seen.add(item_off)
+            text = _string_at(dex, item_off)
+            if _is_host(text, hosts):
+                found[text] = [text]
+    return found
+
+
+def classify(text: str, endpoints: list[str], listed: set[str], listed_hosts: set[str]) -> str:
+    """PATCHED, UNPATCHED or NEW for a found string (see module docstring)."""
+    if text in listed:
+        return PATCHED
+    if any(endpoint_host(e) in listed_hosts for e in endpoints):
+        return UNPATCHED
+    return NEW
@@ -0,0 +1,112 @@
+#!/data/data/com.termux/files/usr/bin/python3
+"""
+find-callers.py - Find every call site of a method across an APK's DEX files.
+
+Builds (or loads) a call-site index per classesN.dex (callindex.py) and
+prints each caller of the queried methods, e.g. the obfuscated classes
+that call System.loadLibrary, which is what neutralize-libs.list needs
+after an Edge release renames them. DEX files are indexed in parallel and
+each index is cached under the SHA-256 of the DEX bytes, so repeat queries
+on the same APK, and unchanged DEX files of a new release, skip the scan.
+
+Queries:
+  'Ljava/lang/System;->loadLibrary(Ljava/lang/String;)V'   exact method
+  'Ljava/lang/System;->loadLibrary'                        every overload
+  'Lcom/adjust/sdk/Adjust;' or com.adjust.sdk.Adjust       every method of a class
+  com/adjust/sdk/                                          every class under a package
+
+Output: one tab-separated line per call site (dex, caller, pc, callee);
+--smali prints the calling classes as smali paths instead, in the format
+of neutralize-libs.list.
+
+Usage: python3 find-callers.py <apk|dex-dir|dex> <query>... [--smali] [--cache DIR] [--jobs N]
+"""
+
+import argparse
+import os
+import sys
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import buildreport
+from buildcache import BuildCache
+from callindex import CallIndex
+from classindex import dex_sources, smali_path
+from dexfile import DexFormatError
+from dexio import map_dex
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE = os.path.join(os.path.dirname(SCRIPT_DIR), "work", "cache")
+
+
+def query_dex(source: tuple[str, str], queries: list[str], cache_dir: str | None):
+    """Worker: index one DEX and answer every query.
+
+    Returns (DEX name, served from cache, [(caller, pc, callee), ...]).
+    """
+    dex_name, path = source
+    cache = BuildCache(cache_dir) if cache_dir else None
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as zf:
+            index, cached = CallIndex.open(zf.read(dex_name), cache)
+    else:
+        with map_dex(path) as data:
+            index, cached = CallIndex.open(data, cache)
+    sites = []
+    for query in queries:
+        sites += index.callers(query)
+    return dex_name, cached, sites
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Find call sites of methods across the DEX files of an APK")
+    parser.add_argument("source", help="APK, directory of classes*.dex, or a single DEX")
+    parser.add_argument("queries", nargs="+", help="method, class or package to find callers of")
+    parser.add_argument("--smali", action="store_true",
+                        help="print the calling classes as smali paths (neutralize-libs.list format)")
+    parser.add_argument("--cache", default=DEFAULT_CACHE,
+                        help="call-site index cache (default: work/cache)")
+    parser.add_argument("--no-cache", action="store_true", help="always scan, store nothing")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1,
+                        help="worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    try:
+        sources = dex_sources(args.source)
+    except (OSError, DexFormatError) as e:
+        print(f"    [!] {e}")
+        sys.exit(1)
+
+    worker = partial(query_dex, queries=args.queries,
+                     cache_dir=None if args.no_cache else args.cache)
+    if args.jobs > 1 and len(sources) > 1:
+        with ProcessPoolExecutor(max_workers=min(args.jobs, len(sources))) as pool:
+            results = list(pool.map(worker, sources))
+    else:
+        results = [worker(source) for source in sources]
+
+    total = cached = 0
+    seen: set[str] = set()
+    for dex_name, hit, sites in results:
+        cached += hit
+        total += len(sites)
+        for caller, pc, callee in sites:
+            if not args.smali:
+                print(f"{dex_name}\t{caller}\t0x{pc:x}\t{callee}")
+                continue
+            path = smali_path(caller.split("->", 1)[0], dex_name)
+            if path not in seen:
+                seen.add(path)
+                print(path)
+
+    buildreport.count(files=len(results))
+    print(f"    [x] {total} call site(s) in {len(results)} DEX file(s) "
+          f"({len(results) - cached} scanned, {cached} cached)", file=sys.stderr)
+    if not total:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    buildreport.run(main)
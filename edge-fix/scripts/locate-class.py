@@ -0,0 +1,80 @@
+#!/data/data/com.termux/files/usr/bin/python3
+"""
+locate-class.py - Find which classesN.dex defines a class, without baksmali.
+
+Reads class_defs/type_ids directly from the DEX files of an APK (or a
+directory of DEX files) via classindex.py. Used by build.sh to decompile
+only the DEX that holds a patch target, and to catch config entries whose
+smali_classesN prefix went stale after Edge reshuffled classes.
+
+Classes may be given as descriptors (Lorg/chromium/base/BuildInfo;),
+dotted names (org.chromium.base.BuildInfo) or smali paths.
+
+Usage: python3 locate-class.py <apk|dex-dir|dex> <class>...
+       python3 locate-class.py <apk|dex-dir|dex> --dex-only <class>...
+       python3 locate-class.py <apk|dex-dir|dex> --check <config-dir>
+"""
+
+import sys
+
+import buildreport
+from classindex import ClassIndex, check_config, class_descriptor, smali_path
+from dexfile import DexFormatError
+from edgeconfig import smali_to_dex
+
+
+def main() -> None:
+    if len(sys.argv) < 3:
+        print(f"Usage: {sys.argv[0]} <apk|dex-dir|dex> <class>...")
+        print(f"       {sys.argv[0]} <apk|dex-dir|dex> --dex-only <class>...")
+        print(f"       {sys.argv[0]} <apk|dex-dir|dex> --check <config-dir>")
+        sys.exit(1)
+
+    try:
+        index = ClassIndex.open(sys.argv[1])
+    except (OSError, DexFormatError) as e:
+        print(f"    [!] {e}")
+        sys.exit(1)
+
+    if sys.argv[2] == "--check":
+        if len(sys.argv) < 4:
+            print(f"Usage: {sys.argv[0]} <apk|dex-dir|dex> --check <config-dir>")
+            sys.exit(1)
+        problems = check_config(index, sys.argv[3])
+        for list_name, entry, actual in problems:
+            path = entry.partition("|")[0]
+            if actual is None:
+                print(f"    [!] {list_name}: {path} is not defined in any DEX")
+            else:
+                fixed = smali_path(class_descriptor(path), actual)
+                print(f"    [!] {list_name}: {path} lives in {actual} "
+                      f"(not {smali_to_dex(path)}) → {fixed}")
+        if problems:
+            sys.exit(1)
+        print(f"    [x] All smali_classesN prefixes match ({len(index.dexes)} DEX files)")
+        return
+
+    dex_only = sys.argv[2] == "--dex-only"
+    names = sys.argv[3:] if dex_only else sys.argv[2:]
+    found: list[str] = []
+    missing = 0
+    for name in names:
+        dex_name = index.locate(name)
+        if dex_name is None:
+            missing += 1
+            if not dex_only:
+                print(f"{class_descriptor(name)}\t-")
+            continue
+        if dex_only:
+            if dex_name not in found:
+                found.append(dex_name)
+                print(dex_name)
+        else:
+            print(f"{class_descriptor(name)}\t{dex_name}")
+
+    if missing == len(names):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    buildreport.run(main)
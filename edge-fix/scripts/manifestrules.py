@@ -0,0 +1,126 @@
+"""
+manifestrules.py - strip-*.list rules shared by the manifest patchers.
+
+Loads strip-permissions/components/queries/metadata.list into a single
+dictionary keyed by (parent tag, tag, android:name), so deciding whether an
+element is stripped is one lookup however long the lists are. Used by both
+the decoded-XML patcher (patch-manifest.py) and the binary AXML patcher.
+"""
+
+import os
+
+from edgeconfig import read_config
+
+PERMISSION_TAGS = ("uses-permission", "uses-permission-sdk-23")
+
+# Categories reported by the patchers, in report order
+PERMISSION = "permission"
+COMPONENT = "component"
+QUERY = "query"
+METADATA = "meta-data"
+CATEGORIES = (PERMISSION, COMPONENT, QUERY, METADATA)
+
+SECTION_TITLES = {
+    PERMISSION: "Stripping tracking permissions",
+    COMPONENT: "Stripping tracker components",
+    QUERY: "Stripping device ID package queries",
+    METADATA: "Stripping tracker meta-data",
+}
+
+# apktool compiles @null to @0x00000000, which GMS rejects as invalid, so
+# @null meta-data entries are removed -- except the GMS version, which GMS
+# requires. Its value must match @integer/google_play_services_version;
+# 12451000 corresponds to play-services 18.x used by Edge.
+NULL_VALUE = "@null"
+GMS_VERSION_META = "com.google.android.gms.version"
+GMS_VERSION_VALUE = "12451000"
+
+
+class ManifestRules:
+    """All strip-*.list entries, indexed for O(1) element matching."""
+
+    def __init__(self):
+        self.index: dict[tuple[str, str, str], str] = {}
+        self.invalid: list[str] = []   # malformed strip-components.list lines
+
+    @classmethod
+    def load(cls, config_dir: str) -> "ManifestRules":
+        rules = cls()
+        for perm in read_config(os.path.join(config_dir, "strip-permissions.list")):
+            for tag in PERMISSION_TAGS:
+                rules.index[("manifest", tag, perm)] = PERMISSION
+        for entry in read_config(os.path.join(config_dir, "strip-components.list")):
+            comp_type, sep, comp_name = entry.partition("|")
+            if not sep:
+                rules.invalid.append(entry)
+                continue
+            rules.index[("application", comp_type, comp_name)] = COMPONENT
+        for pkg in read_config(os.path.join(config_dir, "strip-queries.list")):
+            rules.index[("queries", "package", pkg)] = QUERY
+        for meta_name in read_config(os.path.join(config_dir, "strip-metadata.list")):
+            rules.index[("manifest", "meta-data", meta_name)] = METADATA
+            rules.index[("application", "meta-data", meta_name)] = METADATA
+        return rules
+
+    def match(self, parent_tag: str, tag: str, name: str | None) -> str | None:
+        """Category of a listed element, or None if it is kept.
+
+        Only direct children are listed: permissions and meta-data under
+        <manifest>, components and meta-data under <application>, packages
+        under <queries>.
+        """
+        if name is None:
+            return None
+        return self.index.get((parent_tag, tag, name))
+
+
+def null_metadata_value(parent_tag: str, tag: str, name: str | None,
+                        value: str | None) -> tuple[bool, str | None]:
+    """@null meta-data handling: (applies, replacement value).
+
+    Returns (False, None) for anything that is not an @null meta-data
+    under <manifest>/<application>; (True, value) when the value must be
+    rewritten; (True, None) when the element must be removed.
+    """
+    if tag != "meta-data" or parent_tag not in ("manifest", "application") or value != NULL_VALUE:
+        return False, None
+    if name == GMS_VERSION_META:
+        return True, GMS_VERSION_VALUE
+    return True, None
+
+
+def print_report(rules: ManifestRules, removals: dict[str, list[tuple[str, str]]],
+                 null_fixes: list[tuple[str, str | None]], has_application: bool) -> int:
+    """Print the per-section removal log. Returns the total removal count.
+
+    removals maps each category to the (tag, name) pairs removed;
+    null_fixes lists (name, new value, or None if removed).
+    """
+    for category in CATEGORIES:
+        if category != PERMISSION:
+            print()
+        print(f"=== {SECTION_TITLES[category]} ===")
+        if category == COMPONENT:
+            if not has_application:
+                print("  ERROR: No <application> element found!")
+            for entry in rules.invalid:
+                print(f"  [!] Invalid format: {entry}")
+        for tag, name in removals[category]:
+            label = tag if category == COMPONENT else category
+            print(f"  [x] Stripped {label}: {name}")
+
+    print("\n=== Removing @null meta-data entries ===")
+    for name, value in null_fixes:
+        if value is None:
+            print(f"  [x] Removed @null meta-data: {name}")
+        else:
+            print(f"  [x] Fixed {name}: @null -> {value}")
+
+    counts = [len(removals[c]) for c in CATEGORIES]
+    print(f"\n=== Manifest surgery complete ===")
+    print(f"  Permissions stripped: {counts[0]}")
+    print(f"  Components stripped: {counts[1]}")
+    print(f"  Queries stripped: {counts[2]}")
+    print(f"  Meta-data stripped: {counts[3]}")
+    print(f"  Total removals: {sum(counts)}")
+    return sum(counts)
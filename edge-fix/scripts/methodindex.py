@@ -0,0 +1,319 @@
+"""
+methodindex.py - Per-method fingerprint index to re-locate obfuscated code.
+
+Obfuscated config targets (smali/w760.smali in neutralize-libs.list,
+renamed classes and methods in targeted-stubs.list) get new names in
+every Edge release, but their bodies barely change. Each method with a
+code_item is fingerprinted in one walk over its instructions (dalvik.py
+width table, no disassembler):
+
+  tokens     64-bit hashes of the strings it loads (const-string) and of
+             the methods it calls (invoke-*), deduplicated
+  histogram  how often each opcode occurs
+  shape      shorty of its prototype
+
+and a method of the previous release is matched against the new one by
+looking up its tokens in a postings table (token → methods), so only
+methods sharing a string or callee are compared. Tokens are weighted by
+rarity in the new build (a call to StringBuilder.append says little, a
+telemetry URL says a lot); the score mixes the weighted token overlap
+with the histogram overlap, halved when the shorties differ. A class
+scores the mean, over its old methods, of each one's best match within
+the candidate class.
+
+An index is keyed by the SHA-256 of the DEX bytes and stored in the
+build cache (buildcache.CachedDexIndex, kind "fingerprints"), like
+callindex.py:
+  methods.txt   reference of every fingerprinted method, one per line
+  info.bin      uint32 (code units, token start, token count,
+                histogram start, histogram count) per method
+  tokens.bin    uint64 tokens of all methods, per method in order
+  hist.bin      uint16 (opcode, count) pairs of all methods
+  postings.bin  uint64 tokens of all methods, sorted
+  posting-methods.bin  uint32 method of each postings.bin token
+"""
+
+import bisect
+import hashlib
+import math
+import struct
+from array import array
+
+from buildcache import CachedDexIndex
+from dalvik import FORMAT_WIDTH, METHOD, OPCODES, STRING, instruction_width
+from dexfile import DexFile
+
+INFO_FIELDS = 5
+# Tokens shared by more methods than this select no candidates (they are
+# still weighed when two methods are compared)
+MAX_POSTINGS = 200
+TOKEN_WEIGHT = 0.75
+HISTOGRAM_WEIGHT = 1 - TOKEN_WEIGHT
+SHAPE_PENALTY = 0.5     # score factor when the shorties differ
+
+_WIDTHS = [FORMAT_WIDTH[fmt] for _name, fmt, _kind in OPCODES]
+_REF_KINDS = {op: kind for op, (_name, _fmt, kind) in enumerate(OPCODES) if kind in (STRING, METHOD)}
+
+
+def token(prefix: str, text: str) -> int:
+    digest = hashlib.blake2b(f"{prefix}:{text}".encode("utf-8", "surrogatepass"),
+                             digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def shorty(ref: str) -> str:
+    """Shorty of a method reference ('...->f(ILx;[I)V' → 'VILL')."""
+    params, _, ret = ref[ref.index("(") + 1:].partition(")")
+    short = [ret[0] if ret[0] not in "L[" else "L"]
+    i = 0
+    while i < len(params):
+        start = i
+        while params[i] == "[":
+            i += 1
+        if params[i] == "L":
+            i = params.index(";", i)
+        short.append("L" if params[start] in "L[" else params[start])
+        i += 1
+    return "".join(short)
+
+
+class MethodIndex(CachedDexIndex):
+    """Fingerprints of the methods of one DEX."""
+
+    CACHE_KIND = "fingerprints"
+    INDEX_VERSION = b"methodindex-1"    # bump when the fingerprint or layout changes
+    ARRAYS = (("info.bin", "info", "I"), ("tokens.bin", "tokens", "Q"), ("hist.bin", "hist", "H"),
+              ("postings.bin", "_post_tokens", "Q"), ("posting-methods.bin", "_post_methods", "I"))
+
+    def __init__(self, methods: list[str], info: array, tokens: array, hist: array,
+                 post_tokens: array, post_methods: array):
+        self.methods = methods      # method references, in index order
+        self.info = info            # INFO_FIELDS per method
+        self.tokens = tokens
+        self.hist = hist
+        self._post_tokens = post_tokens
+        self._post_methods = post_methods
+
+    # ─── scanning ───
+
+    @classmethod
+    def scan(cls, data: bytes) -> "MethodIndex":
+        dex = DexFile(data)
+        strings: dict[int, int] = {}
+        callees: dict[int, int] = {}
+        walked: dict[int, tuple[int, list[int], dict[int, int]]] = {}
+        methods: list[str] = []
+        info = array("I")
+        tokens = array("Q")
+        hist = array("H")
+        pairs: list[tuple[int, int]] = []
+        for method_idx, _flags, code_off in dex.all_methods():
+            if not code_off:
+                continue
+            fingerprint = walked.get(code_off)
+            if fingerprint is None:     # code_items shared by several methods are walked once
+                fingerprint = walked[code_off] = cls._walk(dex, code_off, strings, callees)
+            code_units, method_tokens, counts = fingerprint
+            n = len(methods)
+            methods.append(dex.method_ref(method_idx))
+            info.extend((code_units, len(tokens), len(method_tokens), len(hist) // 2, len(counts)))
+            tokens.extend(method_tokens)
+            for opcode in sorted(counts):
+                hist.extend((opcode, min(counts[opcode], 0xFFFF)))
+            pairs.extend((t, n) for t in method_tokens)
+        pairs.sort()
+        return cls(methods, info, tokens, hist, array("Q", (t for t, _m in pairs)),
+                   array("I", (m for _t, m in pairs)))
+
+    @staticmethod
+    def _walk(dex: DexFile, code_off: int, strings: dict, callees: dict):
+        data = dex.data
+        insns_size, = struct.unpack_from("<I", data, code_off + 12)
+        insns = data[code_off + 16:code_off + 16 + 2 * insns_size]
+        found: set[int] = set()
+        counts: dict[int, int] = {}
+        pc = 0
+        while pc < insns_size:
+            opcode = insns[2 * pc]
+            if opcode == 0 and insns[2 * pc + 1]:
+                pc += instruction_width(insns, pc)      # switch/array payload
+                continue
+            counts[opcode] = counts.get(opcode, 0) + 1
+            kind = _REF_KINDS.get(opcode)
+            if kind is not None:
+                if _WIDTHS[opcode] == 3 and kind == STRING:     # const-string/jumbo
+                    idx, = struct.unpack_from("<I", insns, 2 * pc + 2)
+                else:
+                    idx = insns[2 * pc + 2] | (insns[2 * pc + 3] << 8)
+                memo = strings if kind == STRING else callees
+                tok = memo.get(idx)
+                if tok is None:
+                    tok = memo[idx] = (token("s", dex.string(idx)) if kind == STRING
+                                       else token("m", dex.method_ref(idx)))
+                found.add(tok)
+            pc += _WIDTHS[opcode]
+        return insns_size, sorted(found), counts
+
+    # ─── cache ───
+
+    def cache_meta(self) -> dict:
+        return {"methods": len(self.methods), "postings": len(self._post_tokens)}
+
+    # ─── queries ───
+
+    def method_tokens(self, n: int) -> array:
+        start, count = self.info[INFO_FIELDS * n + 1], self.info[INFO_FIELDS * n + 2]
+        return self.tokens[start:start + count]
+
+    def histogram(self, n: int) -> dict[int, int]:
+        start, count = self.info[INFO_FIELDS * n + 3], self.info[INFO_FIELDS * n + 4]
+        pairs = self.hist[2 * start:2 * (start + count)]
+        return dict(zip(pairs[0::2], pairs[1::2]))
+
+    def code_units(self, n: int) -> int:
+        return self.info[INFO_FIELDS * n]
+
+    def postings(self, tok: int) -> list[int]:
+        """Methods whose fingerprint holds tok."""
+        lo = bisect.bisect_left(self._post_tokens, tok)
+        hi = bisect.bisect_right(self._post_tokens, tok, lo)
+        return list(self._post_methods[lo:hi])
+
+
+class FingerprintSet:
+    """The method indexes of all DEX files of one build, in load order."""
+
+    def __init__(self, indexes: list[tuple[str, MethodIndex]]):
+        self.indexes = indexes      # (DEX name, index)
+        self.total = sum(len(index.methods) for _name, index in indexes)
+        self._df: dict[int, int] = {}
+        self._classes: dict[str, list[tuple[int, int]]] | None = None
+
+    def class_methods(self, descriptor: str) -> list[tuple[int, int]]:
+        """(DEX position, method) of every fingerprinted method of a class."""
+        if self._classes is None:
+            self._classes = {}
+            for d, (_name, index) in enumerate(self.indexes):
+                for n, ref in enumerate(index.methods):
+                    self._classes.setdefault(ref[:ref.index("->")], []).append((d, n))
+        return self._classes.get(descriptor, [])
+
+    def class_dex(self, descriptor: str) -> str | None:
+        methods = self.class_methods(descriptor)
+        return self.indexes[methods[0][0]][0] if methods else None
+
+    def ref(self, method: tuple[int, int]) -> str:
+        return self.indexes[method[0]][1].methods[method[1]]
+
+    def doc_freq(self, tok: int) -> int:
+        df = self._df.get(tok)
+        if df is None:
+            df = self._df[tok] = sum(len(index.postings(tok)) for _name, index in self.indexes)
+        return df
+
+    def weight(self, tok: int) -> float:
+        """Rarity of a token here; tokens this build lacks weigh the most."""
+        return math.log(1 + self.total / (1 + self.doc_freq(tok)))
+
+
+def _histogram_similarity(a: dict[int, int], b: dict[int, int]) -> float:
+    total = sum(a.values()) + sum(b.values())
+    if not total:
+        return 1.0
+    shared = sum(min(count, b.get(op, 0)) for op, count in a.items())
+    return 2 * shared / total
+
+
+class Matcher:
+    """Scores methods and classes of an old build against a new one."""
+
+    def __init__(self, old: FingerprintSet, new: FingerprintSet):
+        self.old = old
+        self.new = new
+
+    def _fingerprint(self, fps: FingerprintSet, method: tuple[int, int]):
+        index = fps.indexes[method[0]][1]
+        tokens = index.method_tokens(method[1])
+        return ({t: self.new.weight(t) for t in tokens}, index.histogram(method[1]),
+                shorty(index.methods[method[1]]))
+
+    def similarity(self, old_print, new_method: tuple[int, int]) -> float:
+        """Score in [0, 1] of a new method against an old fingerprint."""
+        old_weights, old_hist, old_shorty = old_print
+        new_weights, new_hist, new_shorty = self._fingerprint(self.new, new_method)
+        union = sum(old_weights.values()) + sum(w for t, w in new_weights.items()
+                                                if t not in old_weights)
+        shared = sum(w for t, w in new_weights.items() if t in old_weights)
+        token_sim = shared / union if union else 1.0
+        score = TOKEN_WEIGHT * token_sim + HISTOGRAM_WEIGHT * _histogram_similarity(old_hist, new_hist)
+        return score if old_shorty == new_shorty else score * SHAPE_PENALTY
+
+    def method_candidates(self, old_method: tuple[int, int]) -> dict[tuple[int, int], float]:
+        """New methods sharing a selective token with an old one, scored."""
+        old_print = self._fingerprint(self.old, old_method)
+        candidates: set[tuple[int, int]] = set()
+        for tok in old_print[0]:
+            if 0 < self.new.doc_freq(tok) <= MAX_POSTINGS:
+                for d, (_name, index) in enumerate(self.new.indexes):
+                    candidates.update((d, n) for n in index.postings(tok))
+        return {c: self.similarity(old_print, c) for c in candidates}
+
+    def match_class(self, descriptor: str, limit: int = 3) -> list[tuple[str, float]]:
+        """Best new classes for an old class: [(descriptor, score)], best first.
+
+        A class scores the mean, over the old class's methods, of the best
+        similarity of any of its methods. Methods without a selective token
+        are only compared within the classes the others point to.
+        """
+        old_methods = self.old.class_methods(descriptor)
+        if not old_methods:
+            return []
+        totals: dict[str, float] = {}
+        unplaced = []
+        for old_method in old_methods:
+            candidates = self.method_candidates(old_method)
+            if not candidates:
+                unplaced.append(old_method)
+                continue
+            best: dict[str, float] = {}
+            for method, score in candidates.items():
+                cls = self.new.ref(method).split("->", 1)[0]
+                best[cls] = max(best.get(cls, 0.0), score)
+            for cls, score in best.items():
+                totals[cls] = totals.get(cls, 0.0) + score
+        ranked = sorted(totals, key=totals.get, reverse=True)[:limit]
+        if not ranked and unplaced:
+            return []
+        for old_method in unplaced:
+            old_print = self._fingerprint(self.old, old_method)
+            for cls in ranked:
+                totals[cls] += max((self.similarity(old_print, m)
+                                    for m in self.new.class_methods(cls)), default=0.0)
+        ranked.sort(key=totals.get, reverse=True)
+        return [(cls, totals[cls] / len(old_methods)) for cls in ranked]
+
+    def match_method(self, descriptor: str, name: str, new_class: str) -> tuple[str, float] | None:
+        """Best method of new_class for the old descriptor->name overloads:
+        (new name, mean score).
+
+        On equal scores (identical small bodies) a name the old class did
+        not have wins: the others most likely kept their name.
+        """
+        def method_name(fps: FingerprintSet, method: tuple[int, int]) -> str:
+            return fps.ref(method).split("->", 1)[1].split("(", 1)[0]
+
+        old_class = self.old.class_methods(descriptor)
+        old_names = {method_name(self.old, m) for m in old_class}
+        old_methods = [m for m in old_class if method_name(self.old, m) == name]
+        new_methods = self.new.class_methods(new_class)
+        if not old_methods or not new_methods:
+            return None
+        votes: dict[str, float] = {}
+        for old_method in old_methods:
+            old_print = self._fingerprint(self.old, old_method)
+            score, _fresh, new_name = max(
+                (round(self.similarity(old_print, m), 6), method_name(self.new, m) not in old_names,
+                 method_name(self.new, m)) for m in new_methods)
+            votes[new_name] = votes.get(new_name, 0.0) + score
+        new_name = max(votes, key=votes.get)
+        return new_name, votes[new_name] / len(old_methods)
@@ -11,7 +11,10 @@ Usage: python3 neutralize-loadlibrary.py <smali-file>
 """
 
 import sys
-import re
+
+import buildreport
+from smalifile import SmaliFile
+from smalipatch import neutralize_loadlibrary
 
 
 def neutralize(filepath: str) -> int:
@@ -19,29 +22,9 @@ def neutralize(filepath: str) -> int:
 
     Returns the number of calls neutralized.
     """
-    with open(filepath, "r") as f:
-        lines = f.readlines()
-
-    count = 0
-    output: list[str] = []
-
-    for line in lines:
-        # Match both invoke-static and invoke-static/range forms
-        if re.search(
-            r"invoke-static(/range)?\s+\{[^}]*\},\s*"
-            r"Ljava/lang/System;->loadLibrary\(Ljava/lang/String;\)V",
-            line,
-        ):
-            # Preserve indentation, replace with nop
-            indent = line[: len(line) - len(line.lstrip())]
-            output.append(f"{indent}nop\n")
-            count += 1
-        else:
-            output.append(line)
-
-    with open(filepath, "w") as f:
-        f.writelines(output)
-
+    smali = SmaliFile.read(filepath)
+    count = neutralize_loadlibrary(smali)
+    smali.save(filepath)
     return count
 
 
@@ -52,9 +35,10 @@ def main() -> None:
 
     filepath = sys.argv[1]
     count = neutralize(filepath)
+    buildreport.count(files=1, patches=count)
     filename = filepath.split("/")[-1]
     print(f"    [x] Neutralized {count} loadLibrary call(s) in {filename}")
 
 
 if __name__ == "__main__":
-    main()
+    buildreport.run(main)
@@ -8,9 +8,11 @@ debuggable exposes the app to JDWP attacks, so instead we patch the smali
 to always return true from the debug check method.
 
 Scans baksmali output for org/chromium/base/CommandLine.smali and patches
-the method that gates file-based command line reading.
+the method that gates file-based command line reading. Given the APK, a miss
+reports which classesN.dex defines the classes (read from class_defs), so
+only that DEX needs decompiling.
 
-Usage: python3 patch-commandline.py <smali-root-dir>
+Usage: python3 patch-commandline.py <smali-root-dir> [base.apk]
        smali-root-dir contains smali_classes*/ from baksmali
 """
 
@@ -19,6 +21,18 @@ import os
 import re
 import glob
 
+import buildreport
+from classindex import ClassIndex
+from smalifile import SmaliFile
+
+BUILDINFO_CLASS = "Lorg/chromium/base/BuildInfo;"
+COMMANDLINE_CLASS = "Lorg/chromium/base/CommandLine;"
+
+DEBUG_CHECK_RE = re.compile(
+    r"(invoke-static \{[^}]*\}, Lorg/chromium/base/BuildInfo;->isDebugAndroid\(\)Z\s*\n"
+    r"\s*move-result [vp]\d+\s*\n\s*)(if-eqz [vp]\d+, :cond_\w+)"
+)
+
 
 def find_commandline_smali(smali_root: str) -> str | None:
     """Find CommandLine.smali across all DEX class dirs."""
@@ -44,63 +58,20 @@ def patch_is_debug_android(filepath: str) -> bool:
     Original: checks ApplicationInfo.FLAG_DEBUGGABLE
     Patched:  const/4 v0, 0x1; return v0
     """
-    with open(filepath, "r") as f:
-        content = f.read()
-
-    lines = content.split("\n")
-    output: list[str] = []
-    patched = False
-
-    i = 0
-    while i < len(lines):
-        line = lines[i]
-
-        # Look for .method ... isDebugAndroid(...)Z
-        if (line.strip().startswith(".method ") and
-                "isDebugAndroid" in line and line.strip().endswith(")Z")):
-
-            output.append(line)  # keep .method header
-            i += 1
-
-            # Skip to .end method, preserving annotations
-            in_annotation = False
-            while i < len(lines) and not lines[i].strip().startswith(".end method"):
-                stripped = lines[i].strip()
-                if stripped.startswith(".annotation"):
-                    in_annotation = True
-                    output.append(lines[i])
-                elif stripped.startswith(".end annotation"):
-                    in_annotation = False
-                    output.append(lines[i])
-                elif in_annotation:
-                    output.append(lines[i])
-                elif stripped.startswith(".param") or stripped.startswith(".end param"):
-                    output.append(lines[i])
-                i += 1
-
-            # Inject stub: return true
-            output.append("    .locals 1")
-            output.append("")
-            output.append("    # Patched by edge-fix: enable command-line flags on release builds")
-            output.append("    const/4 v0, 0x1")
-            output.append("    return v0")
-            output.append("")
-
-            # Write .end method
-            if i < len(lines):
-                output.append(lines[i])
-            patched = True
-            i += 1
-            continue
-
-        output.append(line)
-        i += 1
-
-    if patched:
-        with open(filepath, "w") as f:
-            f.write("\n".join(output))
-
-    return patched
+    smali = SmaliFile.read(filepath)
+    # Every boolean method whose .method line mentions isDebugAndroid, so
+    # variants such as isDebugAndroidOrApp()Z are patched too
+    targets = [m for m in smali.methods()
+               if "isDebugAndroid" in m.signature and m.signature.endswith(")Z")]
+    if not targets:
+        return False
+
+    # Inject stub: return true (annotations and .param lines are kept)
+    smali.replace_bodies(targets, 1, "    # Patched by edge-fix: enable command-line flags on release builds\n"
+                                     "    const/4 v0, 0x1\n"
+                                     "    return v0")
+    smali.save(filepath)
+    return True
 
 
 def patch_commandline_init(filepath: str) -> bool:
@@ -110,39 +81,36 @@ def patch_commandline_init(filepath: str) -> bool:
     than calling BuildInfo.isDebugAndroid(). This patches the conditional
     branch to always fall through.
     """
-    with open(filepath, "r") as f:
-        content = f.read()
+    smali = SmaliFile.read(filepath)
 
     # Look for the pattern: invoke-static BuildInfo.isDebugAndroid
     # followed by if-eqz (skip if not debug)
     # Replace if-eqz with nop to always read the file
-    pattern = r"(invoke-static \{[^}]*\}, Lorg/chromium/base/BuildInfo;->isDebugAndroid\(\)Z\s*\n\s*move-result [vp]\d+\s*\n\s*)(if-eqz [vp]\d+, :cond_\w+)"
-
-    match = re.search(pattern, content)
+    match = DEBUG_CHECK_RE.search(smali.text)
     if not match:
         return False
 
     # Replace if-eqz with nop (effectively: always treat as debuggable)
-    patched = content[:match.start(2)] + "# if-eqz patched out by edge-fix (enable cmd flags)" + content[match.end(2):]
-
-    with open(filepath, "w") as f:
-        f.write(patched)
-
+    smali.apply([(match.start(2), match.end(2),
+                  "# if-eqz patched out by edge-fix (enable cmd flags)")])
+    smali.save(filepath)
     return True
 
 
 def main() -> None:
     if len(sys.argv) < 2:
-        print(f"Usage: {sys.argv[0]} <smali-root-dir>")
+        print(f"Usage: {sys.argv[0]} <smali-root-dir> [base.apk]")
         sys.exit(1)
 
     smali_root = sys.argv[1]
+    apk_path = sys.argv[2] if len(sys.argv) > 2 else None
 
     # Strategy 1: Patch BuildInfo.isDebugAndroid() to return true
     buildinfo = find_buildinfo_smali(smali_root)
     if buildinfo:
         print(f"  Found BuildInfo: {os.path.relpath(buildinfo, smali_root)}")
         if patch_is_debug_android(buildinfo):
+            buildreport.count(files=1, patches=1)
             print("  [x] Patched isDebugAndroid() → always returns true")
             print("  CommandLine flags file will be read on release builds")
             return
@@ -154,6 +122,7 @@ def main() -> None:
     if cmdline:
         print(f"  Found CommandLine: {os.path.relpath(cmdline, smali_root)}")
         if patch_commandline_init(cmdline):
+            buildreport.count(files=1, patches=1)
             print("  [x] Patched CommandLine.initFromFile() debug check")
             print("  CommandLine flags file will be read on release builds")
             return
@@ -163,7 +132,13 @@ def main() -> None:
     # Neither found
     if not buildinfo and not cmdline:
         print("  [!] Neither BuildInfo.smali nor CommandLine.smali found")
-        print("  Chromium base classes may be in an un-baksmali'd DEX (classes4+)")
+        if apk_path:
+            index = ClassIndex.open(apk_path)
+            for descriptor in (BUILDINFO_CLASS, COMMANDLINE_CLASS):
+                dex_name = index.locate(descriptor)
+                print(f"  {descriptor} is defined in {dex_name or 'no DEX'}")
+        else:
+            print("  Chromium base classes may be in an un-baksmali'd DEX (classes4+)")
         print("  Fallback: set android:debuggable=true in manifest")
         sys.exit(1)
 
@@ -173,4 +148,4 @@ def main() -> None:
 
 
 if __name__ == "__main__":
-    main()
+    buildreport.run(main)
@@ -6,120 +6,220 @@ Replaces string literals in the DEX string table without decompiling/recompiling
 This avoids baksmali/smali round-trip bugs (IncompatibleClassChangeError on
 interfaces with static methods) while still neutralizing telemetry URLs.
 
-To maintain DEX string table sort order, the replacement string is padded to
-the EXACT same byte length as the original. The ULEB128 length prefix and null
-terminator position remain unchanged — only the string content bytes change.
+The target is found through an indexed, binary-searched view of the sorted
+string_ids table (dexfile.py) rather than a raw byte scan. The replacement
+string is padded to the EXACT same byte length as the original, so the
+ULEB128 length prefix and null terminator position remain unchanged — only
+the string content bytes change.
+
+Remap mode (--remap) lifts the same-length restriction: the DEX is loaded
+into a full model (dexmodel.py), the replacement may have any length, and
+the file is rewritten with string_ids re-sorted and every string index
+reference (const-string, const-string/jumbo, annotations, static values,
+debug info) remapped, so the result still passes ART verification.
+
+Batch mode (--batch) takes a whole replacement list (e.g. replace-urls.list)
+and several DEX files: each file is mapped once (dexio.py), every
+replacement is applied to a writable mmap of a copy, the signature/checksum
+are fixed once and the copy replaces the file only if something changed.
+DEX files are processed by a worker pool.
+
+--remap and --batch exit 2 (nothing written to the failed DEX) when a DEX
+cannot be patched: malformed, or a const-string index would grow past
+0xFFFF.
+build.sh then patches that DEX with the baksmali/smali round-trip, as
+for patch-dex.py. In --batch mode the other DEX files are still patched.
 
 Usage: python3 patch-dex-strings.py <dex-file> <old-string> <new-string>
+       python3 patch-dex-strings.py --remap <dex-file> <old-string> <new-string>
+       python3 patch-dex-strings.py --batch [--remap] [--jobs N] <list> <new-string> <dex-file>...
 """
 
+import argparse
+import mmap
+import os
 import sys
-import struct
-import hashlib
-import zlib
-
-
-def decode_uleb128(data: bytes, offset: int) -> tuple[int, int]:
-    """Decode ULEB128 at offset. Returns (value, bytes_consumed)."""
-    result = 0
-    shift = 0
-    size = 0
-    while True:
-        byte = data[offset + size]
-        result |= (byte & 0x7F) << shift
-        size += 1
-        shift += 7
-        if (byte & 0x80) == 0:
-            break
-    return result, size
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 
+import buildreport
+from dexfile import DexFile, DexFormatError, encode_mutf8, utf16_length
+from dexio import DexEdit, map_dex, replace_file
+from dexmodel import read_dex, rewrite_strings, write_dex
+from edgeconfig import read_config
 
-def patch_dex_strings(dex_path: str, old_str: str, new_str: str) -> int:
-    """Replace old_str with new_str in the DEX string table.
+NEEDS_ROUNDTRIP = 2
 
-    The replacement is padded to match the original string length exactly,
-    preserving the ULEB128 length prefix and string table sort order.
 
-    Returns the number of replacements made.
+def patch_in_place(data: bytearray | mmap.mmap, replacements: dict[str, str]) -> dict[str, int]:
+    """Same-length replacement of every string in replacements, in memory.
+
+    All targets are located through the sorted string_ids table (binary
+    search) before any byte changes, since a patched string no longer sorts
+    where the search expects it. Each replacement is padded to match the
+    original string length exactly, preserving the ULEB128 length prefix.
+    Signature and checksum are NOT updated. Returns per-string hit counts.
     """
-    with open(dex_path, "rb") as f:
-        data = bytearray(f.read())
+    dex = DexFile(data)
+    hits = dict.fromkeys(replacements, 0)
+    located = []
+    for old_str, new_str in replacements.items():
+        idx = dex.find_string(old_str)
+        if idx is not None:
+            located.append((old_str, new_str, dex.string_entry(idx)))
+
+    for old_str, new_str, (utf16_size, start, end) in located:
+        new_bytes = encode_mutf8(new_str)
+
+        if len(new_bytes) > end - start:
+            print(f"    [!] Replacement string longer than original, skipping")
+            continue
 
-    old_bytes = old_str.encode("utf-8")
-    new_bytes = new_str.encode("utf-8")
+        # Pad replacement to exact same length using path separator characters
+        # This keeps the ULEB128 length prefix and null terminator position intact
+        padded_new = new_bytes + b"/" * (end - start - len(new_bytes))
+        if utf16_length(new_str) + (len(padded_new) - len(new_bytes)) != utf16_size:
+            print(f"    [!] Replacement changes UTF-16 length, skipping")
+            continue
 
-    if len(new_bytes) > len(old_bytes):
-        print(f"    [!] Replacement string longer than original, skipping")
-        return 0
+        # Replace string content in-place (same length, no structural changes)
+        data[start:end] = padded_new
+        hits[old_str] += 1
 
-    # Pad replacement to exact same length using path separator characters
-    # This keeps the ULEB128 length prefix, null terminator position, and
-    # string table sort order intact
-    padded_new = new_bytes + b"/" * (len(old_bytes) - len(new_bytes))
+    return hits
 
-    count = 0
-    search_start = 0
 
-    while True:
-        pos = data.find(old_bytes, search_start)
-        if pos == -1:
-            break
+def patch_dex_strings(dex_path: str, old_str: str, new_str: str) -> int:
+    """Replace old_str with new_str in the DEX string table.
 
-        # Verify null terminator follows the string
-        end_pos = pos + len(old_bytes)
-        if end_pos >= len(data) or data[end_pos] != 0x00:
-            search_start = pos + 1
-            continue
+    Returns the number of replacements made.
+    """
+    return patch_dex_file(dex_path, {old_str: new_str})[old_str]
 
-        # Verify ULEB128 length prefix precedes the string
-        found_prefix = False
-        for prefix_start in range(max(0, pos - 5), pos):
-            try:
-                utf16_len, uleb_size = decode_uleb128(data, prefix_start)
-                if prefix_start + uleb_size == pos and utf16_len == len(old_bytes):
-                    found_prefix = True
-                    break
-            except (IndexError, ValueError):
-                continue
-
-        if not found_prefix:
-            search_start = pos + 1
-            continue
 
-        # Replace string content in-place (same length, no structural changes)
-        data[pos:pos + len(old_bytes)] = padded_new
-        count += 1
-        search_start = pos + len(old_bytes) + 1
+def patch_dex_file(dex_path: str, replacements: dict[str, str],
+                   remap: bool = False) -> dict[str, int]:
+    """Apply every replacement to one DEX file with a single pass.
 
-    if count > 0:
-        # Update DEX signature (SHA-1 of bytes 32..end)
-        sha1 = hashlib.sha1(data[32:]).digest()
-        data[12:32] = sha1
+    Same-length patches go into a writable mmap of a copy that atomically
+    replaces the file only if something was patched (dexio.DexEdit).
+    """
+    if remap:
+        return remap_dex_strings(dex_path, replacements)
 
-        # Update DEX checksum (Adler32 of bytes 12..end)
-        checksum = zlib.adler32(bytes(data[12:])) & 0xFFFFFFFF
-        data[8:12] = struct.pack("<I", checksum)
+    with DexEdit(dex_path) as edit:
+        hits = patch_in_place(edit.data, replacements)
+        if any(hits.values()):
+            edit.commit()
+    return hits
 
-        with open(dex_path, "wb") as f:
-            f.write(data)
 
-    return count
+def remap_dex_strings(dex_path: str, replacements: dict[str, str]) -> dict[str, int]:
+    """Replace whole strings of any length, rebuilding the DEX around them.
+
+    The string table is checked first (binary search), so a DEX that holds
+    none of the strings is never parsed further or rewritten. Returns
+    per-string hit counts.
+    """
+    with map_dex(dex_path) as data:
+        dex = DexFile(data)
+        if all(dex.find_string(old) is None for old in replacements):
+            return dict.fromkeys(replacements, 0)
+        model = read_dex(data)
+
+    hits = rewrite_strings(model, replacements)
+    # OverflowError: a const-string index grew past 0xFFFF, nothing is written
+    replace_file(dex_path, write_dex(model))
+    return hits
+
+
+def patch_or_fail(dex_path: str, replacements: dict[str, str],
+                  remap: bool = False) -> tuple[dict[str, int], str | None]:
+    """Worker for --batch: (hits, None), or (no hits, reason) when the DEX
+    cannot be patched."""
+    try:
+        return patch_dex_file(dex_path, replacements, remap), None
+    except (DexFormatError, OverflowError) as e:
+        return dict.fromkeys(replacements, 0), str(e)
+
+
+def batch_main(argv: list[str]) -> None:
+    parser = argparse.ArgumentParser(
+        prog=f"{os.path.basename(sys.argv[0])} --batch",
+        description="Apply a whole replacement list to several DEX files")
+    parser.add_argument("list", help="replacement list, one string per line (e.g. replace-urls.list)")
+    parser.add_argument("new_string", help="replacement for every listed string")
+    parser.add_argument("dex_files", nargs="+", help="DEX files to patch in place")
+    parser.add_argument("--remap", action="store_true",
+                        help="rebuild each DEX (any-length replacement, re-sorted string_ids)")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1,
+                        help="worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    strings = read_config(args.list)
+    if not strings:
+        print(f"    [!] No strings in {args.list}")
+        return
+    replacements = dict.fromkeys(strings, args.new_string)
+
+    worker = partial(patch_or_fail, replacements=replacements, remap=args.remap)
+    if args.jobs > 1 and len(args.dex_files) > 1:
+        with ProcessPoolExecutor(max_workers=min(args.jobs, len(args.dex_files))) as pool:
+            results = list(pool.map(worker, args.dex_files))
+    else:
+        results = [worker(path) for path in args.dex_files]
+
+    totals = dict.fromkeys(strings, 0)
+    failed = []
+    for dex_path, (hits, error) in zip(args.dex_files, results):
+        if error is not None:
+            failed.append(dex_path)
+            print(f"    [!] {os.path.basename(dex_path)}: {error}, needs the smali round-trip")
+            continue
+        count = sum(hits.values())
+        if count:
+            buildreport.count(files=1, patches=count)
+            print(f"    [x] Binary-patched {count} string(s) in {os.path.basename(dex_path)}")
+        for old_str, n in hits.items():
+            totals[old_str] += n
+
+    matched = sum(1 for n in totals.values() if n)
+    print(f"    {sum(totals.values())} string(s) patched, "
+          f"{matched}/{len(totals)} listed string(s) found in {len(args.dex_files)} DEX file(s)")
+    if failed:
+        sys.exit(NEEDS_ROUNDTRIP)
 
 
 def main() -> None:
-    if len(sys.argv) < 4:
+    if len(sys.argv) > 1 and sys.argv[1] == "--batch":
+        batch_main(sys.argv[2:])
+        return
+
+    remap = len(sys.argv) > 1 and sys.argv[1] == "--remap"
+    args = sys.argv[2:] if remap else sys.argv[1:]
+    if len(args) < 3:
         print(f"Usage: {sys.argv[0]} <dex-file> <old-string> <new-string>")
+        print(f"       {sys.argv[0]} --remap <dex-file> <old-string> <new-string>")
+        print(f"       {sys.argv[0]} --batch [--remap] [--jobs N] <list> <new-string> <dex-file>...")
         sys.exit(1)
 
-    dex_path = sys.argv[1]
-    old_str = sys.argv[2]
-    new_str = sys.argv[3]
-
-    count = patch_dex_strings(dex_path, old_str, new_str)
+    dex_path = args[0]
+    old_str = args[1]
+    new_str = args[2]
+
+    if remap:
+        try:
+            count = remap_dex_strings(dex_path, {old_str: new_str})[old_str]
+        except (DexFormatError, OverflowError) as e:
+            print(f"    [!] {e}, needs the smali round-trip")
+            sys.exit(NEEDS_ROUNDTRIP)
+    else:
+        count = patch_dex_strings(dex_path, old_str, new_str)
     filename = dex_path.split("/")[-1]
     if count > 0:
+        buildreport.count(files=1, patches=count)
         print(f"    [x] Binary-patched {count} string(s) in {filename}")
 
 
 if __name__ == "__main__":
-    main()
+    buildreport.run(main)
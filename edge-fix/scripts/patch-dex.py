@@ -0,0 +1,83 @@
+#!/data/data/com.termux/files/usr/bin/python3
+"""
+patch-dex.py - Apply the smali-path config lists to a DEX in place, no JVM.
+
+The binary alternative to the baksmali → patch-smali.py → smali round-trip
+for one DEX (dexpatch.py):
+  targeted-stubs.list   smali_path|method_name   → stub method body
+  neutralize-libs.list  smali_path               → nop System.loadLibrary
+Entries are filtered to the given DEX, exactly like patch-smali.py.
+build.sh then removes strip-classes.list packages with strip-classes.py
+and replaces URLs with `patch-dex-strings.py --batch --remap`.
+
+Exits 2 without writing anything when the DEX still needs the round-trip:
+a target cannot be patched in place (e.g. its code_item is shared with
+another method). Exits 0 after writing out.dex.
+
+Usage: python3 patch-dex.py <in.dex> <dex-name> <config-dir> <out.dex>
+"""
+
+import argparse
+import os
+import sys
+
+import buildreport
+from classindex import class_descriptor
+from dexpatch import DexPatcher, PatchError
+from edgeconfig import read_config, smali_to_dex
+
+NEEDS_ROUNDTRIP = 2
+
+
+def apply_config(patcher: DexPatcher, dex_name: str, config_dir: str) -> None:
+    """Apply the config entries for dex_name and save, or exit NEEDS_ROUNDTRIP."""
+    stubs: dict[str, set[str]] = {}
+    for entry in read_config(os.path.join(config_dir, "targeted-stubs.list")):
+        smali_path, _, method_name = entry.partition("|")
+        if smali_to_dex(smali_path) == dex_name and method_name:
+            stubs.setdefault(smali_path, set()).add(method_name)
+    neutralize = [p for p in read_config(os.path.join(config_dir, "neutralize-libs.list"))
+                  if smali_to_dex(p) == dex_name]
+
+    n_stubbed = n_neutralized = 0
+    try:
+        for smali_path, names in stubs.items():
+            filename = smali_path.split("/")[-1]
+            counts = patcher.stub_methods(class_descriptor(smali_path), names)
+            if counts is None:
+                print(f"    [!] Not found: {smali_path}")
+                continue
+            for method_name, count in sorted(counts.items()):
+                print(f"    [x] Stubbed {count} '{method_name}' method(s) in {filename}")
+                n_stubbed += count
+        for smali_path in neutralize:
+            count = patcher.neutralize_loadlibrary(class_descriptor(smali_path))
+            if count is None:
+                print(f"    [!] Not found: {smali_path}")
+            elif count:
+                print(f"    [x] Neutralized {count} loadLibrary call(s) in {smali_path.split('/')[-1]}")
+                n_neutralized += count
+    except PatchError as e:
+        print(f"    [=] {e}, needs the smali round-trip")
+        sys.exit(NEEDS_ROUNDTRIP)
+
+    patcher.save()
+    buildreport.count(files=1, patches=n_stubbed + n_neutralized)
+    print(f"    {dex_name}: {n_stubbed} stubbed, {n_neutralized} loadLibrary nop'd (in place)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Stub methods and nop loadLibrary calls in a DEX without baksmali/smali")
+    parser.add_argument("dex", help="input DEX file")
+    parser.add_argument("dex_name", help="DEX name the config entries use, e.g. classes2.dex")
+    parser.add_argument("config_dir", help="edge-fix config directory")
+    parser.add_argument("out", help="patched DEX to write")
+    args = parser.parse_args()
+
+    with DexPatcher.open(args.dex, args.out) as patcher:
+        apply_config(patcher, args.dex_name, args.config_dir)
+
+
+if __name__ == "__main__":
+    buildreport.run(main)
@@ -0,0 +1,124 @@
+#!/data/data/com.termux/files/usr/bin/python3
+"""
+patch-manifest-axml.py - Patch the compiled AndroidManifest.xml directly.
+
+Applies the same strip-*.list rules and @null meta-data fix as
+patch-manifest.py (shared via manifestrules.py), but on the binary AXML
+manifest inside base.apk (axml.py), so step 2 no longer needs the apktool
+decode + full resource recompile. Elements are removed by dropping their
+node chunks; the string pool and resource map are left untouched.
+
+Usage: python3 patch-manifest-axml.py <base.apk|AndroidManifest.xml> <config-dir> <out.xml>
+"""
+
+import os
+import sys
+import zipfile
+
+from axml import (ATTR_NAME, ATTR_VALUE, RES_XML_END_ELEMENT_TYPE, RES_XML_START_ELEMENT_TYPE,
+                  TYPE_INT_DEC, AxmlDocument, AxmlFormatError, is_null_value)
+import buildreport
+from checkpoint import write_if_changed
+from manifestrules import (CATEGORIES, NULL_VALUE, ManifestRules, null_metadata_value,
+                           print_report)
+
+
+def read_manifest(path: str) -> bytes:
+    """Compiled manifest bytes from an APK or a bare AndroidManifest.xml."""
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as zf:
+            return zf.read("AndroidManifest.xml")
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def patch_axml(doc: AxmlDocument, rules: ManifestRules):
+    """Apply every strip list and the @null fix in one walk over the nodes.
+
+    Same matching as patch-manifest.py: direct children of <manifest>,
+    <application> and <queries> only. Returns (removals, null_fixes,
+    has_application) in the shape print_report() expects.
+    """
+    removals = {category: [] for category in CATEGORIES}
+    null_fixes = []
+    has_application = False
+    kept = []
+    stack: list[str] = []   # tags of the open elements
+    skip_depth = 0          # > 0 while inside a removed element
+
+    for node in doc.nodes:
+        if skip_depth:
+            if node.type == RES_XML_START_ELEMENT_TYPE:
+                skip_depth += 1
+            elif node.type == RES_XML_END_ELEMENT_TYPE:
+                skip_depth -= 1
+            continue
+        if node.type == RES_XML_END_ELEMENT_TYPE:
+            stack.pop()
+        if node.type != RES_XML_START_ELEMENT_TYPE:
+            kept.append(node)
+            continue
+
+        tag = doc.string(node.name) or ""
+        parent_tag = None
+        if len(stack) == 1 or (len(stack) == 2 and stack[1] in ("application", "queries")):
+            parent_tag = stack[-1]
+        if len(stack) == 1 and tag == "application":
+            has_application = True
+
+        if parent_tag is not None:
+            name = doc.attribute_string(doc.attribute(node, "name", ATTR_NAME))
+            category = rules.match(parent_tag, tag, name)
+            if category is not None:
+                removals[category].append((tag, name))
+                skip_depth = 1
+                continue
+            value_attr = doc.attribute(node, "value", ATTR_VALUE)
+            value = NULL_VALUE if value_attr is not None and is_null_value(value_attr) else None
+            applies, new_value = null_metadata_value(parent_tag, tag, name, value)
+            if applies:
+                null_fixes.append((name or "???", new_value))
+                if new_value is None:
+                    skip_depth = 1
+                    continue
+                value_attr.set_value(TYPE_INT_DEC, int(new_value))
+
+        stack.append(tag)
+        kept.append(node)
+
+    doc.nodes = kept
+    return removals, null_fixes, has_application
+
+
+def main() -> None:
+    if len(sys.argv) != 4:
+        print(f"Usage: {sys.argv[0]} <base.apk|AndroidManifest.xml> <config-dir> <out.xml>")
+        sys.exit(1)
+
+    src, config_dir, out_path = sys.argv[1:4]
+    try:
+        data = read_manifest(src)
+        doc = AxmlDocument.parse(data)
+    except (OSError, KeyError, AxmlFormatError) as e:
+        print(f"  ERROR: Cannot read compiled manifest from {src}: {e}")
+        sys.exit(1)
+
+    rules = ManifestRules.load(config_dir)
+    removals, null_fixes, has_application = patch_axml(doc, rules)
+    removed = print_report(rules, removals, null_fixes, has_application)
+    buildreport.count(files=1, patches=removed + len(null_fixes))
+
+    patched = doc.to_bytes()
+    try:
+        AxmlDocument.parse(patched)
+    except AxmlFormatError as e:
+        print(f"  ERROR: Patched manifest does not re-parse: {e}")
+        sys.exit(1)
+
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    write_if_changed(out_path, patched)
+    print(f"  Binary manifest: {len(data)} -> {len(patched)} bytes")
+
+
+if __name__ == "__main__":
+    buildreport.run(main)
@@ -3,6 +3,12 @@
 patch-manifest.py - Robust XML-based manifest patcher for Edge Canary privacy fix.
 Uses ElementTree for proper XML parsing instead of fragile regex.
 
+The strip-*.list files are indexed once (manifestrules.py) and the manifest
+is walked once: every direct child of <manifest>, <application> and
+<queries> is matched by a dictionary lookup on (tag, android:name), the
+@null meta-data fix is applied in the same walk, and the result is written
+once with the document's own namespace prefixes.
+
 Usage: python3 patch-manifest.py <manifest.xml> <config-dir>
 """
 
@@ -11,100 +17,65 @@ import os
 import shutil
 import xml.etree.ElementTree as ET
 
+import buildreport
+from checkpoint import write_if_changed
+from manifestrules import CATEGORIES, ManifestRules, null_metadata_value, print_report
+
 ANDROID_NS = "http://schemas.android.com/apk/res/android"
 # Register the namespace so ET doesn't mangle it
 ET.register_namespace("android", ANDROID_NS)
 
-
 def android_attr(name):
     """Return fully qualified android: attribute name."""
     return f"{{{ANDROID_NS}}}{name}"
 
 
-def read_config(filepath):
-    """Read a config file, skip comments and blanks."""
-    entries = []
-    with open(filepath, "r") as f:
-        for line in f:
-            line = line.strip()
-            if line and not line.startswith("#"):
-                entries.append(line)
-    return entries
-
-
-def strip_permissions(root, config_dir):
-    """Remove tracking permissions from manifest root."""
-    permissions = read_config(os.path.join(config_dir, "strip-permissions.list"))
-    removed = 0
-
-    for perm in permissions:
-        # Find and remove <uses-permission> and <uses-permission-sdk-23>
-        for tag in ["uses-permission", "uses-permission-sdk-23"]:
-            for elem in root.findall(tag):
-                if elem.get(android_attr("name")) == perm:
-                    root.remove(elem)
-                    print(f"  [x] Stripped permission: {perm}")
-                    removed += 1
-    return removed
-
-
-def strip_components(root, config_dir):
-    """Remove tracker components from <application> element."""
-    components = read_config(os.path.join(config_dir, "strip-components.list"))
-    app_elem = root.find("application")
-    if app_elem is None:
-        print("  ERROR: No <application> element found!")
-        return 0
-
-    removed = 0
-    for entry in components:
-        parts = entry.split("|", 1)
-        if len(parts) != 2:
-            print(f"  [!] Invalid format: {entry}")
-            continue
-        comp_type, comp_name = parts
-
-        # Find matching elements by android:name attribute
-        for elem in list(app_elem):
-            if elem.tag == comp_type and elem.get(android_attr("name")) == comp_name:
-                app_elem.remove(elem)
-                print(f"  [x] Stripped {comp_type}: {comp_name}")
-                removed += 1
-    return removed
-
-
-def strip_queries(root, config_dir):
-    """Remove device ID package queries from <queries> element."""
-    packages = read_config(os.path.join(config_dir, "strip-queries.list"))
-    removed = 0
-
-    for queries_elem in root.findall("queries"):
-        for pkg in packages:
-            for elem in list(queries_elem):
-                if elem.tag == "package" and elem.get(android_attr("name")) == pkg:
-                    queries_elem.remove(elem)
-                    print(f"  [x] Stripped query: {pkg}")
-                    removed += 1
-    return removed
-
-
-def strip_metadata(root, config_dir):
-    """Remove tracker meta-data entries from <application> and root."""
-    meta_names = read_config(os.path.join(config_dir, "strip-metadata.list"))
-    removed = 0
-
-    # Search in <application> and root
-    for parent in [root, root.find("application")]:
-        if parent is None:
-            continue
-        for meta_name in meta_names:
-            for elem in list(parent):
-                if elem.tag == "meta-data" and elem.get(android_attr("name")) == meta_name:
+def parse_manifest(manifest_path):
+    """Parse the manifest, registering every namespace prefix it declares.
+
+    With all prefixes registered ElementTree writes them back unchanged,
+    so no ns0:/ns1: post-processing pass is needed.
+    """
+    parser = ET.iterparse(manifest_path, events=("start-ns",))
+    for _event, (prefix, uri) in parser:
+        if prefix:
+            ET.register_namespace(prefix, uri)
+    return ET.ElementTree(parser.root)
+
+
+def patch_manifest(root, rules):
+    """Apply every strip list and the @null fix in one walk.
+
+    Returns (removals, null_fixes): removals maps each category to the
+    (tag, name) pairs removed, null_fixes lists (name, new value or None
+    for removed) for @null meta-data.
+    """
+    removals = {category: [] for category in CATEGORIES}
+    null_fixes = []
+    name_attr = android_attr("name")
+    value_attr = android_attr("value")
+
+    def walk(parent, parent_tag):
+        for elem in list(parent):
+            name = elem.get(name_attr)
+            category = rules.match(parent_tag, elem.tag, name)
+            if category is not None:
+                parent.remove(elem)
+                removals[category].append((elem.tag, name))
+                continue
+            applies, value = null_metadata_value(parent_tag, elem.tag, name, elem.get(value_attr))
+            if applies:
+                if value is None:
                     parent.remove(elem)
-                    print(f"  [x] Stripped meta-data: {meta_name}")
-                    removed += 1
+                else:
+                    elem.set(value_attr, value)
+                null_fixes.append((name or "???", value))
+                continue
+            if parent_tag == "manifest" and elem.tag in ("application", "queries"):
+                walk(elem, elem.tag)
 
-    return removed
+    walk(root, "manifest")
+    return removals, null_fixes
 
 
 def main():
@@ -124,80 +95,27 @@ def main():
     if not os.path.exists(backup_path):
         shutil.copy2(manifest_path, backup_path)
 
-    # Parse XML
-    tree = ET.parse(manifest_path)
+    rules = ManifestRules.load(config_dir)
+    tree = parse_manifest(manifest_path)
     root = tree.getroot()
+    removals, null_fixes = patch_manifest(root, rules)
 
-    print("=== Stripping tracking permissions ===")
-    n_perms = strip_permissions(root, config_dir)
+    removed = print_report(rules, removals, null_fixes, root.find("application") is not None)
+    buildreport.count(files=1, patches=removed + len(null_fixes))
 
-    print("\n=== Stripping tracker components ===")
-    n_comps = strip_components(root, config_dir)
+    # Serialize and write once
+    content = ET.tostring(root, encoding="utf-8", xml_declaration=True)
+    write_if_changed(manifest_path, content)
 
-    print("\n=== Stripping device ID package queries ===")
-    n_queries = strip_queries(root, config_dir)
-
-    print("\n=== Stripping tracker meta-data ===")
-    n_meta = strip_metadata(root, config_dir)
-
-    # Remove @null meta-data entries to avoid apktool compilation issues
-    # (apktool compiles @null to @0x00000000 which GMS rejects as invalid)
-    # Removing the entries entirely is safer than replacing with "0"
-    print("\n=== Removing @null meta-data entries ===")
-    for parent in [root, root.find("application")]:
-        if parent is None:
-            continue
-        to_remove = []
-        for elem in list(parent):
-            if elem.tag == "meta-data":
-                val = elem.get(android_attr("value"))
-                if val == "@null":
-                    name = elem.get(android_attr("name"), "???")
-                    # Keep com.google.android.gms.version - GMS requires it
-                    if name == "com.google.android.gms.version":
-                        # Set to the GMS SDK version the APK was compiled against.
-                        # This must match @integer/google_play_services_version.
-                        # Value 12451000 corresponds to play-services 18.x used by Edge.
-                        elem.set(android_attr("value"), "12451000")
-                        print(f"  [x] Fixed {name}: @null -> 12451000")
-                    else:
-                        to_remove.append((parent, elem, name))
-        for p, e, n in to_remove:
-            p.remove(e)
-            print(f"  [x] Removed @null meta-data: {n}")
-
-    # Write patched manifest
-    tree.write(manifest_path, encoding="utf-8", xml_declaration=True)
-
-    # Post-process: fix the android namespace prefix
-    # ElementTree writes ns0: instead of android: by default for some versions
-    with open(manifest_path, "r") as f:
-        content = f.read()
-
-    # Fix namespace declaration if needed
-    content = content.replace("ns0:", "android:")
-    content = content.replace("xmlns:ns0=", "xmlns:android=")
-    content = content.replace("ns1:", "android:")
-    content = content.replace("xmlns:ns1=", "xmlns:android=")
-
-    with open(manifest_path, "w") as f:
-        f.write(content)
-
-    print(f"\n=== Manifest surgery complete ===")
-    print(f"  Permissions stripped: {n_perms}")
-    print(f"  Components stripped: {n_comps}")
-    print(f"  Queries stripped: {n_queries}")
-    print(f"  Meta-data stripped: {n_meta}")
-    print(f"  Total removals: {n_perms + n_comps + n_queries + n_meta}")
     print(f"  Backup saved: {backup_path}")
 
     # Validate
     try:
-        ET.parse(manifest_path)
+        ET.fromstring(content)
         print("  XML validation: PASS")
     except ET.ParseError as e:
         print(f"  WARNING: XML validation issue: {e}")
 
 
 if __name__ == "__main__":
-    main()
+    buildreport.run(main)
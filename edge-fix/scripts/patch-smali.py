@@ -0,0 +1,182 @@
+#!/data/data/com.termux/files/usr/bin/python3
+"""
+patch-smali.py - Apply every smali patch for one DEX in a single interpreter.
+
+Replaces the per-entry python3 invocations in build.sh step 3. All config
+lists are loaded once, every stub / loadLibrary nop / URL replacement is
+grouped by target smali file, and each file gets exactly one
+read-modify-write. Files are processed by a worker pool.
+
+Config sources (entries are filtered to the given DEX):
+  targeted-stubs.list   smali_path|method_name   → stub method body
+  neutralize-libs.list  smali_path               → nop System.loadLibrary
+  replace-urls.list     url                      → redirect to localhost
+
+URL replacement matches every configured URL in one pass per file (both
+const-string and annotation `value =` contexts) and reports per-URL hits.
+
+Usage: python3 patch-smali.py <dex-work-dir> <dex-name> <config-dir> [--jobs N]
+       dex-work-dir contains smali*/ from baksmali (e.g. work/dex-patch)
+"""
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import buildreport
+from edgeconfig import read_config, smali_to_dex, dex_to_smali_dir
+from smalifile import SmaliFile
+from smalipatch import stub_methods, neutralize_loadlibrary, StringRewriter
+
+DEFAULT_REPLACEMENT = "http://127.0.0.1:18971"
+
+
+class FileTask:
+    """All patch operations for a single smali file."""
+
+    def __init__(self, rel_path: str, full_path: str):
+        self.rel_path = rel_path
+        self.full_path = full_path
+        self.stubs: set[str] = set()
+        self.neutralize = False
+
+
+class FileResult:
+    """Per-file outcome reported back from a worker."""
+
+    def __init__(self, rel_path: str):
+        self.rel_path = rel_path
+        self.stubbed: dict[str, int] = {}
+        self.neutralized = 0
+        self.url_hits: dict[str, int] = {}
+        self.written = False
+
+
+def patch_file(task: FileTask, replacements: dict[str, str]) -> FileResult:
+    """Apply all queued operations to one file with a single read and write."""
+    result = FileResult(task.rel_path)
+    smali = SmaliFile.read(task.full_path)
+
+    if task.stubs:
+        result.stubbed = stub_methods(smali, task.stubs)
+    if task.neutralize:
+        result.neutralized = neutralize_loadlibrary(smali)
+    if replacements:
+        rewriter = StringRewriter(replacements)
+        if rewriter.rewrite(smali):
+            result.url_hits = {url: n for url, n in rewriter.hits.items() if n}
+
+    result.written = smali.save(task.full_path)
+    return result
+
+
+def collect_tasks(dex_work: str, dex_name: str, config_dir: str,
+                  with_urls: bool) -> tuple[list[FileTask], list[str]]:
+    """Group config entries for dex_name by target file.
+
+    Returns (tasks, missing smali paths). When with_urls is set, every smali
+    file of the DEX gets a task so URL replacement can visit it.
+    """
+    tasks: dict[str, FileTask] = {}
+    missing: list[str] = []
+
+    def task_for(rel_path: str) -> FileTask | None:
+        if rel_path in tasks:
+            return tasks[rel_path]
+        full_path = os.path.join(dex_work, rel_path)
+        if not os.path.isfile(full_path):
+            if rel_path not in missing:
+                missing.append(rel_path)
+            return None
+        tasks[rel_path] = FileTask(rel_path, full_path)
+        return tasks[rel_path]
+
+    for entry in read_config(os.path.join(config_dir, "targeted-stubs.list")):
+        smali_path, _, method_name = entry.partition("|")
+        if smali_to_dex(smali_path) != dex_name or not method_name:
+            continue
+        task = task_for(smali_path)
+        if task:
+            task.stubs.add(method_name)
+
+    for smali_path in read_config(os.path.join(config_dir, "neutralize-libs.list")):
+        if smali_to_dex(smali_path) != dex_name:
+            continue
+        task = task_for(smali_path)
+        if task:
+            task.neutralize = True
+
+    if with_urls:
+        smali_root = os.path.join(dex_work, dex_to_smali_dir(dex_name))
+        for dirpath, _dirnames, filenames in os.walk(smali_root):
+            for filename in filenames:
+                if filename.endswith(".smali"):
+                    full_path = os.path.join(dirpath, filename)
+                    task_for(os.path.relpath(full_path, dex_work))
+
+    return list(tasks.values()), missing
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Apply all smali patches for one DEX in a single pass")
+    parser.add_argument("dex_work", help="directory containing smali*/ trees")
+    parser.add_argument("dex_name", help="DEX to patch, e.g. classes2.dex")
+    parser.add_argument("config_dir", help="edge-fix config directory")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1,
+                        help="worker processes (default: CPU count)")
+    parser.add_argument("--replacement", default=DEFAULT_REPLACEMENT,
+                        help=f"URL replacement (default: {DEFAULT_REPLACEMENT})")
+    args = parser.parse_args()
+
+    urls = read_config(os.path.join(args.config_dir, "replace-urls.list"))
+    tasks, missing = collect_tasks(args.dex_work, args.dex_name,
+                                   args.config_dir, bool(urls))
+
+    for rel_path in missing:
+        print(f"    [!] Not found: {rel_path}")
+
+    replacements = dict.fromkeys(urls, args.replacement)
+    worker = partial(patch_file, replacements=replacements)
+    if args.jobs > 1 and len(tasks) > 1:
+        chunksize = max(1, len(tasks) // (args.jobs * 8))
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            results = list(pool.map(worker, tasks, chunksize=chunksize))
+    else:
+        results = [worker(task) for task in tasks]
+
+    n_stubbed = n_neutralized = n_written = 0
+    url_hits = dict.fromkeys(urls, 0)
+    for result in results:
+        filename = result.rel_path.split("/")[-1]
+        for method_name, count in sorted(result.stubbed.items()):
+            print(f"    [x] Stubbed {count} '{method_name}' method(s) in {filename}")
+            n_stubbed += count
+        if result.neutralized:
+            print(f"    [x] Neutralized {result.neutralized} loadLibrary call(s) in {filename}")
+            n_neutralized += result.neutralized
+        if result.url_hits:
+            total = sum(result.url_hits.values())
+            print(f"    [x] Replaced {total} URL occurrence(s) in {filename}")
+            for url, count in result.url_hits.items():
+                url_hits[url] += count
+        n_written += result.written
+
+    if urls:
+        print("    URL hits:")
+        for url, count in url_hits.items():
+            if count:
+                print(f"      {count:5d}  {url}")
+        unmatched = sum(1 for count in url_hits.values() if not count)
+        if unmatched:
+            print(f"      {unmatched} configured URL(s) not present in {args.dex_name}")
+
+    n_replaced = sum(url_hits.values())
+    buildreport.count(files=n_written, patches=n_stubbed + n_neutralized + n_replaced)
+    print(f"    {args.dex_name}: {n_stubbed} stubbed, {n_neutralized} loadLibrary nop'd, "
+          f"{n_replaced} URL(s) replaced ({n_written}/{len(tasks)} files written)")
+
+
+if __name__ == "__main__":
+    buildreport.run(main)
@@ -0,0 +1,172 @@
+#!/data/data/com.termux/files/usr/bin/python3
+"""
+relocate-targets.py - Re-locate smali-path config targets in a new Edge release.
+
+Entries of targeted-stubs.list and neutralize-libs.list name classes
+(and methods) of one Edge build; obfuscated ones such as smali/w760.smali
+are renamed by the next. This fingerprints every method of the previous
+and the new build (methodindex.py, one worker per DEX, cached by DEX
+hash) and, for each entry whose class or method no longer exists, finds
+the class and method in the new build with the most similar strings,
+callees and opcode mix. Entries whose class only moved to another
+classesN.dex get their smali_classesN prefix fixed.
+
+Matches below --min-score, or too close to the runner-up, are reported
+and left alone. --write rewrites the lists in place.
+
+The previous build has to be the original APK of the release the config
+was written for, not a patched output (stubbed methods lose their
+fingerprint).
+
+Usage: python3 relocate-targets.py <old.apk|dex-dir> <new.apk|dex-dir> <config-dir>
+           [--write] [--min-score S] [--cache DIR] [--no-cache] [--jobs N]
+"""
+
+import argparse
+import os
+import sys
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import buildreport
+from buildcache import BuildCache
+from checkpoint import write_if_changed
+from classindex import SMALI_PATH_LISTS, class_descriptor, dex_sources, smali_path
+from dexfile import DexFormatError
+from dexio import map_dex
+from edgeconfig import read_config
+from methodindex import FingerprintSet, Matcher, MethodIndex
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE = os.path.join(os.path.dirname(SCRIPT_DIR), "work", "cache")
+# A match needs to beat the runner-up by this much to be applied
+MIN_MARGIN = 0.05
+
+
+def index_dex(source: tuple[str, str], cache_dir: str | None):
+    """Worker: (DEX name, served from cache, MethodIndex) of one DEX."""
+    dex_name, path = source
+    cache = BuildCache(cache_dir) if cache_dir else None
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as zf:
+            index, cached = MethodIndex.open(zf.read(dex_name), cache)
+    else:
+        with map_dex(path) as data:
+            index, cached = MethodIndex.open(data, cache)
+    return dex_name, cached, index
+
+
+def load_build(path: str, cache_dir: str | None, jobs: int) -> tuple[FingerprintSet, int, int]:
+    """(fingerprints, DEX files, served from cache) of an APK or DEX dir."""
+    sources = dex_sources(path)
+    worker = partial(index_dex, cache_dir=cache_dir)
+    if jobs > 1 and len(sources) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(sources))) as pool:
+            results = list(pool.map(worker, sources))
+    else:
+        results = [worker(source) for source in sources]
+    return (FingerprintSet([(name, index) for name, _hit, index in results]),
+            len(results), sum(hit for _name, hit, _index in results))
+
+
+def method_names(fps: FingerprintSet, descriptor: str) -> set[str]:
+    return {fps.ref(m).split("->", 1)[1].split("(", 1)[0] for m in fps.class_methods(descriptor)}
+
+
+def relocate(matcher: Matcher, entry: str, min_score: float) -> tuple[str | None, str]:
+    """(new entry or None if unresolved, note) for one config entry."""
+    old, new = matcher.old, matcher.new
+    path, sep, method = entry.partition("|")
+    descriptor = class_descriptor(path)
+    new_class, note = descriptor, ""
+
+    if new.class_dex(descriptor) is None:
+        if old.class_dex(descriptor) is None:
+            return None, "not defined in the old build either"
+        matches = matcher.match_class(descriptor)
+        if not matches:
+            return None, "no class shares a string or callee with it"
+        new_class, score = matches[0]
+        runner_up = f", next {matches[1][0]} {matches[1][1]:.2f}" if len(matches) > 1 else ""
+        if score < min_score or (len(matches) > 1 and score - matches[1][1] < MIN_MARGIN):
+            return None, f"no confident match (best {new_class} {score:.2f}{runner_up})"
+        note = f"class score {score:.2f}{runner_up}"
+
+    if method and method not in method_names(new, new_class):
+        match = matcher.match_method(descriptor, method, new_class)
+        if match is None:
+            return None, f"{method} not found and {new_class} has no methods to match"
+        method, score = match
+        if score < min_score:
+            return None, f"no confident method match (best {method} {score:.2f})"
+        note += f"{', ' if note else ''}method score {score:.2f}"
+
+    relocated = smali_path(new_class, new.class_dex(new_class))
+    return relocated + (sep + method if sep else ""), note
+
+
+def rewrite_list(path: str, replacements: dict[str, str]) -> bool:
+    """Replace entry lines of a config list; comments and layout are kept."""
+    with open(path) as f:
+        lines = f.readlines()
+    for i, line in enumerate(lines):
+        entry = line.strip()
+        if entry in replacements:
+            lines[i] = line.replace(entry, replacements[entry], 1)
+    return write_if_changed(path, "".join(lines).encode())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Re-locate obfuscated config targets in a new Edge build")
+    parser.add_argument("old", help="APK (or DEX dir) the config was written for")
+    parser.add_argument("new", help="APK (or DEX dir) of the new release")
+    parser.add_argument("config_dir", help="edge-fix config directory")
+    parser.add_argument("--write", action="store_true", help="rewrite the config lists in place")
+    parser.add_argument("--min-score", type=float, default=0.6,
+                        help="lowest similarity (0-1) to accept a match (default: 0.6)")
+    parser.add_argument("--cache", default=DEFAULT_CACHE,
+                        help="fingerprint index cache (default: work/cache)")
+    parser.add_argument("--no-cache", action="store_true", help="always scan, store nothing")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1,
+                        help="worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    cache_dir = None if args.no_cache else args.cache
+    try:
+        old, old_files, old_cached = load_build(args.old, cache_dir, args.jobs)
+        new, new_files, new_cached = load_build(args.new, cache_dir, args.jobs)
+    except (OSError, DexFormatError) as e:
+        print(f"    [!] {e}")
+        sys.exit(1)
+    print(f"    Indexed {old.total} + {new.total} methods in {old_files} + {new_files} DEX files "
+          f"({old_cached + new_cached} from cache)")
+
+    matcher = Matcher(old, new)
+    checked = unresolved = 0
+    for list_name in SMALI_PATH_LISTS:
+        list_path = os.path.join(args.config_dir, list_name)
+        replacements: dict[str, str] = {}
+        for entry in read_config(list_path):
+            checked += 1
+            relocated, note = relocate(matcher, entry, args.min_score)
+            if relocated is None:
+                unresolved += 1
+                print(f"    [!] {list_name}: {entry}: {note}")
+            elif relocated != entry:
+                replacements[entry] = relocated
+                print(f"    [x] {list_name}: {entry} → {relocated}{f' ({note})' if note else ''}")
+        if args.write and replacements and rewrite_list(list_path, replacements):
+            print(f"    [x] Rewrote {len(replacements)} entr{'y' if len(replacements) == 1 else 'ies'} "
+                  f"in {list_name}")
+        buildreport.count(patches=len(replacements) if args.write else 0)
+
+    buildreport.count(files=old_files + new_files)
+    print(f"    {checked} entries checked, {unresolved} unresolved")
+    if unresolved:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    buildreport.run(main)
@@ -0,0 +1,126 @@
+#!/data/data/com.termux/files/usr/bin/python3
+"""
+repack-dex.py - Repack patched DEX files into the fewest the 64K limits allow.
+
+Reads every DEX of an APK (classes.dex, classes2.dex, ... after patching)
+and writes the same classes as classes.dex, classes2.dex, ... to out-dir,
+each filled up to the 64K string/proto/method/field/type id limits
+(dexpack.py).
+main-dex.list packages stay in classes.dex. Fewer, denser DEX files mean
+less to open and dexopt at install and on cold start.
+
+Class footprints are computed by a worker pool; output DEX files are then
+written one at a time. Files in out-dir are only rewritten when their
+bytes change, and leftover classesN.dex files from a larger set are
+removed. If the classes cannot be repacked (a class over the limits on
+its own, main-dex classes that do not fit one DEX, an index the writer
+cannot encode) or repacking would not need fewer DEX files than the
+input, the input DEX files are written to out-dir unchanged.
+
+Usage: python3 repack-dex.py [--jobs N] <config-dir> <out-dir> <dex-file>...
+"""
+
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import buildreport
+from dexfile import DexFormatError
+from dexio import map_dex, replace_file
+from dexpack import ID_LIMIT, ID_POOLS, PackError, dex_footprints, plan_packing, write_packed
+from edgeconfig import DEX_ENTRY_RE, dex_sort_key, main_dex_prefixes
+
+
+def format_size(size: int) -> str:
+    if size >= 1 << 20:
+        return f"{size / (1 << 20):.1f} MB"
+    return f"{size / 1024:.1f} KB"
+
+
+def footprint_file(dex_path: str):
+    """Worker: (DEX version, class footprints) of one DEX file."""
+    with map_dex(dex_path) as data:
+        return dex_footprints(data)
+
+
+def dex_name(n: int) -> str:
+    return "classes.dex" if n == 0 else f"classes{n + 1}.dex"
+
+
+def keep_unpacked(dex_paths: list[str], out_dir: str) -> None:
+    """Write the input DEX files to out_dir as they are, and nothing else."""
+    os.makedirs(out_dir, exist_ok=True)
+    for path in dex_paths:
+        with map_dex(path) as data:
+            replace_file(os.path.join(out_dir, os.path.basename(path)), data)
+    kept = {os.path.basename(path) for path in dex_paths}
+    for name in os.listdir(out_dir):
+        if DEX_ENTRY_RE.fullmatch(name) and name not in kept:
+            os.unlink(os.path.join(out_dir, name))
+    buildreport.count(files=len(dex_paths))
+    print(f"    [=] Kept the {len(dex_paths)} DEX file(s) as they are")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Repack DEX files into as few as the 64K id limits allow")
+    parser.add_argument("config_dir", help="edge-fix config directory (main-dex.list)")
+    parser.add_argument("out_dir", help="directory for the repacked classes*.dex")
+    parser.add_argument("dex_files", nargs="+", help="DEX files, named classes*.dex")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1,
+                        help="worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    dex_paths = sorted(args.dex_files, key=dex_sort_key)
+    prefixes = main_dex_prefixes(args.config_dir)
+    try:
+        if args.jobs > 1 and len(dex_paths) > 1:
+            with ProcessPoolExecutor(max_workers=min(args.jobs, len(dex_paths))) as pool:
+                planned = list(pool.map(footprint_file, dex_paths))
+        else:
+            planned = [footprint_file(path) for path in dex_paths]
+        footprints = [fp for _version, fp in planned]
+        os.makedirs(args.out_dir, exist_ok=True)
+        bins, duplicates = plan_packing(footprints, prefixes)
+        if len(bins) >= len(dex_paths):
+            print(f"    [=] Repacking needs {len(bins)} DEX file(s) for {len(dex_paths)}, "
+                  f"nothing to gain")
+            keep_unpacked(dex_paths, args.out_dir)
+            return
+        in_size = sum(os.path.getsize(path) for path in dex_paths)
+        out_size = 0
+        versions = [version for version, _fp in planned]
+        for n, (data, counts) in enumerate(write_packed(
+                bins, dex_paths, [len(fp) for fp in footprints], max(versions))):
+            replace_file(os.path.join(args.out_dir, dex_name(n)), data)
+            out_size += len(data)
+            fill = max(counts[pool] for pool in ID_POOLS)
+            print(f"    [x] {dex_name(n):<14} {counts['classes']:6d} classes "
+                  f"{counts['strings']:6d} strings {counts['protos']:6d} protos "
+                  f"{counts['methods']:6d} methods {counts['fields']:6d} fields "
+                  f"{counts['types']:6d} types  {format_size(len(data)):>9} "
+                  f"({100 * fill / ID_LIMIT:.0f}% full)")
+    except DexFormatError as e:
+        print(f"    [!] {e}")
+        sys.exit(1)
+    except (PackError, OverflowError) as e:
+        print(f"    [!] Cannot repack: {e}")
+        keep_unpacked(dex_paths, args.out_dir)
+        return
+
+    for name in os.listdir(args.out_dir):
+        if DEX_ENTRY_RE.fullmatch(name) and dex_sort_key(name) > dex_sort_key(dex_name(len(bins) - 1)):
+            os.unlink(os.path.join(args.out_dir, name))
+    if duplicates:
+        print(f"    [=] {len(duplicates)} class(es) defined in more than one DEX, "
+              f"kept the first definition, e.g. {duplicates[0]}")
+    n_main = sum(1 for source, position in bins[0]
+                 if prefixes and footprints[source][position].descriptor.startswith(tuple(prefixes)))
+    buildreport.count(files=len(bins))
+    print(f"    {len(dex_paths)} DEX file(s) ({format_size(in_size)}) → {len(bins)} "
+          f"({format_size(out_size)}), {n_main} main-dex class(es) in classes.dex")
+
+
+if __name__ == "__main__":
+    buildreport.run(main)
@@ -9,11 +9,21 @@ them with a new value. Handles two smali string contexts:
 
 Used to black-hole telemetry endpoint URLs by pointing them to localhost.
 
+Multi-pattern mode (--list) loads every URL from a config list and walks a
+whole smali tree exactly once, matching all URLs in a single scan per file
+and reporting per-URL hit counts.
+
 Usage: python3 replace-strings.py <smali-file> <old-string> <new-string>
+       python3 replace-strings.py --list <urls.list> <smali-dir> <new-string>
 """
 
+import os
 import sys
-import re
+
+import buildreport
+import smalipatch
+from edgeconfig import read_config
+from smalifile import SmaliFile
 
 
 def replace_strings(filepath: str, old_str: str, new_str: str) -> int:
@@ -22,35 +32,47 @@ def replace_strings(filepath: str, old_str: str, new_str: str) -> int:
     Handles both const-string instructions and annotation value strings.
     Returns the number of replacements made.
     """
-    with open(filepath, "r") as f:
-        content = f.read()
+    smali = SmaliFile.read(filepath)
+    total_count = smalipatch.replace_strings(smali, old_str, new_str)
+    smali.save(filepath)
+    return total_count
 
-    escaped = re.escape(old_str)
-    total_count = 0
 
-    # Pattern 1: const-string and const-string/jumbo instructions
-    pattern1 = rf'(const-string(?:/jumbo)?\s+[vp]\d+,\s*"){escaped}(")'
-    replacement1 = rf"\g<1>{new_str}\g<2>"
-    content, count1 = re.subn(pattern1, replacement1, content)
-    total_count += count1
+def replace_strings_tree(smali_dir: str, replacements: dict[str, str]) -> dict[str, int]:
+    """Rewrite every configured string under smali_dir in one tree walk.
 
-    # Pattern 2: annotation value strings (e.g. Retrofit @Url, @BaseUrl)
-    # Matches: value = "https://example.com/path"
-    pattern2 = rf'(value\s*=\s*"){escaped}(")'
-    replacement2 = rf"\g<1>{new_str}\g<2>"
-    content, count2 = re.subn(pattern2, replacement2, content)
-    total_count += count2
+    Returns per-string hit counts (zero for strings that never matched).
+    """
+    rewriter = smalipatch.StringRewriter(replacements)
 
-    if total_count > 0:
-        with open(filepath, "w") as f:
-            f.write(content)
+    for dirpath, _dirnames, filenames in os.walk(smali_dir):
+        for filename in filenames:
+            if not filename.endswith(".smali"):
+                continue
+            filepath = os.path.join(dirpath, filename)
+            smali = SmaliFile.read(filepath)
+            count = rewriter.rewrite(smali)
+            if smali.save(filepath):
+                buildreport.count(files=1, patches=count)
+                print(f"    [x] Replaced {count} occurrence(s) of URL in {filename}")
 
-    return total_count
+    return rewriter.hits
 
 
 def main() -> None:
+    if len(sys.argv) >= 5 and sys.argv[1] == "--list":
+        urls = read_config(sys.argv[2])
+        hits = replace_strings_tree(sys.argv[3], dict.fromkeys(urls, sys.argv[4]))
+        for url, count in hits.items():
+            marker = "[x]" if count else "[ ]"
+            print(f"    {marker} {count:5d}  {url}")
+        print(f"    {sum(hits.values())} replacement(s), "
+              f"{sum(1 for c in hits.values() if c)}/{len(hits)} URL(s) matched")
+        return
+
     if len(sys.argv) < 4:
         print(f"Usage: {sys.argv[0]} <smali-file> <old-string> <new-string>")
+        print(f"       {sys.argv[0]} --list <urls.list> <smali-dir> <new-string>")
         sys.exit(1)
 
     filepath = sys.argv[1]
@@ -58,10 +80,11 @@ def main() -> None:
     new_str = sys.argv[3]
 
     count = replace_strings(filepath, old_str, new_str)
+    buildreport.count(files=1 if count else 0, patches=count)
     filename = filepath.split("/")[-1]
     if count > 0:
         print(f"    [x] Replaced {count} occurrence(s) of URL in {filename}")
 
 
 if __name__ == "__main__":
-    main()
+    buildreport.run(main)
@@ -0,0 +1,73 @@
+#!/data/data/com.termux/files/usr/bin/python3
+"""
+run-stages.py - Run a graph of build.sh stages concurrently (buildgraph.py).
+
+The stage file has one stage per line, tab-separated:
+
+    name <TAB> deps <TAB> mem_mb <TAB> shell command
+
+deps is a comma-separated list of stage names or "-". Commands run under
+`bash -euo pipefail -c`, so functions and variables build.sh exported with
+`export -f` / `export` are available. Blank lines and # comments are ignored.
+
+Exits 1 if any stage failed or was skipped.
+
+Usage: python3 run-stages.py <stages.tsv> [--jobs N] [--mem-budget MB] [--log-dir DIR]
+"""
+
+import argparse
+import sys
+
+from buildgraph import Stage, mem_available_mb, run_graph
+import buildreport
+
+
+def read_stages(path: str) -> list[Stage]:
+    stages = []
+    with open(path) as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.rstrip("\n")
+            if not line.strip() or line.lstrip().startswith("#"):
+                continue
+            fields = line.split("\t", 3)
+            if len(fields) != 4:
+                raise ValueError(f"{path}:{lineno}: expected 4 tab-separated fields")
+            name, deps, mem_mb, command = fields
+            deps_list = [] if deps == "-" else [d for d in deps.split(",") if d]
+            stages.append(Stage(name, command, deps_list, int(mem_mb)))
+    return stages
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run build stages as a dependency graph.")
+    parser.add_argument("stages", help="tab-separated stage file")
+    parser.add_argument("--jobs", "-j", type=int, default=None,
+                        help="max concurrent stages (default: CPU cores)")
+    parser.add_argument("--mem-budget", type=int, default=None, metavar="MB",
+                        help="sum of stage mem_mb allowed at once (default: MemAvailable)")
+    parser.add_argument("--log-dir", default=None, help="write one <stage>.log per stage")
+    args = parser.parse_args()
+
+    try:
+        stages = read_stages(args.stages)
+    except (OSError, ValueError) as e:
+        print(f"  ERROR: {e}")
+        sys.exit(1)
+
+    budget = args.mem_budget if args.mem_budget is not None else mem_available_mb()
+    budget_text = f"{budget} MB" if budget is not None else "unlimited"
+    print(f"  {len(stages)} stage(s), jobs={args.jobs or 'auto'}, memory budget {budget_text}")
+    try:
+        results = run_graph(stages, args.jobs, budget, args.log_dir)
+    except ValueError as e:
+        print(f"  ERROR: {e}")
+        sys.exit(1)
+
+    failed = [name for name, status in results.items() if status != 0]
+    if failed:
+        print(f"  [!] {len(failed)} stage(s) failed or skipped: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    buildreport.run(main)
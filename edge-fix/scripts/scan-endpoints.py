@@ -0,0 +1,146 @@
+#!/data/data/com.termux/files/usr/bin/python3
+"""
+scan-endpoints.py - Report telemetry endpoints in an Edge build vs replace-urls.list.
+
+Scans the string_data of every classes*.dex in the base APK and the
+splits (endpoints.py: precompiled URL and hostname patterns over the raw
+section, no decompiling, one worker per DEX) and diffs what it finds
+against replace-urls.list, per DEX:
+
+  patched     listed, replaced by the build
+  unpatched   not listed, but on a host the list already targets
+              (a new path or variant of a known collector)
+  new         on a host the list does not cover, grouped by host
+
+Listed entries found in no DEX are reported as stale. Run it on every
+new Canary drop to see what the list is missing.
+
+Usage: python3 scan-endpoints.py [--summary] [--jobs N] <config-dir> <apks|apk|dir|dex>...
+"""
+
+import argparse
+import os
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import buildreport
+from dexfile import DexFormatError
+from dexio import map_dex
+from edgeconfig import DEX_ENTRY_RE, dex_sort_key, read_config
+from endpoints import NEW, PATCHED, UNPATCHED, classify, endpoint_host, scan_dex
+
+
+def apk_dexes(zf: zipfile.ZipFile) -> list[str]:
+    return sorted((n for n in zf.namelist() if DEX_ENTRY_RE.fullmatch(n)), key=dex_sort_key)
+
+
+def apk_order(name: str) -> tuple[bool, str]:
+    """base.apk first, then the splits by name."""
+    return os.path.basename(name) != "base.apk", name
+
+
+def dex_sources(path: str) -> list[tuple[str, str, str | None, str | None]]:
+    """(label, file, inner APK or None, DEX entry or None) of every DEX in
+    an .apks bundle, an APK, a directory of APKs/DEX files or a DEX."""
+    if os.path.isdir(path):
+        sources = []
+        for name in sorted(os.listdir(path), key=apk_order):
+            if name.endswith(".apk") or DEX_ENTRY_RE.fullmatch(name):
+                sources += dex_sources(os.path.join(path, name))
+        return sources
+    if not zipfile.is_zipfile(path):
+        return [(os.path.basename(path), path, None, None)]
+    with zipfile.ZipFile(path) as zf:
+        dexes = apk_dexes(zf)
+        if dexes:
+            return [(f"{os.path.basename(path)}:{d}", path, None, d) for d in dexes]
+        sources = []
+        for inner in sorted((n for n in zf.namelist() if n.endswith(".apk")), key=apk_order):
+            with zf.open(inner) as f, zipfile.ZipFile(f) as apk:
+                sources += [(f"{inner}:{d}", path, inner, d) for d in apk_dexes(apk)]
+        return sources
+
+
+def scan_source(source: tuple[str, str, str | None, str | None], known_hosts: set[str]):
+    """Worker: (label, {string: endpoints}) of one DEX."""
+    label, path, inner, dex_name = source
+    if dex_name is None:
+        with map_dex(path) as data:
+            return label, scan_dex(data, known_hosts)
+    with zipfile.ZipFile(path) as zf:
+        if inner is None:
+            data = zf.read(dex_name)
+        else:
+            with zf.open(inner) as f, zipfile.ZipFile(f) as apk:
+                data = apk.read(dex_name)
+    return label, scan_dex(data, known_hosts)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Find URL/host strings in DEX files and diff them against replace-urls.list")
+    parser.add_argument("config_dir", help="edge-fix config directory (replace-urls.list)")
+    parser.add_argument("sources", nargs="+", help=".apks bundle, APK, directory or DEX file")
+    parser.add_argument("--summary", action="store_true",
+                        help="counts, unpatched endpoints and the number of stale entries only")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1,
+                        help="worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    started = time.monotonic()
+    listed = set(read_config(os.path.join(args.config_dir, "replace-urls.list")))
+    listed_hosts = {endpoint_host(entry) for entry in listed}
+    try:
+        sources = [s for path in args.sources for s in dex_sources(path)]
+        worker = partial(scan_source, known_hosts=listed_hosts)
+        if args.jobs > 1 and len(sources) > 1:
+            with ProcessPoolExecutor(max_workers=min(args.jobs, len(sources))) as pool:
+                results = list(pool.map(worker, sources))
+        else:
+            results = [worker(source) for source in sources]
+    except (OSError, zipfile.BadZipFile, DexFormatError) as e:
+        print(f"    [!] {e}")
+        sys.exit(1)
+
+    totals = dict.fromkeys((PATCHED, UNPATCHED, NEW), 0)
+    found_anywhere: set[str] = set()
+    for label, found in results:
+        if not found:
+            continue
+        found_anywhere.update(found)
+        by_kind: dict[str, list[str]] = {PATCHED: [], UNPATCHED: [], NEW: []}
+        for text, endpoints in found.items():
+            by_kind[classify(text, endpoints, listed, listed_hosts)].append(text)
+        new_hosts: dict[str, list[str]] = {}
+        for text in by_kind[NEW]:
+            for endpoint in found[text]:
+                new_hosts.setdefault(endpoint_host(endpoint), []).append(endpoint)
+        for kind in totals:
+            totals[kind] += len(by_kind[kind])
+        print(f"    [x] {label}: {len(found)} endpoint string(s): {len(by_kind[PATCHED])} patched, "
+              f"{len(by_kind[UNPATCHED])} unpatched, {len(by_kind[NEW])} new "
+              f"({len(new_hosts)} host(s))")
+        for text in sorted(by_kind[UNPATCHED]):
+            print(f"        [!] unpatched  {text}")
+        if not args.summary:
+            for host in sorted(new_hosts):
+                examples = sorted(set(new_hosts[host]))
+                print(f"        [+] new  {host}  ({len(examples)})  {examples[0]}")
+
+    stale = sorted(listed - found_anywhere)
+    if args.summary and stale:
+        print(f"    [=] {len(stale)} replace-urls.list entr{'y' if len(stale) == 1 else 'ies'} "
+              f"not found in any DEX")
+    elif stale:
+        for entry in stale:
+            print(f"    [=] replace-urls.list: {entry} not found in any DEX")
+    buildreport.count(files=len(results))
+    print(f"    {len(results)} DEX file(s) scanned in {time.monotonic() - started:.1f}s: "
+          f"{totals[PATCHED]} patched, {totals[UNPATCHED]} unpatched, {totals[NEW]} new")
+
+
+if __name__ == "__main__":
+    buildreport.run(main)
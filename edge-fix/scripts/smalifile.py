@@ -0,0 +1,183 @@
+"""
+smalifile.py - Method-level view of a smali file with region-based edits.
+
+The file text is held once and never split into lines. `.method` /
+`.end method` ranges are indexed lazily (one regex scan, on first use), and
+callers replace a method body or individual instructions by offset. Edits
+are applied in batches by splicing the untouched slices around them, and
+save() rewrites the file only from the first changed byte onward, so large
+generated smali files are neither copied line by line nor fully rewritten.
+"""
+
+import re
+
+METHOD_MARKER_RE = re.compile(r"^[ \t]*\.(method|end method)\b[^\n]*(?:\n|\Z)", re.M)
+METHOD_NAME_RE = re.compile(r"(\S+)\(")
+RETURN_TYPE_RE = re.compile(r"\)([\[]*[VZBCSIJFD]|[\[]*L[^;]+;)")
+
+
+class SmaliMethod:
+    """Offsets of one `.method` ... `.end method` range.
+
+    start       start of the `.method` line
+    body_start  first character after the `.method` line
+    body_end    start of the `.end method` line (== end if it is missing)
+    end         first character after the `.end method` line
+    """
+
+    def __init__(self, signature: str, start: int, body_start: int, body_end: int, end: int):
+        self.signature = signature
+        self.start = start
+        self.body_start = body_start
+        self.body_end = body_end
+        self.end = end
+        name_match = METHOD_NAME_RE.search(signature)
+        self.name = name_match.group(1) if name_match else None
+        return_match = RETURN_TYPE_RE.search(signature)
+        self.return_type = return_match.group(1) if return_match else None
+
+    @property
+    def has_body(self) -> bool:
+        """False for abstract and native methods."""
+        return "abstract" not in self.signature and "native" not in self.signature
+
+
+class SmaliFile:
+    """Smali text with a lazy method index and batched region edits."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.dirty_from: int | None = None   # offset of the first edit
+        self._methods: list[SmaliMethod] | None = None
+
+    @classmethod
+    def read(cls, path: str) -> "SmaliFile":
+        # newline="" keeps the text byte-for-byte aligned with the file,
+        # which save() relies on to seek to the first changed byte
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            return cls(f.read())
+
+    @property
+    def changed(self) -> bool:
+        return self.dirty_from is not None
+
+    # ─── method index ───
+
+    def methods(self) -> list[SmaliMethod]:
+        """All methods in file order (indexed on first call)."""
+        if self._methods is None:
+            self._methods = []
+            text = self.text
+            open_start = open_body = None
+            signature = ""
+            for m in METHOD_MARKER_RE.finditer(text):
+                if m.group(1) == "method":
+                    if open_start is not None:
+                        # .method without .end method: range runs to the next one
+                        self._methods.append(
+                            SmaliMethod(signature, open_start, open_body, m.start(), m.start()))
+                    open_start, open_body = m.start(), m.end()
+                    signature = m.group(0).strip()
+                elif open_start is not None:
+                    self._methods.append(
+                        SmaliMethod(signature, open_start, open_body, m.start(), m.end()))
+                    open_start = None
+            if open_start is not None:
+                self._methods.append(
+                    SmaliMethod(signature, open_start, open_body, len(text), len(text)))
+        return self._methods
+
+    def find_methods(self, name: str) -> list[SmaliMethod]:
+        """All overloads of a method name."""
+        return [m for m in self.methods() if m.name == name]
+
+    def preserved_lines(self, method: SmaliMethod) -> list[str]:
+        """Annotation blocks and .param declarations of a method body.
+
+        These are the lines a body replacement keeps so that signatures
+        seen through reflection (annotations, parameter names) survive.
+        """
+        kept: list[str] = []
+        in_annotation = False
+        for line in self.text[method.body_start:method.body_end].split("\n"):
+            stripped = line.strip()
+            if stripped.startswith(".annotation"):
+                in_annotation = True
+                kept.append(line)
+            elif stripped.startswith(".end annotation"):
+                in_annotation = False
+                kept.append(line)
+            elif in_annotation:
+                # Preserve full annotation content (value arrays, etc.)
+                kept.append(line)
+            elif stripped.startswith(".param") or stripped.startswith(".end param"):
+                kept.append(line)
+        return kept
+
+    # ─── edits ───
+
+    def apply(self, edits: list[tuple[int, int, str]]) -> int:
+        """Replace text[start:end] with new text for each (start, end, new).
+
+        Edits refer to offsets in the current text and must not overlap.
+        Returns the number of edits applied.
+        """
+        if not edits:
+            return 0
+        edits = sorted(edits)
+        pieces: list[str] = []
+        pos = 0
+        for start, end, new in edits:
+            if start < pos:
+                raise ValueError(f"overlapping smali edits at offset {start}")
+            pieces.append(self.text[pos:start])
+            pieces.append(new)
+            pos = end
+        pieces.append(self.text[pos:])
+        self.text = "".join(pieces)
+        first = edits[0][0]
+        self.dirty_from = first if self.dirty_from is None else min(self.dirty_from, first)
+        self._methods = None
+        return len(edits)
+
+    def body_edit(self, method: SmaliMethod, locals_count: int, code: str) -> tuple[int, int, str]:
+        """Edit replacing a method body with `.locals N` + code.
+
+        Annotations and .param declarations are kept; the .method and
+        .end method lines are untouched.
+        """
+        kept = "".join(line + "\n" for line in self.preserved_lines(method))
+        return (method.body_start, method.body_end,
+                f"{kept}    .locals {locals_count}\n\n{code}\n\n")
+
+    def replace_bodies(self, methods: list[SmaliMethod], locals_count: int, code: str) -> int:
+        """Replace the bodies of methods with the same `.locals N` + code."""
+        return self.apply([self.body_edit(m, locals_count, code) for m in methods])
+
+    def sub(self, pattern: re.Pattern, replace) -> int:
+        """Regex substitution recorded as edits.
+
+        replace(match) returns the new text, or None to leave the match.
+        Returns the number of matches replaced.
+        """
+        edits = []
+        for m in pattern.finditer(self.text):
+            new = replace(m)
+            if new is not None and new != m.group(0):
+                edits.append((m.start(), m.end(), new))
+        return self.apply(edits)
+
+    def save(self, path: str) -> bool:
+        """Write changes back, rewriting only from the first changed byte.
+
+        Returns False (and leaves the file alone) if nothing changed.
+        """
+        if self.dirty_from is None:
+            return False
+        prefix_bytes = len(self.text[:self.dirty_from].encode("utf-8"))
+        with open(path, "r+b") as f:
+            f.seek(prefix_bytes)
+            f.write(self.text[self.dirty_from:].encode("utf-8"))
+            f.truncate()
+        self.dirty_from = None
+        return True
@@ -0,0 +1,124 @@
+"""
+smalipatch.py - Smali transforms shared by the edge-fix scripts.
+
+Each transform takes a SmaliFile (smalifile.py), records its changes as
+region edits and returns a count, so callers can chain several patches and
+write the file once. The single-file CLI scripts (stub-method.py,
+neutralize-loadlibrary.py, replace-strings.py), patch-commandline.py and the
+batch driver (patch-smali.py) are thin wrappers around these functions.
+"""
+
+import re
+
+from smalifile import SmaliFile
+
+# A whole line holding an invoke-static[/range] System.loadLibrary call
+LOADLIBRARY_LINE_RE = re.compile(
+    r"^([ \t]*)[^\n]*?invoke-static(/range)?[ \t]+\{[^}\n]*\},[ \t]*"
+    r"Ljava/lang/System;->loadLibrary\(Ljava/lang/String;\)V[^\n]*$",
+    re.M,
+)
+# Any string literal in the two contexts URL replacement cares about:
+# const-string[/jumbo] operands and annotation `value = "..."` elements.
+STRING_LITERAL_RE = re.compile(
+    r'((?:const-string(?:/jumbo)?\s+[vp]\d+,\s*|value\s*=\s*)")'
+    r'([^"\\\n]*(?:\\.[^"\\\n]*)*)(")'
+)
+
+
+def stub_body(return_type: str) -> tuple[int, str]:
+    """Return (.locals count, instructions) for a safe default return.
+
+    V           → return-void
+    Z/B/C/S/I/F → const/4 v0, 0x0; return v0
+    J/D         → const-wide/16 v0, 0x0; return-wide v0
+    L.../[...   → const/4 v0, 0x0; return-object v0
+    """
+    if return_type == "V":
+        return 0, "    return-void"
+    if return_type in ("Z", "B", "C", "S", "I", "F"):
+        return 1, "    const/4 v0, 0x0\n    return v0"
+    if return_type in ("J", "D"):
+        return 2, "    const-wide/16 v0, 0x0\n    return-wide v0"
+    # Object type (L...;) or array type ([...)
+    return 1, "    const/4 v0, 0x0\n    return-object v0"
+
+
+def stub_methods(smali: SmaliFile, targets: set[str]) -> dict[str, int]:
+    """Stub all overloads of every method name in targets.
+
+    Method bodies are replaced with a safe return default while annotations,
+    parameter declarations, and the method signature are preserved.
+    Abstract and native methods (no body) are left alone.
+    Returns {method_name: count}.
+    """
+    counts = {name: 0 for name in targets}
+    by_return: dict[str, list] = {}
+    for method in smali.methods():
+        if method.name in counts and method.has_body and method.return_type:
+            by_return.setdefault(method.return_type, []).append(method)
+            counts[method.name] += 1
+
+    # One edit batch per return type (the stub body depends on it)
+    edits = []
+    for return_type, methods in by_return.items():
+        min_regs, ret_code = stub_body(return_type)
+        edits += [smali.body_edit(method, min_regs, ret_code) for method in methods]
+    smali.apply(edits)
+    return counts
+
+
+def neutralize_loadlibrary(smali: SmaliFile) -> int:
+    """Replace all System.loadLibrary invoke-static calls with nop.
+
+    Indentation is preserved so register counts and branch targets stay valid.
+    Returns the number of calls neutralized.
+    """
+    def nop(m: re.Match) -> str:
+        return f"{m.group(1)}nop"
+
+    return smali.sub(LOADLIBRARY_LINE_RE, nop)
+
+
+def replace_strings(smali: SmaliFile, old_str: str, new_str: str) -> int:
+    """Replace string literals equal to old_str with new_str.
+
+    Handles two smali string contexts:
+      1. const-string instructions: `const-string vN, "old_value"`
+      2. Annotation values: `value = "old_value"` (e.g. Retrofit @Url)
+    Returns the number of replacements.
+    """
+    return StringRewriter({old_str: new_str}).rewrite(smali)
+
+
+class StringRewriter:
+    """Replace many string literals in a single pass over smali text.
+
+    Every const-string / annotation value literal is matched once by a
+    generic pattern and looked up in a dict keyed by the original string, so
+    cost is proportional to file size rather than (strings × files).
+    Per-string hit counts accumulate in self.hits across calls.
+    """
+
+    def __init__(self, replacements: dict[str, str]):
+        self.replacements = replacements
+        self.hits = dict.fromkeys(replacements, 0)
+
+    def rewrite(self, smali: SmaliFile) -> int:
+        """Rewrite all matching literals in a smali file.
+
+        Returns the number of replacements.
+        """
+        count = 0
+
+        def substitute(m: re.Match) -> str | None:
+            nonlocal count
+            new = self.replacements.get(m.group(2))
+            if new is None:
+                return None
+            self.hits[m.group(2)] += 1
+            count += 1
+            return m.group(1) + new + m.group(3)
+
+        smali.sub(STRING_LITERAL_RE, substitute)
+        return count
@@ -0,0 +1,105 @@
+#!/data/data/com.termux/files/usr/bin/python3
+"""
+strip-classes.py - Remove strip-classes.list packages from DEX files, no JVM.
+
+Rewrites each DEX without the classes under the listed packages and
+without the ids, code and data only they used (dexstrip.py), so every
+DEX loses the dead tracker code, not just the ones that go through the
+baksmali/smali round-trip. DEX files are rewritten in place, only when
+they define a listed class, by a worker pool.
+
+For each DEX the exact size change is printed, and per package the
+classes, methods, bytecode (what ART no longer verifies and compiles at
+install) and attributed bytes removed. Strings and ids that were unused
+before stripping stay, so the size change is what the packages cost.
+
+Usage: python3 strip-classes.py [--jobs N] <config-dir> <dex-file>...
+"""
+
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import buildreport
+from dexfile import DexFormatError
+from dexio import map_dex, replace_file
+from dexstrip import PackageSavings, strip_dex
+from edgeconfig import strip_class_prefixes
+
+
+def format_size(size: int) -> str:
+    if size >= 1 << 20:
+        return f"{size / (1 << 20):.1f} MB"
+    return f"{size / 1024:.1f} KB"
+
+
+def strip_dex_file(dex_path: str, prefixes: list[str]):
+    """Worker: strip one DEX in place.
+
+    Returns (old size, new size or None if untouched, savings, broken).
+    """
+    with map_dex(dex_path) as data:
+        old_size = len(data)
+        out, savings, broken = strip_dex(data, prefixes)
+    if out is None:
+        return old_size, None, [], []
+    replace_file(dex_path, out)
+    return old_size, len(out), savings, broken
+
+
+def report(dex_name: str, old_size: int, new_size: int,
+           savings: list[PackageSavings], broken: list[str]) -> None:
+    saved = old_size - new_size
+    print(f"    [x] {dex_name}: {format_size(old_size)} → {format_size(new_size)} "
+          f"(-{format_size(saved)}, {100 * saved / old_size:.1f}%)")
+    width = max(len(s.prefix) for s in savings)
+    for s in savings:
+        print(f"        {s.prefix[1:]:<{width}} {s.classes:6d} classes {s.methods:7d} methods "
+              f"{format_size(2 * s.code_units):>9} code  ~{format_size(s.bytes)}")
+    if broken:
+        print(f"    [!] {dex_name}: {len(broken)} kept class(es) extend or implement a stripped "
+              f"class and will fail to load if used, e.g. {broken[0]}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Remove strip-classes.list packages from DEX files in place")
+    parser.add_argument("config_dir", help="edge-fix config directory")
+    parser.add_argument("dex_files", nargs="+", help="DEX files to rewrite in place")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1,
+                        help="worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    prefixes = strip_class_prefixes(args.config_dir)
+    if not prefixes:
+        print("    [=] strip-classes.list is empty")
+        return
+
+    worker = partial(strip_dex_file, prefixes=prefixes)
+    try:
+        if args.jobs > 1 and len(args.dex_files) > 1:
+            with ProcessPoolExecutor(max_workers=min(args.jobs, len(args.dex_files))) as pool:
+                results = list(pool.map(worker, args.dex_files))
+        else:
+            results = [worker(path) for path in args.dex_files]
+    except DexFormatError as e:
+        print(f"    [!] {e}")
+        sys.exit(1)
+
+    total_saved = total_classes = stripped = 0
+    for dex_path, (old_size, new_size, savings, broken) in zip(args.dex_files, results):
+        if new_size is None:
+            continue
+        report(os.path.basename(dex_path), old_size, new_size, savings, broken)
+        stripped += 1
+        total_saved += old_size - new_size
+        total_classes += sum(s.classes for s in savings)
+        buildreport.count(files=1, patches=len(savings))
+    print(f"    {total_classes} class(es) stripped from {stripped}/{len(args.dex_files)} "
+          f"DEX file(s), {format_size(total_saved)} saved")
+
+
+if __name__ == "__main__":
+    buildreport.run(main)